@@ -1,5 +1,6 @@
 import os
 import logging
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -17,6 +18,82 @@ class Settings(BaseSettings):
     # On Mac M1/M2/M3, 'cpu' + 'int8' is usually the sweet spot for faster-whisper
     WHISPER_DEVICE: str = "cpu"
     WHISPER_COMPUTE_TYPE: str = "int8"
+    # Smaller model used by the "realtime" decoding profile
+    WHISPER_REALTIME_MODEL_SIZE: str = "base"
+    # Word-level timestamps for the "accurate" profile (pause/articulation metrics per word)
+    STT_WORD_TIMESTAMPS: bool = True
+    # Auto profile selection: switch to "realtime" at this many in-flight utterances...
+    STT_REALTIME_QUEUE_DEPTH: int = 4
+    # ...or for utterances longer than this
+    STT_REALTIME_MIN_DURATION_SEC: float = 20.0
+
+    # --- Streaming STT (VAD chunking) ---
+    STT_STREAM_FRAME_MS: int = 30
+    STT_STREAM_VAD_THRESHOLD_DB: float = -45.0
+    # Silence needed to close a speech segment and send it to Whisper
+    STT_STREAM_MIN_SILENCE_MS: int = 600
+    STT_STREAM_PRE_ROLL_MS: int = 200
+    STT_STREAM_MAX_SEGMENT_SEC: float = 15.0
+
+    # --- STT Micro-batching ---
+    # Utterances arriving within the wait window are decoded in one batched pass (1 disables batching)
+    STT_BATCH_MAX_SIZE: int = 8
+    STT_BATCH_MAX_WAIT_MS: int = 30
+
+    # --- STT Result Cache (content hash of decoded audio + language + profile) ---
+    STT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024   # 0 disables the cache
+    STT_CACHE_DIR: Optional[str] = os.getenv("STT_CACHE_DIR")  # Persist entries across restarts
+    STT_CACHE_DISK_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # --- Turn Concurrency ---
+    # Per-session locks around state transitions; idle entries are dropped, the registry is bounded
+    SESSION_LOCK_MAX_ENTRIES: int = 10000
+    SESSION_LOCK_IDLE_SEC: float = 600.0
+    # A resubmitted turn (same session, same text) attaches to the running generation
+    TURN_DEDUPE_INFLIGHT: bool = True
+
+    # --- Response Streaming ---
+    # Token chunks are merged into one transcript delta per window / byte budget / sentence (0 disables)
+    STREAM_COALESCE_WINDOW_MS: int = 30
+    STREAM_COALESCE_MAX_BYTES: int = 512
+
+    # --- Database (analytics pool, opened in lifespan) ---
+    DB_HOST: str = "db"
+    DB_USER: str = "softskill"
+    DB_PASSWORD: str = "supersecret"
+    DB_NAME: str = "softskill_db"
+    DB_PORT: int = 5432
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_INACTIVE_SEC: float = 300.0
+    DB_POOL_CLOSE_TIMEOUT_SEC: float = 10.0
+    DB_COMMAND_TIMEOUT_SEC: float = 30.0
+    # Prepared statements kept per connection; set 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 256
+
+    # --- Analytics ---
+    # Column snapshot used to pick query variants; also refreshed on NOTIFY schema_changed
+    ANALYTICS_SCHEMA_TTL_SEC: float = 300.0
+    # Dashboard/summary responses: fresh for TTL, then served stale (while one refresh runs) for STALE (0 disables)
+    ANALYTICS_CACHE_TTL_SEC: float = 10.0
+    ANALYTICS_CACHE_STALE_SEC: float = 60.0
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 1024
+
+    # --- Session Reports ---
+    # Sessions per transaction in batch generation (/report/generate_all, the history backfill)
+    REPORT_BATCH_SIZE: int = 200
+    # Background sweep: sessions finished past its stored watermark plus due scoring retries (0 disables).
+    # It starts at the newest session on first run; older sessions are left to /report/generate_all.
+    REPORT_SWEEP_INTERVAL_SEC: float = 120.0
+    REPORT_SWEEP_MAX_SESSIONS: int = 50
+    # A session without end_time counts as finished after this long without messages
+    SESSION_IDLE_FINISH_SEC: float = 600.0
+    # Post-session turn scoring: one LLM call per session, split beyond this many user turns
+    SCORING_MAX_TURNS_PER_CALL: int = 30
+    SCORING_CONCURRENCY: int = 2
+    # Failed scoring is retried by the sweep after BACKOFF * 2^(attempts - 1), at most MAX_ATTEMPTS times
+    SCORING_MAX_ATTEMPTS: int = 5
+    SCORING_RETRY_BACKOFF_SEC: float = 300.0
 
     # --- Logging ---
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -0,0 +1,124 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger("Database")
+
+metrics.describe("db_pool_wait_seconds", "Time spent waiting for a connection from the asyncpg pool.")
+metrics.describe("db_pool_size", "Open connections in the asyncpg pool.")
+metrics.describe("db_pool_idle", "Idle connections in the asyncpg pool.")
+
+
+class Database:
+    """
+    asyncpg pool owned by the app lifespan: opened at startup, closed gracefully on
+    shutdown. If the DB is down at startup, the first request that needs it connects
+    (under a lock, so concurrent first requests share one pool).
+
+    Queries are prepared once per connection through asyncpg's statement cache
+    (DB_STATEMENT_CACHE_SIZE). Statements registered with `warm()` are run on every
+    new connection, so the hot fixed queries are already prepared when requests arrive.
+    Callbacks registered with `on_pool_created()` run whenever a pool is opened, whether
+    at startup or on that first request.
+    """
+
+    def __init__(self):
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+        self._warm_statements: List[str] = []
+        self._pool_created_hooks: List[Callable[[asyncpg.Pool], Awaitable[None]]] = []
+
+    @property
+    def connect_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            host=settings.DB_HOST,
+            user=settings.DB_USER,
+            password=settings.DB_PASSWORD,
+            database=settings.DB_NAME,
+            port=settings.DB_PORT,
+        )
+
+    @property
+    def is_connected(self) -> bool:
+        return self._pool is not None
+
+    def warm(self, sql: str):
+        """Registers a cheap, parameterless query to prepare on each new connection."""
+        self._warm_statements.append(sql)
+
+    def on_pool_created(self, hook: Callable[[asyncpg.Pool], Awaitable[None]]):
+        """Registers a coroutine run with each new pool (e.g. schema snapshot, NOTIFY listener)."""
+        self._pool_created_hooks.append(hook)
+
+    async def start(self) -> Optional[asyncpg.Pool]:
+        try:
+            return await self.get_pool()
+        except Exception as e:
+            logger.error(f"❌ DB Connection Failed (will retry on first use): {e}")
+            return None
+
+    async def get_pool(self) -> asyncpg.Pool:
+        if self._pool is not None:
+            return self._pool
+        async with self._lock:
+            if self._pool is None:
+                logger.info("🔌 Connecting to Analytics DB...")
+                self._pool = await asyncpg.create_pool(
+                    **self.connect_kwargs,
+                    min_size=settings.DB_POOL_MIN_SIZE,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_SEC,
+                    command_timeout=settings.DB_COMMAND_TIMEOUT_SEC,
+                    statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+                    init=self._init_connection,
+                )
+                logger.info(f"✅ Analytics DB Connected (pool {settings.DB_POOL_MIN_SIZE}-{settings.DB_POOL_MAX_SIZE})")
+                # Still under the lock: concurrent first requests wait for the hooks too
+                for hook in self._pool_created_hooks:
+                    try:
+                        await hook(self._pool)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Pool hook failed: {e}")
+        return self._pool
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        if settings.DB_STATEMENT_CACHE_SIZE <= 0:
+            return
+        for sql in self._warm_statements:
+            try:
+                await conn.fetch(sql)
+            except asyncpg.PostgresError as e:
+                # e.g. rollup tables not migrated yet; prepared on first use instead
+                logger.warning(f"⚠️ Could not warm statement: {e}")
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        pool = await self.get_pool()
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started)
+            metrics.set("db_pool_size", pool.get_size())
+            metrics.set("db_pool_idle", pool.get_idle_size())
+            yield conn
+
+    async def close(self):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        try:
+            # Lets in-flight queries (e.g. exports) finish, within a bound
+            await asyncio.wait_for(pool.close(), timeout=settings.DB_POOL_CLOSE_TIMEOUT_SEC)
+            logger.info("🔌 Analytics DB pool closed")
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ DB pool close timed out, terminating connections")
+            pool.terminate()
+
+
+db = Database()
@@ -1,9 +1,13 @@
 import logging
 import sys
 import os
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from app.core.config import settings
+from app.core.db import db
+from app.services.schema_registry import schema_registry
+from app.services.session_reports import session_reports
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +19,22 @@ async def lifespan(app: FastAPI):
     logger.info(f"   - HeBERT fallback: {'enabled' if settings.ENABLE_HEBERT else 'disabled'}")
 
     # No pre-loading needed for state-machine engine as it's purely API-based (Ollama)
-    
+
+    # Analytics DB: a failure here only affects analytics, which reconnect on demand.
+    # The schema snapshot and NOTIFY listener come with the pool (schema_registry's pool hook).
+    await db.start()
+
+    # Post-session turn scoring + reports, off the live turn path
+    report_sweep = None
+    if settings.REPORT_SWEEP_INTERVAL_SEC > 0:
+        report_sweep = asyncio.create_task(session_reports.run(settings.REPORT_SWEEP_INTERVAL_SEC))
+
     yield
-    
-    logger.info("🛑 Service Shutting Down...")
\ No newline at end of file
+
+    logger.info("🛑 Service Shutting Down...")
+    if report_sweep is not None:
+        report_sweep.cancel()
+        with suppress(asyncio.CancelledError):
+            await report_sweep
+    await schema_registry.close()
+    await db.close()
@@ -0,0 +1,82 @@
+import threading
+from typing import Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process counters/gauges/summaries rendered in Prometheus text format.
+    Thread-safe so STT worker threads can record too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # name -> labels -> [count, sum, max]
+        self._summaries: Dict[str, Dict[LabelKey, list]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            stats = self._summaries.setdefault(name, {}).setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def value(self, name: str, **labels: str) -> float:
+        key = _label_key(labels)
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0.0)
+            return self._gauges.get(name, {}).get(key, 0.0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, val in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {val:g}")
+            for name, series in sorted(self._summaries.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+                for key, (count, total, peak) in series.items():
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_count{labels} {count}")
+                    lines.append(f"{name}_sum{labels} {total:g}")
+                    lines.append(f"{name}_max{labels} {peak:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+# Global Singleton
+metrics = MetricsRegistry()
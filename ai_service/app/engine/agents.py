@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import aclosing
 from typing import List, Dict, Optional
 from app.engine.schema import ScenarioState, AgentOutput
 from app.engine.llm import llm_client
@@ -58,6 +60,66 @@ class EvaluatorAgent:
             sentiment=result.get("sentiment", "neutral")
         )
 
+class ScoringAgent:
+    """
+    Scores all user turns of a finished conversation in a single call.
+    Runs after the session, never on the live turn path.
+    """
+
+    MAX_CHARS_PER_MESSAGE = 400
+    TOKENS_PER_TURN = 30
+
+    @staticmethod
+    async def score_turns(goal: str, transcript: List[Dict[str, str]]) -> Optional[List[Dict[str, float]]]:
+        """
+        `transcript` is the conversation in order ({"role": "user"|"ai", "content": ...}).
+        Returns {"topic_adherence", "clarity"} (0-1) per user turn, or None if the
+        LLM did not score every turn.
+        """
+        lines = []
+        turns = 0
+        for msg in transcript:
+            text = msg["content"][:ScoringAgent.MAX_CHARS_PER_MESSAGE]
+            if msg["role"] == "user":
+                turns += 1
+                lines.append(f"[USER TURN {turns}] {text}")
+            else:
+                lines.append(f"[AI] {text}")
+        if turns == 0:
+            return []
+
+        system_prompt = (
+            "You are a communication coach scoring a finished practice conversation.\n"
+            f"Conversation Goal: {goal}\n"
+            "Rate EVERY user turn:\n"
+            "- topic_adherence (0.0-1.0): stays on topic and answers what the AI asked\n"
+            "- clarity (0.0-1.0): clear, complete and easy to understand\n"
+            "The conversation may be in Hebrew; judge the content, not the language."
+        )
+        schema = '{"turns": [{"turn": integer, "topic_adherence": number, "clarity": number}]}'
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Conversation:\n" + "\n".join(lines)}
+        ]
+
+        result = await llm_client.generate_json(
+            messages, schema, max_tokens=50 + turns * ScoringAgent.TOKENS_PER_TURN
+        )
+
+        scores: Dict[int, Dict[str, float]] = {}
+        items = result.get("turns") if isinstance(result, dict) else None
+        for item in items if isinstance(items, list) else []:
+            try:
+                scores[int(item["turn"])] = {
+                    key: min(1.0, max(0.0, float(item[key]))) for key in ("topic_adherence", "clarity")
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+        if any(turn not in scores for turn in range(1, turns + 1)):
+            return None
+        return [scores[turn] for turn in range(1, turns + 1)]
+
 class RolePlayAgent:
     """
     Generates the in-character response.
@@ -72,13 +134,11 @@ class RolePlayAgent:
         return int(len(text) / RolePlayAgent.EST_CHARS_PER_TOKEN) + 5
 
     @staticmethod
-    async def generate_response(
-        user_text: str,
+    def build_system_prompt(
         base_persona: str,
         state: ScenarioState,
-        history: List[Dict[str, str]],
         eval_result: Optional[AgentOutput] = None
-    ):
+    ) -> str:
         # 1. Construct System Prompt (The "Head" - Always Pinned)
         system_prompt = (
             "SYSTEM INSTRUCTIONS:\n"
@@ -99,7 +159,14 @@ class RolePlayAgent:
                 f"The user did NOT meet the goal. {state.evaluation.failure_feedback_guidance}\n"
                 f"Internal Reasoning: {eval_result.reasoning}"
             )
-        
+        return system_prompt
+
+    @staticmethod
+    def trim_history(
+        history: List[Dict[str, str]],
+        system_prompt: str,
+        user_text: str
+    ) -> List[Dict[str, str]]:
         # 3. Smart Context Trimming (The "Middle")
         # We need to fit: System Prompt + History + User Message <= MAX_TOTAL_TOKENS
         
@@ -125,6 +192,18 @@ class RolePlayAgent:
         
         # Reverse back to chronological order
         trimmed_history.reverse()
+        return trimmed_history
+
+    @staticmethod
+    def build_messages(
+        user_text: str,
+        base_persona: str,
+        state: ScenarioState,
+        history: List[Dict[str, str]],
+        eval_result: Optional[AgentOutput] = None
+    ) -> List[Dict[str, str]]:
+        system_prompt = RolePlayAgent.build_system_prompt(base_persona, state, eval_result)
+        trimmed_history = RolePlayAgent.trim_history(history, system_prompt, user_text)
         
         # 4. Final Assembly
         messages = [{"role": "system", "content": system_prompt}]
@@ -136,7 +215,20 @@ class RolePlayAgent:
             messages.append({"role": "system", "content": "ACTION: Start the conversation according to your goal. Say the opening line."})
         else:
             messages.append({"role": "user", "content": user_text})
+        return messages
+
+    @staticmethod
+    async def generate_response(
+        user_text: str,
+        base_persona: str,
+        state: ScenarioState,
+        history: List[Dict[str, str]],
+        eval_result: Optional[AgentOutput] = None,
+        cancel: Optional[asyncio.Event] = None
+    ):
+        messages = RolePlayAgent.build_messages(user_text, base_persona, state, history, eval_result)
 
-        # 5. Stream Response
-        async for token in llm_client.generate_stream(messages):
-            yield token
+        # 5. Stream Response (aclosing: closing this generator aborts the upstream stream too)
+        async with aclosing(llm_client.generate_stream(messages, cancel)) as stream:
+            async for token in stream:
+                yield token
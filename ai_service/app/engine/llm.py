@@ -1,12 +1,42 @@
 import os
 import json
+import asyncio
 import logging
-from typing import List, Dict, Any, AsyncGenerator
+from typing import List, Dict, Any, AsyncGenerator, Optional
 from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.metrics import metrics
 
 logger = logging.getLogger("LLMEngine")
 
+metrics.describe("llm_generations_cancelled_total", "LLM streams aborted before completion (client gone or interrupted).")
+
+_END = object()
+CANCELLED = object()  # Returned by unless_cancelled when the wait was abandoned
+
+async def _next_chunk(chunks):
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+async def unless_cancelled(aw, cancelled: Optional[asyncio.Future]):
+    """Awaits `aw`, or abandons it (cancelling the request) once `cancelled` completes."""
+    if cancelled is None:
+        return await aw
+    if cancelled.done():
+        aw.close()
+        return CANCELLED
+    task = asyncio.ensure_future(aw)
+    try:
+        await asyncio.wait({task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        return CANCELLED
+    finally:
+        if not task.done():
+            task.cancel()
+
 class LLMClient:
     def __init__(self):
         self.client = AsyncOpenAI(
@@ -15,7 +45,7 @@ class LLMClient:
         )
         self.model = settings.OLLAMA_MODEL
 
-    async def generate_json(self, messages: List[Dict[str, str]], schema: str) -> Dict[str, Any]:
+    async def generate_json(self, messages: List[Dict[str, str]], schema: str, max_tokens: int = 300) -> Dict[str, Any]:
         """
         Forces the LLM to return JSON conforming to a schema description.
         Includes a retry mechanism.
@@ -37,7 +67,7 @@ class LLMClient:
                 model=self.model,
                 messages=messages,
                 temperature=0.1,
-                max_tokens=300,
+                max_tokens=max_tokens,
                 response_format={"type": "json_object"} # Ollama supports this for some models
             )
             content = response.choices[0].message.content
@@ -50,20 +80,52 @@ class LLMClient:
             logger.error(f"LLM Generation Error: {e}")
             return {"error": str(e)}
 
-    async def generate_stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+    async def generate_stream(
+        self,
+        messages: List[Dict[str, str]],
+        cancel: Optional[asyncio.Event] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streams completion tokens. Setting `cancel` (or closing this generator) closes the
+        upstream HTTP stream, which makes Ollama stop generating. Waiting for the response
+        and for each chunk is raced against `cancel`, so a slow first token is aborted too.
+        """
+        stream = None
+        completed = False
+        cancelled = asyncio.ensure_future(cancel.wait()) if cancel is not None else None
         try:
-            stream = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                stream=True
+            stream = await unless_cancelled(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    stream=True
+                ),
+                cancelled,
             )
-            async for chunk in stream:
-                content = chunk.choices[0].delta.content
-                if content:
-                    yield content
+            if stream is not CANCELLED:
+                chunks = stream.__aiter__()
+                while True:
+                    chunk = await unless_cancelled(_next_chunk(chunks), cancelled)
+                    if chunk is CANCELLED or (cancel is not None and cancel.is_set()):
+                        break
+                    if chunk is _END:
+                        completed = True
+                        break
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        yield content
         except Exception as e:
             logger.error(f"LLM Stream Error: {e}")
             yield f"[Error: {e}]"
+            completed = True
+        finally:
+            if cancelled is not None:
+                cancelled.cancel()
+            if not completed:
+                logger.info("🛑 LLM stream cancelled, closing upstream request.")
+                metrics.inc("llm_generations_cancelled_total")
+                if stream is not None and stream is not CANCELLED:
+                    await stream.close()
 
 llm_client = LLMClient()
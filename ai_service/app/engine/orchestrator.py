@@ -1,11 +1,15 @@
 import logging
 import json
-from typing import AsyncGenerator, Dict, Any, List
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, Any, List, Optional
 
-from app.engine.schema import ScenarioGraph
+from app.engine.schema import ScenarioGraph, ScenarioState
 from app.engine.scenarios import get_scenario_graph
 from app.engine.state_manager import state_manager
 from app.engine.agents import EvaluatorAgent, RolePlayAgent
+from app.engine.session_locks import session_locks
+from app.engine.llm import CANCELLED, unless_cancelled
 
 logger = logging.getLogger("Orchestrator")
 
@@ -16,17 +20,123 @@ class ScenarioOrchestrator:
         session_id: str,
         scenario_id: str,
         user_text: str,
-        history: List[Dict[str, str]]
+        history: List[Dict[str, str]],
+        cancel: Optional[asyncio.Event] = None
     ) -> AsyncGenerator[Any, None]:
-        
+        """
+        Runs one turn: evaluate, transition, then stream the actor's reply.
+        Setting `cancel` stops before/while streaming the reply (client disconnected).
+        """
+
         # 1. Load Graph
         graph = get_scenario_graph(scenario_id)
         if not graph:
             yield f"Error: Scenario '{scenario_id}' not found."
             return
 
-        # 2. Load State
+        # 2-4. Load state, evaluate and transition as one critical section per session,
+        # so concurrent turns never evaluate against a node another turn is moving away from.
+        # The actor streams outside the lock.
         is_cold_start = user_text.strip() == "[START]"
+        metadata: List[Dict[str, Any]] = []
+        async with session_locks.lock(session_id):
+            current_state = self._load_state(graph, session_id, scenario_id, is_cold_start)
+            target_state, eval_result = current_state, None
+            if current_state is not None and not is_cold_start:
+                # 3. Evaluate User Input (The "Coach")
+                logger.info(f"🧐 Evaluating turn in state: {current_state.id}")
+                cancelled = asyncio.ensure_future(cancel.wait()) if cancel is not None else None
+                try:
+                    eval_result = await unless_cancelled(
+                        EvaluatorAgent.evaluate(user_text, current_state, history), cancelled
+                    )
+                finally:
+                    if cancelled is not None:
+                        cancelled.cancel()
+                if eval_result is CANCELLED:
+                    # Superseded (barge-in) or client gone: leave the state untouched for the next turn
+                    logger.info(f"🛑 Turn cancelled during evaluation (session {session_id})")
+                    return
+
+                # Metadata about the evaluation
+                metadata.append({
+                    "type": "analysis",
+                    "sentiment": eval_result.sentiment, 
+                    "confidence": 1.0 if eval_result.passed else 0.5,
+                    "detected_intent": "next_step" if eval_result.passed else "retry",
+                    "social_impact": "progress" if eval_result.passed else "stagnation",
+                    "reasoning": eval_result.reasoning,
+                    "passed": eval_result.passed,
+                    "current_state": current_state.id
+                })
+
+                # 4. State Transition Logic (default: stay put)
+                if eval_result.passed and eval_result.next_state_id:
+                    next_id = eval_result.next_state_id
+                    if next_id in graph.states:
+                        logger.info(f"🚀 Transitioning: {current_state.id} -> {next_id}")
+                        target_state = graph.states[next_id]
+                        state_manager.update_state(session_id, scenario_id, next_id)
+                        
+                        # Notify frontend of transition (optional)
+                        metadata.append({"type": "transition", "from": current_state.id, "to": next_id})
+                    else:
+                        logger.warning(f"⚠️ Invalid transition target: {next_id}")
+
+        if current_state is None:
+            yield "Error: Invalid state configuration."
+            return
+        for item in metadata:
+            yield item
+
+        # --- SPECIAL CASE: INITIALIZATION ---
+        if is_cold_start:
+            logger.info(f"🎬 Initializing conversation in state: {current_state.id}")
+            # Skip evaluation, just act out the initial state
+            async with aclosing(RolePlayAgent.generate_response(
+                user_text="[START]", # Pass strict signal
+                base_persona=graph.base_persona,
+                state=current_state,
+                history=[], # No history for start
+                eval_result=None,
+                cancel=cancel
+            )) as tokens:
+                async for token in tokens:
+                    yield token
+            return
+
+        # 5. Generate Response (The "Actor")
+        # The actor generates response based on the TARGET state (where we are now)
+        # Exception: If we failed, we are still in the old state, and the prompt includes "Guidance".
+        
+        if cancel is not None and cancel.is_set():
+            logger.info(f"🛑 Turn cancelled before generation (session {session_id})")
+            return
+
+        logger.info(f"🎭 Generating response for state: {target_state.id}")
+        
+        async with aclosing(RolePlayAgent.generate_response(
+            user_text,
+            graph.base_persona,
+            target_state,
+            history,
+            eval_result, # Pass result so actor knows if user failed
+            cancel=cancel
+        )) as tokens:
+            async for token in tokens:
+                yield token
+
+    def _load_state(
+        self,
+        graph: ScenarioGraph,
+        session_id: str,
+        scenario_id: str,
+        is_cold_start: bool
+    ) -> Optional[ScenarioState]:
+        """
+        Resolves the session's current node, (re)initializing it when missing or invalid.
+        Caller must hold the session lock.
+        """
         session_data = state_manager.get_state(session_id)
 
         if is_cold_start:
@@ -53,70 +163,7 @@ class ScenarioOrchestrator:
             current_node_id = graph.initial_state_id
             state_manager.update_state(session_id, scenario_id, current_node_id)
             current_state = graph.states.get(current_node_id)
-            if not current_state:
-                yield "Error: Invalid state configuration."
-                return
-
-        # --- SPECIAL CASE: INITIALIZATION ---
-        if is_cold_start:
-            logger.info(f"🎬 Initializing conversation in state: {current_node_id}")
-            # Skip evaluation, just act out the initial state
-            async for token in RolePlayAgent.generate_response(
-                user_text="[START]", # Pass strict signal
-                base_persona=graph.base_persona,
-                state=current_state,
-                history=[], # No history for start
-                eval_result=None
-            ):
-                yield token
-            return
-
-        # 3. Evaluate User Input (The "Coach")
-        logger.info(f"🧐 Evaluating turn in state: {current_node_id}")
-        eval_result = await EvaluatorAgent.evaluate(user_text, current_state, history)
-        
-        # Yield metadata about the evaluation
-        yield {
-            "type": "analysis",
-            "sentiment": eval_result.sentiment, 
-            "confidence": 1.0 if eval_result.passed else 0.5,
-            "detected_intent": "next_step" if eval_result.passed else "retry",
-            "social_impact": "progress" if eval_result.passed else "stagnation",
-            "reasoning": eval_result.reasoning,
-            "passed": eval_result.passed,
-            "current_state": current_node_id
-        }
-
-        # 4. State Transition Logic
-        target_state = current_state # Default: stay put
-        
-        if eval_result.passed and eval_result.next_state_id:
-            next_id = eval_result.next_state_id
-            if next_id in graph.states:
-                logger.info(f"🚀 Transitioning: {current_node_id} -> {next_id}")
-                current_node_id = next_id
-                target_state = graph.states[next_id]
-                state_manager.update_state(session_id, scenario_id, current_node_id)
-                
-                # Notify frontend of transition (optional)
-                yield {"type": "transition", "from": current_state.id, "to": next_id}
-            else:
-                logger.warning(f"⚠️ Invalid transition target: {next_id}")
-
-        # 5. Generate Response (The "Actor")
-        # The actor generates response based on the TARGET state (where we are now)
-        # Exception: If we failed, we are still in the old state, and the prompt includes "Guidance".
-        
-        logger.info(f"🎭 Generating response for state: {target_state.id}")
-        
-        async for token in RolePlayAgent.generate_response(
-            user_text,
-            graph.base_persona,
-            target_state,
-            history,
-            eval_result # Pass result so actor knows if user failed
-        ):
-            yield token
+        return current_state
 
 # Singleton
 orchestrator = ScenarioOrchestrator()
@@ -0,0 +1,84 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger("SessionLocks")
+
+metrics.describe("session_locks_entries", "Per-session locks currently held in the registry.")
+
+# Idle entries are swept at most this often unless the registry is over capacity
+SWEEP_INTERVAL_SEC = 30.0
+
+
+class _LockEntry:
+    __slots__ = ("lock", "users", "last_used")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0          # Holders + waiters; entries in use are never evicted
+        self.last_used = time.monotonic()
+
+
+class SessionLockRegistry:
+    """
+    One asyncio.Lock per session, created on demand.
+    Entries are kept in least-recently-used order; unused ones are dropped after
+    `idle_sec` or when the registry grows past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, idle_sec: float):
+        self.max_entries = max_entries
+        self.idle_sec = idle_sec
+        self._entries: "OrderedDict[str, _LockEntry]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        sid = str(session_id)
+        entry = self._entries.get(sid)
+        if entry is None:
+            entry = self._entries[sid] = _LockEntry()
+        else:
+            self._entries.move_to_end(sid)
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+            if self._entries.get(sid) is entry:
+                self._entries.move_to_end(sid)
+            self._sweep()
+
+    def _sweep(self):
+        now = time.monotonic()
+        over_capacity = len(self._entries) > self.max_entries
+        if not over_capacity and now - self._last_sweep < SWEEP_INTERVAL_SEC:
+            return
+        self._last_sweep = now
+
+        cutoff = now - self.idle_sec
+        for sid, entry in list(self._entries.items()):
+            excess = len(self._entries) > self.max_entries
+            if not excess and entry.last_used > cutoff:
+                break  # LRU order: everything after this is more recent
+            if entry.users == 0:
+                del self._entries[sid]
+
+        if len(self._entries) > self.max_entries:
+            logger.warning(f"⚠️ {len(self._entries)} session locks in use (limit {self.max_entries})")
+        metrics.set("session_locks_entries", len(self._entries))
+
+
+# Global Singleton
+session_locks = SessionLockRegistry(settings.SESSION_LOCK_MAX_ENTRIES, settings.SESSION_LOCK_IDLE_SEC)
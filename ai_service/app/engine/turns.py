@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger("TurnManager")
+
+metrics.describe("turns_interrupted_total", "Turns cut short because the user started a new one (barge-in).")
+metrics.describe("turns_deduplicated_total", "Resubmitted turns served from an identical in-flight generation.")
+
+
+class TurnHandle:
+    """
+    One running turn of a session. `cancel` is shared with the transport, so both a
+    client disconnect and a barge-in stop the same generation.
+    Emitted events are recorded so duplicate submissions can replay and follow them.
+    """
+
+    def __init__(self, session_id: str, text: str, cancel: asyncio.Event):
+        self.session_id = session_id
+        self.text = text
+        self.cancel = cancel
+        self.interrupted = False    # Cut short by a newer turn (not by the client leaving)
+        self.delivered_chars = 0    # Actor reply characters already streamed to the client
+        self.events: List[Tuple[str, Any]] = []
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+
+    async def wait(self):
+        await self._finished.wait()
+
+    def publish(self, event: str, data: Any):
+        self.events.append((event, data))
+        self._wake()
+
+    async def follow(self) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Replays the events so far, then streams new ones until the turn ends."""
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self._finished.is_set():
+                return
+            await changed.wait()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class TurnManager:
+    """
+    Keeps at most one generation per session.
+    With `interrupt=True` a new turn cancels the running one and takes over as soon as it
+    has unwound; with `interrupt=False` it queues behind it.
+    """
+
+    def __init__(self, dedupe: bool = True):
+        self.dedupe = dedupe
+        self._active: Dict[str, TurnHandle] = {}
+
+    def active(self, session_id: str) -> Optional[TurnHandle]:
+        return self._active.get(str(session_id))
+
+    def find_duplicate(self, session_id: str, text: str) -> Optional[TurnHandle]:
+        """The running turn for the same input (double submit / client retry), if any."""
+        if not self.dedupe:
+            return None
+        handle = self._active.get(str(session_id))
+        if handle is None or handle.text != text or handle.cancel.is_set():
+            return None
+        logger.info(f"🔁 Duplicate turn attached to running generation: session {handle.session_id}")
+        metrics.inc("turns_deduplicated_total")
+        return handle
+
+    async def begin(
+        self,
+        session_id: str,
+        text: str,
+        cancel: Optional[asyncio.Event] = None,
+        interrupt: bool = True
+    ) -> TurnHandle:
+        sid = str(session_id)
+        # Loop: while we waited, another turn may have claimed the session first
+        while (previous := self._active.get(sid)) is not None:
+            if interrupt:
+                self.interrupt(sid)
+            await previous.wait()
+
+        handle = TurnHandle(sid, text, cancel or asyncio.Event())
+        self._active[sid] = handle
+        return handle
+
+    def interrupt(self, session_id: str) -> Optional[TurnHandle]:
+        handle = self._active.get(str(session_id))
+        if handle is not None and not handle.cancel.is_set():
+            logger.info(f"✋ Barge-in: interrupting session {handle.session_id} after {handle.delivered_chars} chars")
+            handle.interrupted = True
+            handle.cancel.set()
+            metrics.inc("turns_interrupted_total")
+        return handle
+
+    def end(self, handle: TurnHandle):
+        if self._active.get(handle.session_id) is handle:
+            del self._active[handle.session_id]
+        handle._finished.set()
+        handle._wake()
+
+
+# Global Singleton
+turn_manager = TurnManager(dedupe=settings.TURN_DEDUPE_INFLIGHT)
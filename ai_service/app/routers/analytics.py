@@ -1,206 +1,249 @@
-import os
+import json
+import base64
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 
 import asyncpg
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from app.core.db import db
+from app.core.metrics import metrics
 from app.schemas import MessageRead  # Import for type hinting/validation concepts
+from app.services.response_cache import analytics_cache
+from app.services.schema_registry import schema_registry
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-_db_pool: Optional[asyncpg.pool.Pool] = None
+# /sessions_list paging
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
+# /export: COPY chunks buffered between Postgres and the client; beyond this the copy waits
+EXPORT_QUEUE_CHUNKS = 16
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-async def _column_exists(conn: asyncpg.Connection, table: str, column: str) -> bool:
-    return await conn.fetchval(
-        """
-        SELECT EXISTS (
-            SELECT 1
-            FROM information_schema.columns
-            WHERE table_schema = 'public'
-              AND table_name = $1
-              AND column_name = $2
-        )
-        """,
-        table,
-        column,
-    )
+metrics.describe("analytics_export_bytes_total", "Bytes streamed by /analytics/export.")
+
+# --- Query variants (picked once per schema snapshot, see SchemaRegistry) ---
+
+_SENTIMENT = ("messages", "sentiment")
+
+# One page of sessions (keyset on start_time, id); {where} is filled by _sessions_page_query.
+# Per-session lookups run only for the rows on the page.
+_SESSIONS_PAGE_SQL = """
+    SELECT
+        p.id,
+        p.scenario_id,
+        p.start_time AS created_at,
+        mc.message_count,
+        {last_sentiment} AS last_sentiment
+    FROM (
+        SELECT s.id, s.scenario_id, s.start_time
+        FROM sessions s
+        WHERE {{where}}
+        ORDER BY s.start_time DESC, s.id DESC
+        LIMIT {{limit}}
+    ) p
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS message_count FROM messages m WHERE m.session_id = p.id
+    ) mc
+    {last_sentiment_join}
+    ORDER BY p.start_time DESC, p.id DESC
+"""
 
+schema_registry.register("sessions_list", [
+    ([_SENTIMENT], _SESSIONS_PAGE_SQL.format(
+        last_sentiment="ls.sentiment",
+        last_sentiment_join="""LEFT JOIN LATERAL (
+        SELECT m2.sentiment
+        FROM messages m2
+        WHERE m2.session_id = p.id
+          AND m2.role = 'user'
+          AND m2.sentiment IS NOT NULL
+        ORDER BY m2.id DESC
+        LIMIT 1
+    ) ls ON TRUE""",
+    )),
+    ([], _SESSIONS_PAGE_SQL.format(last_sentiment="NULL::text", last_sentiment_join="")),
+])
 
 async def _get_db_pool() -> asyncpg.pool.Pool:
-    global _db_pool
-    if _db_pool is None:
-        try:
-            logger.info("🔌 Connecting to Analytics DB...")
-            _db_pool = await asyncpg.create_pool(
-                host=os.getenv("DB_HOST", "db"),
-                user=os.getenv("DB_USER", "softskill"),
-                password=os.getenv("DB_PASSWORD", "supersecret"),
-                database=os.getenv("DB_NAME", "softskill_db"),
-                port=int(os.getenv("DB_PORT", "5432")),
-                min_size=1,
-                max_size=5
-            )
-            logger.info("✅ Analytics DB Connected.")
-        except Exception as e:
-            logger.error(f"❌ DB Connection Failed: {e}")
-            raise e
-    return _db_pool
+    # Pool is opened by the app lifespan (app.core.db); this only connects if startup couldn't
+    pool = await db.get_pool()
+    await schema_registry.ensure_fresh(pool)
+    return pool
+
+
+# One row maintained by triggers (backend/db/analytics_rollups.sql).
+# avg_score averages session_score() over sessions that have metrics.
+_ROLLUP_TOTALS_SQL = """
+    SELECT
+        total_sessions,
+        total_messages,
+        sentiment_positive,
+        sentiment_neutral,
+        sentiment_negative,
+        CASE WHEN total_messages > 0
+             THEN COALESCE(ROUND(score_sum::numeric / NULLIF(scored_sessions, 0)), 0)::int
+             ELSE 0
+        END AS avg_score
+    FROM analytics_totals
+    WHERE id = 1
+"""
+
+# Matches idx_sessions_start_time_id (DESC sorts NULLs first, so they are filtered out)
+_RECENT_SESSIONS_SQL = """
+    SELECT id, scenario_id, start_time
+    FROM sessions
+    WHERE start_time IS NOT NULL
+    ORDER BY start_time DESC, id DESC
+    LIMIT 5
+"""
+
+db.warm(_ROLLUP_TOTALS_SQL)
+db.warm(_RECENT_SESSIONS_SQL)
+
+
+async def _dashboard_data() -> Dict[str, Any]:
+    await _get_db_pool()
+    async with db.acquire() as conn:
+        totals = await conn.fetchrow(_ROLLUP_TOTALS_SQL)
+        if totals is None:
+            logger.warning("⚠️ analytics_totals is empty; run `npm run db:rebuild-rollups` in backend")
+            return _empty_dashboard()
+        recent_rows = await conn.fetch(_RECENT_SESSIONS_SQL)
+
+    return {
+        "overview": {
+            "total_sessions": int(totals["total_sessions"]),
+            "total_messages": int(totals["total_messages"]),
+            "avg_score": int(totals["avg_score"]),
+        },
+        "sentiment": {
+            "positive": int(totals["sentiment_positive"]),
+            "neutral": int(totals["sentiment_neutral"]),
+            "negative": int(totals["sentiment_negative"]),
+        },
+        "recent_activity": [
+            {
+                "id": r["id"],
+                "scenario": r["scenario_id"],
+                "date": r["start_time"].isoformat() if r["start_time"] else None,
+            }
+            for r in recent_rows
+        ],
+    }
 
 
 @router.get("/dashboard")
 async def get_dashboard_analytics():
     """
     Aggregates global stats for the dashboard using real DB data.
+    Cached briefly (see ResponseCache); new messages mark the cache stale.
     """
-    pool = await _get_db_pool()
+    try:
+        return await analytics_cache.get_or_compute(("dashboard",), _dashboard_data)
+    except Exception as e:
+        logger.error(f"Dashboard Data Error: {e}")
+        return _empty_dashboard()
+
 
+def _empty_dashboard() -> Dict[str, Any]:
+    return {
+        "overview": {"total_sessions": 0, "total_messages": 0, "avg_score": 0},
+        "sentiment": {"positive": 0, "neutral": 0, "negative": 0},
+        "recent_activity": [],
+    }
+
+
+def _encode_cursor(start_time: datetime, session_id: int) -> str:
+    raw = json.dumps({"t": start_time.isoformat(), "id": session_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
     try:
-        async with pool.acquire() as conn:
-            counts = await conn.fetchrow(
-                """
-                SELECT
-                    (SELECT COUNT(DISTINCT id) FROM sessions) AS total_sessions,
-                    (SELECT COUNT(*) FROM messages) AS total_messages,
-                    (SELECT COUNT(*) FROM messages WHERE role = 'user') AS total_user_messages
-                """
-            )
-            total_sessions = int(counts["total_sessions"] or 0)
-            total_messages = int(counts["total_messages"] or 0)
-            total_user_messages = int(counts["total_user_messages"] or 0)
-
-            sentiment_stats = {"positive": 0, "neutral": 0, "negative": 0}
-            has_sentiment = await _column_exists(conn, "messages", "sentiment")
-            if has_sentiment:
-                sentiment_rows = await conn.fetch(
-                    """
-                    SELECT
-                        CASE
-                            WHEN label LIKE 'positive%' THEN 'positive'
-                            WHEN label IN ('negative', 'stress', 'anger', 'fear') OR label LIKE 'negative%' THEN 'negative'
-                            ELSE 'neutral'
-                        END AS sentiment,
-                        COUNT(*) AS count
-                    FROM (
-                        SELECT LOWER(COALESCE(sentiment::text, 'neutral')) AS label
-                        FROM messages
-                        WHERE role = 'user'
-                    ) t
-                    GROUP BY sentiment
-                    """
-                )
-                for row in sentiment_rows:
-                    sentiment_stats[row["sentiment"]] = int(row["count"])
-            else:
-                sentiment_stats["neutral"] = total_user_messages
-
-            score_rows = await conn.fetch(
-                """
-                SELECT
-                    s.id AS session_id,
-                    COUNT(sm.id) AS metrics_count,
-                    AVG(CASE WHEN sm.metric_name = 'fluency_score' THEN sm.metric_value END) AS avg_fluency,
-                    AVG(CASE WHEN sm.metric_name = 'sentiment' THEN sm.metric_value END) AS avg_sentiment,
-                    COALESCE(SUM(CASE WHEN sm.metric_name IN ('filler_count', 'filler_word_count') THEN sm.metric_value ELSE 0 END), 0) AS total_fillers
-                FROM sessions s
-                LEFT JOIN session_metrics sm ON sm.session_id = s.id
-                GROUP BY s.id
-                """
-            )
-            scores: List[int] = []
-            for row in score_rows:
-                if not row["metrics_count"]:
-                    continue
-                avg_fluency = float(row["avg_fluency"] or 0.0)
-                avg_sentiment = float(row["avg_sentiment"] or 0.0)
-                total_fillers = float(row["total_fillers"] or 0.0)
-                score = 60 + min(20, (avg_fluency / 10) * 20) - (total_fillers * 2) + ((avg_sentiment + 1) * 10)
-                score = max(0, min(100, round(score)))
-                scores.append(score)
-
-            avg_score = round(sum(scores) / len(scores)) if scores and total_messages > 0 else 0
-
-            recent_rows = await conn.fetch(
-                """
-                SELECT id, scenario_id, start_time
-                FROM sessions
-                ORDER BY start_time DESC NULLS LAST
-                LIMIT 5
-                """
-            )
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(raw["t"]), int(raw["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-            recent_activity = [
-                {
-                    "id": r["id"],
-                    "scenario": r["scenario_id"],
-                    "date": r["start_time"].isoformat() if r["start_time"] else None,
-                }
-                for r in recent_rows
-            ]
-
-        return {
-            "overview": {
-                "total_sessions": total_sessions,
-                "total_messages": total_messages,
-                "avg_score": avg_score,
-            },
-            "sentiment": sentiment_stats,
-            "recent_activity": recent_activity,
-        }
 
-    except Exception as e:
-        logger.error(f"Dashboard Data Error: {e}")
-        return {
-            "overview": {"total_sessions": 0, "total_messages": 0, "avg_score": 0},
-            "sentiment": {"positive": 0, "neutral": 0, "negative": 0},
-            "recent_activity": [],
-        }
+def _naive_utc(value: datetime) -> datetime:
+    # Columns are TIMESTAMP (without time zone)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _sessions_page_query(
+    limit: int,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    user_id: Optional[int] = None,
+    scenario_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Only the filters actually given end up in the SQL, so each combination gets a plain
+    index range scan (sessions(start_time, id) / sessions(user_id, start_time, id)).
+    Sessions without a start_time are not listed.
+    """
+    conditions = ["s.start_time IS NOT NULL"]
+    params: List[Any] = []
+
+    def param(value: Any) -> str:
+        params.append(value)
+        return f"${len(params)}"
+
+    if cursor is not None:
+        conditions.append(f"(s.start_time, s.id) < ({param(_naive_utc(cursor[0]))}, {param(cursor[1])})")
+    if user_id is not None:
+        conditions.append(f"s.user_id = {param(user_id)}")
+    if scenario_id is not None:
+        conditions.append(f"s.scenario_id = {param(scenario_id)}")
+    if date_from is not None:
+        conditions.append(f"s.start_time >= {param(_naive_utc(date_from))}")
+    if date_to is not None:
+        conditions.append(f"s.start_time < {param(_naive_utc(date_to))}")
+
+    sql = schema_registry.query("sessions_list").format(
+        where="\n          AND ".join(conditions), limit=param(limit)
+    )
+    return sql, params
+
 
 @router.get("/sessions_list")
-async def get_sessions_list():
+async def get_sessions_list(
+    response: Response,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
+    user_id: Optional[int] = Query(default=None),
+    scenario_id: Optional[str] = Query(default=None),
+    date_from: Optional[datetime] = Query(default=None, description="Sessions started at or after"),
+    date_to: Optional[datetime] = Query(default=None, description="Sessions started before"),
+):
     """
-    Returns a comprehensive list of all sessions with summary metadata.
+    Returns one page of sessions (newest first) with summary metadata.
+    The body stays a plain list; the cursor for the next page is sent in the
+    X-Next-Cursor header (absent on the last page).
     """
-    pool = await _get_db_pool()
+    position = _decode_cursor(cursor) if cursor else None
+    await _get_db_pool()
     try:
-        async with pool.acquire() as conn:
-            has_sentiment = await _column_exists(conn, "messages", "sentiment")
-            if has_sentiment:
-                sql = """
-                    SELECT
-                        s.id,
-                        s.scenario_id,
-                        s.start_time AS created_at,
-                        COUNT(m.id) AS message_count,
-                        (
-                            SELECT sentiment
-                            FROM messages m2
-                            WHERE m2.session_id = s.id
-                              AND m2.role = 'user'
-                              AND m2.sentiment IS NOT NULL
-                            ORDER BY m2.id DESC
-                            LIMIT 1
-                        ) AS last_sentiment
-                    FROM sessions s
-                    LEFT JOIN messages m ON m.session_id = s.id
-                    GROUP BY s.id
-                    ORDER BY s.start_time DESC NULLS LAST
-                """
-            else:
-                sql = """
-                    SELECT
-                        s.id,
-                        s.scenario_id,
-                        s.start_time AS created_at,
-                        COUNT(m.id) AS message_count,
-                        NULL::text AS last_sentiment
-                    FROM sessions s
-                    LEFT JOIN messages m ON m.session_id = s.id
-                    GROUP BY s.id
-                    ORDER BY s.start_time DESC NULLS LAST
-                """
-            rows = await conn.fetch(sql)
+        # One extra row tells us whether another page exists
+        sql, params = _sessions_page_query(limit + 1, position, user_id, scenario_id, date_from, date_to)
+        async with db.acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(last["created_at"], last["id"])
 
         sessions = []
         for r in rows:
@@ -229,12 +272,14 @@ async def get_sessions_list():
         logger.error(f"Session List Error: {e}")
         return []
 
-@router.get("/summary")
-async def get_sessions_summary(user_id: Optional[int] = Query(default=None)) -> List[Dict[str, Any]]:
-    # ... (Existing logic for backward compatibility)
-    pool = await _get_db_pool()
+
+def _summary_query(user_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """
+    Per-session scores straight from session_score_rollup; sessions without metrics
+    get session_score() of empty aggregates, as before.
+    """
     where_clause = ""
-    params = []
+    params: List[Any] = []
     if user_id is not None:
         where_clause = "WHERE s.user_id = $1"
         params.append(user_id)
@@ -243,32 +288,153 @@ async def get_sessions_summary(user_id: Optional[int] = Query(default=None)) ->
         SELECT
             s.id AS session_id,
             s.start_time AS date,
-            AVG(CASE WHEN sm.metric_name = 'fluency_score' THEN sm.metric_value END) AS avg_fluency,
-            AVG(CASE WHEN sm.metric_name = 'sentiment' THEN sm.metric_value END) AS avg_sentiment,
-            COALESCE(SUM(CASE WHEN sm.metric_name IN ('filler_count', 'filler_word_count') THEN sm.metric_value ELSE 0 END), 0) AS total_fillers
+            COALESCE(r.score, session_score(NULL, NULL, NULL)) AS score,
+            COALESCE(ROUND((r.fluency_sum / NULLIF(r.fluency_count, 0))::numeric, 2), 0)::float AS fluency,
+            COALESCE(TRUNC(r.total_fillers), 0)::int AS fillers
         FROM sessions s
-        LEFT JOIN session_metrics sm ON sm.session_id = s.id
+        LEFT JOIN session_score_rollup r ON r.session_id = s.id
         {where_clause}
-        GROUP BY s.id, s.start_time
         ORDER BY s.start_time DESC
     """
+    return sql, params
+
+
+async def _summary_data(user_id: Optional[int]) -> List[Dict[str, Any]]:
+    await _get_db_pool()
+    sql, params = _summary_query(user_id)
+    async with db.acquire() as conn:
+        rows = await conn.fetch(sql, *params)
+    return [
+        {
+            "session_id": row["session_id"],
+            "score": row["score"],
+            "fluency": row["fluency"],
+            "fillers": row["fillers"],
+            "date": row["date"].isoformat() if row["date"] else None,
+        }
+        for row in rows
+    ]
+
+
+@router.get("/summary")
+async def get_sessions_summary(user_id: Optional[int] = Query(default=None)) -> List[Dict[str, Any]]:
     try:
-        rows = await pool.fetch(sql, *params)
-        summaries = []
-        for row in rows:
-            avg_fluency = float(row["avg_fluency"] or 0.0)
-            avg_sentiment = float(row["avg_sentiment"] or 0.0)
-            total_fillers = float(row["total_fillers"] or 0.0)
-            score = 60 + min(20, (avg_fluency / 10) * 20) - (total_fillers * 2) + ((avg_sentiment + 1) * 10)
-            score = max(0, min(100, round(score)))
-            summaries.append({
-                "session_id": row["session_id"],
-                "score": score,
-                "fluency": round(avg_fluency, 2),
-                "fillers": int(total_fillers),
-                "date": row["date"].isoformat() if row["date"] else None
-            })
-        return summaries
+        return await analytics_cache.get_or_compute(("summary", user_id), lambda: _summary_data(user_id))
     except Exception as exc:
         logger.error(f"Summary Fetch Error: {exc}")
         return []
+
+
+# One JSON document per session: the session row, its messages (each with its turn
+# analysis) and its metrics. Columns are taken as they are, so new ones show up in exports.
+_EXPORT_SQL = """
+    SELECT
+        to_jsonb(s)
+        || jsonb_build_object(
+            'messages', COALESCE(msg.items, '[]'::jsonb),
+            'metrics', COALESCE(met.items, '[]'::jsonb)
+        )
+    FROM sessions s
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(
+            (to_jsonb(m) - 'session_id')
+            || jsonb_build_object('analysis', to_jsonb(ta) - 'session_id' - 'message_id')
+            ORDER BY m.id
+        ) AS items
+        FROM messages m
+        LEFT JOIN turn_analyses ta ON ta.message_id = m.id
+        WHERE m.session_id = s.id
+    ) msg ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(to_jsonb(sm) - 'session_id' ORDER BY sm.id) AS items
+        FROM session_metrics sm
+        WHERE sm.session_id = s.id
+    ) met ON TRUE
+    WHERE {where}
+    ORDER BY s.start_time, s.id
+"""
+
+
+def _export_query(
+    scenario_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> Tuple[str, List[Any]]:
+    conditions = ["TRUE"]
+    params: List[Any] = []
+    if scenario_id is not None:
+        params.append(scenario_id)
+        conditions.append(f"s.scenario_id = ${len(params)}")
+    if date_from is not None:
+        params.append(_naive_utc(date_from))
+        conditions.append(f"s.start_time >= ${len(params)}")
+    if date_to is not None:
+        params.append(_naive_utc(date_to))
+        conditions.append(f"s.start_time < ${len(params)}")
+    return _EXPORT_SQL.format(where=" AND ".join(conditions)), params
+
+
+async def _copy_out(sql: str, params: List[Any]) -> AsyncIterator[bytes]:
+    """
+    Streams COPY (sql) TO STDOUT as it arrives. The bounded queue applies backpressure,
+    so memory stays constant however large the export is.
+    CSV with control characters as quote/delimiter passes each JSON document through
+    unescaped (JSON never contains them raw), giving one document per line.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+
+    async def copy():
+        try:
+            async with db.acquire() as conn:
+                await conn.copy_from_query(
+                    sql, *params, output=queue.put, format="csv", delimiter="\x02", quote="\x01"
+                )
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(copy())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            metrics.inc("analytics_export_bytes_total", len(chunk))
+            yield chunk
+    finally:
+        # Client gone or copy failed: stop the COPY and give the connection back
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+@router.get("/export")
+async def export_sessions(
+    scenario_id: Optional[str] = Query(default=None),
+    date_from: Optional[datetime] = Query(default=None, description="Sessions started at or after"),
+    date_to: Optional[datetime] = Query(default=None, description="Sessions started before"),
+):
+    """
+    Bulk export of sessions with their messages, turn analyses and metrics as NDJSON
+    (one session per line, oldest first), streamed straight from Postgres.
+    """
+    sql, params = _export_query(scenario_id, date_from, date_to)
+    await _get_db_pool()  # Fail with a 500 before any bytes are sent
+    logger.info(f"📦 Export started (scenario={scenario_id}, from={date_from}, to={date_to})")
+
+    async def body():
+        try:
+            async for chunk in _copy_out(sql, params):
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated stream
+            logger.error(f"❌ Export failed: {e}")
+            raise
+
+    return StreamingResponse(
+        body(),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="sessions.ndjson"'},
+    )
@@ -2,9 +2,11 @@ import logging
 import json
 import httpx
 import os
-from fastapi import APIRouter, HTTPException, Form
+import asyncio
+from contextlib import aclosing, suppress
+from fastapi import APIRouter, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
-from typing import Optional, AsyncGenerator, List, Dict, Any
+from typing import Optional, AsyncGenerator, List, Dict, Any, Tuple, Set
 
 import sys
 
@@ -12,6 +14,15 @@ import sys
 try:
     from ai_service.app.engine.orchestrator import orchestrator
     from ai_service.app.engine.scenarios import SCENARIO_REGISTRY
+    from ai_service.app.engine.turns import TurnHandle, turn_manager
+    from ai_service.app.core.config import settings
+    from ai_service.app.services.audio import SAMPLE_RATE
+    from ai_service.app.services.framing import BINARY_MEDIA_TYPE, coalesce_tokens, encode_binary, encode_sse, negotiate_media_type
+    from ai_service.app.services.response_cache import analytics_cache
+    from ai_service.app.services.session_reports import session_reports
+    from ai_service.app.services.stt import STTService
+    from ai_service.app.services.streaming_stt import StreamingTranscriber
+    from ai_service.app.services.tts import TTSService
 except ImportError:
     current_dir = os.path.dirname(os.path.abspath(__file__))
     pipeline_dir = os.path.abspath(os.path.join(current_dir, '../..'))
@@ -19,6 +30,15 @@ except ImportError:
         sys.path.append(pipeline_dir)
     from app.engine.orchestrator import orchestrator
     from app.engine.scenarios import SCENARIO_REGISTRY
+    from app.engine.turns import TurnHandle, turn_manager
+    from app.core.config import settings
+    from app.services.audio import SAMPLE_RATE
+    from app.services.framing import BINARY_MEDIA_TYPE, coalesce_tokens, encode_binary, encode_sse, negotiate_media_type
+    from app.services.response_cache import analytics_cache
+    from app.services.session_reports import session_reports
+    from app.services.stt import STTService
+    from app.services.streaming_stt import StreamingTranscriber
+    from app.services.tts import TTSService
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,19 +46,28 @@ logger = logging.getLogger(__name__)
 # --- Constants ---
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:5000/api")
 INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY", "supersecretkey")
+HISTORY_LIMIT = 10
+# Built once: loading the CA bundle for every short-lived client blocks the event loop (~40ms)
+_SSL_CONTEXT = httpx.create_ssl_context()
+DISCONNECT_POLL_SEC = 0.25
 
-# --- Helper Functions ---
-def _sse_event(event: str, data: str) -> str:
-    return f"event: {event}\ndata: {data}\n\n"
+# Saves scheduled from generator cleanup, where awaiting is no longer safe
+_background_tasks: Set[asyncio.Task] = set()
+
+# Whisper is heavy; load it on the first voice connection, not at import
+_stt_service: Optional[STTService] = None
+_stt_lock = asyncio.Lock()
+_tts_service = TTSService()
 
+# --- Helper Functions ---
 async def _fetch_history(session_id: int) -> List[Dict[str, str]]:
     """
-    Fetches the last 10 messages for context window.
+    Fetches the last HISTORY_LIMIT messages for context window.
     """
     history = []
     try:
-        async with httpx.AsyncClient(headers={"x-internal-api-key": INTERNAL_API_KEY}) as client:
-            resp = await client.get(f"{BACKEND_URL}/chat/sessions/{session_id}/messages?limit=10")
+        async with httpx.AsyncClient(headers={"x-internal-api-key": INTERNAL_API_KEY}, verify=_SSL_CONTEXT) as client:
+            resp = await client.get(f"{BACKEND_URL}/chat/sessions/{session_id}/messages?limit={HISTORY_LIMIT}")
             if resp.status_code == 200:
                 messages = resp.json()
                 for m in messages:
@@ -48,42 +77,24 @@ async def _fetch_history(session_id: int) -> List[Dict[str, str]]:
         logger.error(f"⚠️ History Fetch Error: {e} (Continuing without history)")
     return history
 
-async def _fetch_session_messages(session_id: int) -> List[Dict[str, Any]]:
-    """
-    Fetches full session messages for report generation.
-    """
-    try:
-        async with httpx.AsyncClient(headers={"x-internal-api-key": INTERNAL_API_KEY}) as client:
-            resp = await client.get(f"{BACKEND_URL}/chat/sessions/{session_id}/messages")
-            if resp.status_code == 200:
-                return resp.json()
-            logger.error(f"⚠️ Session Messages Fetch Failed: {resp.status_code} {resp.text}")
-    except Exception as e:
-        logger.error(f"⚠️ Session Messages Fetch Error: {e}")
-    return []
-
-def _normalize_sentiment_label(label: Optional[str]) -> str:
-    if not label:
-        return "neutral"
-    normalized = str(label).strip().lower()
-    if normalized.startswith("label_"):
-        mapping = {"label_0": "neutral", "label_1": "positive", "label_2": "negative"}
-        return mapping.get(normalized, "neutral")
-    return normalized
-
-def _sentiment_to_score(label: str) -> float:
-    if label in ["positive", "joy"]:
-        return 1.0
-    if label in ["negative", "anger", "stress", "fear", "sadness"]:
-        return -1.0
-    return 0.0
+async def _get_stt_service() -> STTService:
+    global _stt_service
+    async with _stt_lock:
+        if _stt_service is None:
+            _stt_service = await asyncio.to_thread(STTService)
+    return _stt_service
+
+def _stt_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+    # The structured word-timing array is for storage, not for the wire
+    return {k: v for k, v in result.items() if k != "word_timings"}
 
 async def _save_message(
     session_id: int,
     role: str,
     content: str,
     sentiment: Optional[str] = None,
-    analysis: Optional[Dict[str, Any]] = None
+    analysis: Optional[Dict[str, Any]] = None,
+    interrupted: bool = False
 ):
     """
     Saves a message to the database asynchronously.
@@ -97,54 +108,93 @@ async def _save_message(
             payload["sentiment"] = sentiment
         if analysis:
             payload["analysis"] = analysis
+        if interrupted:
+            payload["interrupted"] = True
 
-        async with httpx.AsyncClient(headers={"x-internal-api-key": INTERNAL_API_KEY}) as client:
+        async with httpx.AsyncClient(headers={"x-internal-api-key": INTERNAL_API_KEY}, verify=_SSL_CONTEXT) as client:
             await client.post(
                 f"{BACKEND_URL}/chat/sessions/{session_id}/messages",
                 json=payload
             )
+        # Rollups changed: dashboards recompute on their next poll
+        analytics_cache.invalidate()
     except Exception as e:
         logger.error(f"❌ DB Save Error: {e}")
 
-# --- HTTP Endpoints ---
+async def _persist_interrupted(session_id: int, user_text: Optional[str], partial_reply: str):
+    # User message first, so the partial reply lands after it in the transcript
+    if user_text:
+        await _save_message(session_id, "user", user_text)
+    await _save_message(session_id, "assistant", partial_reply, interrupted=True)
 
-@router.post("/interact")
-async def interact(
-    session_id: int = Form(...),
-    text: str = Form(...),
-    scenario_id: Optional[str] = Form(None)
-):
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _turn_events(
+    session_id: int,
+    scenario_id: str,
+    text: str,
+    history: List[Dict[str, str]],
+    cancel: Optional[asyncio.Event] = None,
+    interrupt: bool = True
+) -> AsyncGenerator[Tuple[str, Any], None]:
     """
-    Main Interaction Endpoint (Streaming SSE) with History Injection.
+    Runs one conversation turn through the engine and persists it.
+    Yields (event, data) pairs shared by the SSE and WebSocket transports.
+    Only one turn per session generates at a time: with `interrupt` a new turn cuts off
+    the running one (barge-in), otherwise it waits for it. Resubmitting the text of the
+    running turn follows that generation instead of starting another.
     """
-    if not scenario_id or not scenario_id.strip():
-        raise HTTPException(status_code=400, detail="scenario_id is required")
+    duplicate = turn_manager.find_duplicate(str(session_id), text)
+    if duplicate is not None:
+        async for event in duplicate.follow():
+            yield event
+        return
 
-    logger.info(f"🗣️ Interaction Request: Session={session_id}, Scenario={scenario_id}")
-    is_cold_start = text.strip() == "[START]"
+    turn = await turn_manager.begin(str(session_id), text, cancel, interrupt)
+    try:
+        async with aclosing(_engine_turn_events(turn, session_id, scenario_id, text, history)) as events:
+            async for event in events:
+                turn.publish(*event)
+                yield event
+    finally:
+        turn_manager.end(turn)
 
-    # 1. Fetch History
-    history = await _fetch_history(session_id)
+async def _engine_turn_events(
+    turn: TurnHandle,
+    session_id: int,
+    scenario_id: str,
+    text: str,
+    history: List[Dict[str, str]]
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    If the turn is cut short (`turn.cancel` set, generator closed or task cancelled), whatever
+    the actor already said is persisted as an interrupted assistant message.
+    """
+    cancel = turn.cancel
+    is_cold_start = text.strip() == "[START]"
+    full_content = ""
+    user_saved = is_cold_start
+    completed = False
+    try:
+        if not is_cold_start:
+            yield "transcript", {"role": "user", "text": text}
+        yield "status", "thinking"
 
-    async def event_generator() -> AsyncGenerator[str, None]:
-        try:
-            if not is_cold_start:
-                yield _sse_event("transcript", json.dumps({"role": "user", "text": text}))
-            yield _sse_event("status", "thinking")
-
-            # --- BRANCH: NEW ENGINE ---
-            if scenario_id in SCENARIO_REGISTRY:
-                logger.info(f"🚀 Using Engine Orchestrator for {scenario_id}")
-                full_content = ""
-                analysis_payload: Optional[Dict[str, Any]] = None
-                
-                async for chunk in orchestrator.process_turn(str(session_id), scenario_id, text, history):
+        # --- BRANCH: NEW ENGINE ---
+        if scenario_id in SCENARIO_REGISTRY:
+            logger.info(f"🚀 Using Engine Orchestrator for {scenario_id}")
+            
+            async with aclosing(orchestrator.process_turn(str(session_id), scenario_id, text, history, cancel=cancel)) as chunks:
+                async for chunk in chunks:
                      if isinstance(chunk, dict):
                          # Metadata / Analysis
                          if "type" in chunk and chunk["type"] == "analysis":
-                             analysis_payload = chunk
                              # Map new engine fields to legacy schema for frontend
                              if not is_cold_start:
+                                 user_saved = True
                                  await _save_message(
                                     session_id,
                                     "user",
@@ -152,101 +202,265 @@ async def interact(
                                     sentiment=chunk.get("sentiment", "neutral"),
                                     analysis=chunk
                                 )
-                             yield _sse_event("metrics", json.dumps(chunk, ensure_ascii=False))
+                             yield "metrics", chunk
                      elif isinstance(chunk, str):
                          # Tokens
                          full_content += chunk
-                         yield _sse_event("transcript", json.dumps({"role": "assistant", "text": chunk, "partial": True}))
-                
-                if analysis_payload is None and not is_cold_start:
-                    # Fallback save if analysis failed
-                    await _save_message(session_id, "user", text)
-                
-                await _save_message(session_id, "assistant", full_content)
-                yield _sse_event("status", "done")
-                yield _sse_event("done", "[DONE]")
+                         turn.delivered_chars = len(full_content)
+                         yield "transcript", {"role": "assistant", "text": chunk, "partial": True}
+
+            if cancel.is_set():
+                # Client went away or a newer turn took over; the finally block persists what we have
+                if turn.interrupted:
+                    yield "interrupted", {"delivered_chars": len(full_content)}
                 return
             
-            # --- ERROR: UNKNOWN SCENARIO ---
-            logger.error(f"❌ Scenario '{scenario_id}' not found in registry.")
-            yield _sse_event("error", f"Scenario '{scenario_id}' not found.")
+            if not user_saved:
+                # Fallback save if analysis failed
+                user_saved = True
+                await _save_message(session_id, "user", text)
+            
+            await _save_message(session_id, "assistant", full_content)
+            completed = True
+            yield "status", "done"
+            yield "done", "[DONE]"
+            return
+        
+        # --- ERROR: UNKNOWN SCENARIO ---
+        completed = True
+        logger.error(f"❌ Scenario '{scenario_id}' not found in registry.")
+        yield "error", f"Scenario '{scenario_id}' not found."
+
+    except Exception as e:
+        completed = True
+        logger.error(f"❌ Turn Error: {e}")
+        yield "error", str(e)
+
+    finally:
+        if not completed:
+            logger.info(f"🛑 Turn interrupted: Session={session_id} ({len(full_content)} chars delivered)")
+            _run_in_background(_persist_interrupted(session_id, None if user_saved else text, full_content))
+
+# --- HTTP Endpoints ---
+
+@router.post("/interact")
+async def interact(
+    request: Request,
+    session_id: int = Form(...),
+    text: str = Form(...),
+    scenario_id: Optional[str] = Form(None),
+    interrupt: bool = Form(True),
+    tts: bool = Form(False),
+    language: Optional[str] = Form(None)
+):
+    """
+    Main Interaction Endpoint (Streaming SSE) with History Injection.
+    A new turn interrupts the session's running reply (barge-in) unless `interrupt` is false,
+    in which case it queues behind it.
+    Clients sending `Accept: application/vnd.softskill.frames+msgpack` get the same events as
+    length-prefixed MessagePack frames. With `tts`, the reply audio follows as audio_start /
+    audio / audio_end events before "done" (raw bytes in binary frames, base64 in SSE),
+    spoken in `language` (as for the voice socket; the TTS default otherwise).
+    """
+    if not scenario_id or not scenario_id.strip():
+        raise HTTPException(status_code=400, detail="scenario_id is required")
+
+    logger.info(f"🗣️ Interaction Request: Session={session_id}, Scenario={scenario_id}")
+
+    # 1. Fetch History
+    history = await _fetch_history(session_id)
+
+    # 2. Stop generating as soon as the client goes away (tab closed, fetch aborted)
+    cancel = asyncio.Event()
 
-        except Exception as e:
-            logger.error(f"❌ SSE Stream Error: {e}")
-            yield _sse_event("error", str(e))
+    async def watch_disconnect():
+        while not cancel.is_set():
+            if await request.is_disconnected():
+                logger.info(f"🔌 Client disconnected mid-stream: Session={session_id}")
+                cancel.set()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SEC)
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    encode = encode_binary if media_type == BINARY_MEDIA_TYPE else encode_sse
+
+    async def event_generator() -> AsyncGenerator[bytes, None]:
+        watcher = asyncio.create_task(watch_disconnect())
+        reply = ""
+        try:
+            events = coalesce_tokens(
+                _turn_events(session_id, scenario_id, text, history, cancel, interrupt),
+                settings.STREAM_COALESCE_WINDOW_MS,
+                settings.STREAM_COALESCE_MAX_BYTES,
+            )
+            async with aclosing(events):
+                async for event, data in events:
+                    if event == "transcript" and data.get("role") == "assistant":
+                        reply += data["text"]
+                    elif event == "done" and tts and reply and not cancel.is_set():
+                        yield encode("audio_start", {"format": "mp3"})
+                        async for chunk in _tts_service.stream_audio(reply, language=language):
+                            yield encode("audio", {"chunk": chunk})
+                        yield encode("audio_end", None)
+                    yield encode(event, data)
+        finally:
+            watcher.cancel()
+
+    return StreamingResponse(event_generator(), media_type=media_type)
+
+@router.websocket("/ws/{session_id}")
+async def voice_socket(
+    websocket: WebSocket,
+    session_id: int,
+    scenario_id: str,
+    language: Optional[str] = None,
+    sample_rate: int = SAMPLE_RATE,
+    tts: bool = True,
+    barge_in: bool = True
+):
+    """
+    Full-duplex voice conversation over one connection.
+
+    Client -> server:
+      binary frames                     mono float32 PCM at `sample_rate` (audio worklet output)
+      {"type": "start"}                 cold start, the character opens
+      {"type": "end_of_utterance"}      finalize STT for the buffered speech and run a turn
+      {"type": "text", "text": "..."}   typed turn
+    Server -> client:
+      {"event": ..., "data": ...}       same events as /interact SSE, plus stt_partial / stt_final /
+                                        audio_start / audio_end around binary TTS audio frames
+    History is fetched once and kept in memory for the lifetime of the connection.
+    With `barge_in`, a new utterance cuts off the character's running reply and its TTS audio
+    (an "interrupted" event reports how much was delivered); otherwise turns queue.
+    """
+    if scenario_id not in SCENARIO_REGISTRY:
+        await websocket.close(code=1008, reason=f"Scenario '{scenario_id}' not found.")
+        return
+    await websocket.accept()
+    logger.info(f"🔌 Voice Socket: Session={session_id}, Scenario={scenario_id}")
+
+    history = await _fetch_history(session_id)
+    stt = await _get_stt_service()
+    transcriber = StreamingTranscriber(stt, sample_rate=sample_rate, language=language)
+    send_lock = asyncio.Lock()
+    turn_task: Optional[asyncio.Task] = None
+
+    async def send_event(event: str, data: Any):
+        async with send_lock:
+            await websocket.send_text(json.dumps({"event": event, "data": data}, ensure_ascii=False))
+
+    async def send_audio(text: str):
+        async with send_lock:
+            await websocket.send_text(json.dumps({"event": "audio_start", "data": {"format": "mp3"}}))
+            async for chunk in _tts_service.stream_audio(text, language=language):
+                await websocket.send_bytes(chunk)
+            await websocket.send_text(json.dumps({"event": "audio_end", "data": None}))
+
+    async def run_turn(text: str, previous: Optional[asyncio.Task]):
+        # Turns on one connection run in order; audio keeps flowing in meanwhile
+        if previous is not None:
+            if barge_in:
+                previous.cancel()
+            await asyncio.gather(previous, return_exceptions=True)
+
+        reply = ""
+        try:
+            try:
+                async for event, data in _turn_events(session_id, scenario_id, text, list(history), interrupt=barge_in):
+                    if event == "transcript" and data.get("role") == "assistant":
+                        reply += data["text"]
+                    await send_event(event, data)
+            finally:
+                # Also runs on barge-in, so the next turn sees what was actually said
+                if text.strip() != "[START]":
+                    history.append({"role": "user", "content": text})
+                if reply:
+                    history.append({"role": "assistant", "content": reply})
+                del history[:-HISTORY_LIMIT]
+
+            if reply and tts:
+                await send_audio(reply)
+        except asyncio.CancelledError:
+            with suppress(Exception):
+                await send_event("interrupted", {"delivered_chars": len(reply)})
+            raise
+
+    def start_turn(text: str):
+        nonlocal turn_task
+        turn_task = asyncio.create_task(run_turn(text, turn_task))
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes"):
+                if len(message["bytes"]) % 4:
+                    await send_event("error", "Audio frames must be float32 PCM.")
+                    continue
+                for event in await transcriber.feed(message["bytes"]):
+                    await send_event("stt_partial", event)
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                control = None
+            if not isinstance(control, dict):
+                await send_event("error", "Invalid control message.")
+                continue
+
+            kind = control.get("type")
+            if kind == "start":
+                start_turn("[START]")
+            elif kind == "text" and str(control.get("text", "")).strip():
+                start_turn(control["text"])
+            elif kind == "end_of_utterance":
+                events = await transcriber.finish()
+                transcriber = StreamingTranscriber(stt, sample_rate=sample_rate, language=language)
+                for event in events[:-1]:
+                    await send_event("stt_partial", event)
+                final = _stt_payload(events[-1])
+                await send_event("stt_final", final)
+                if final.get("clean_text"):
+                    start_turn(final["clean_text"])
+            else:
+                await send_event("error", f"Unknown message type '{kind}'.")
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if turn_task is not None and not turn_task.done():
+            turn_task.cancel()
+        logger.info(f"🔌 Voice Socket Closed: Session={session_id}")
 
 @router.post("/report/generate/{session_id}")
 async def generate_report(session_id: int):
     """
-    Generates a lightweight session report using stored messages.
+    Session report from the stored messages. Generated once and persisted
+    (social_reports + per-turn session_metrics); repeat calls are served from storage
+    until the session gets new messages. Turns not yet scored by the background sweep
+    are scored here first (one LLM call).
     """
-    messages = await _fetch_session_messages(session_id)
-    if not messages:
-        return {
-            "session_id": session_id,
-            "summary": {
-                "total_messages": 0,
-                "user_messages": 0,
-                "ai_messages": 0,
-                "avg_sentiment": 0.0,
-            },
-            "tips": ["No messages found for this session."],
-            "metrics": [],
-            "sentiment_arc": [],
-        }
-
-    user_messages = [m for m in messages if m.get("role") == "user"]
-    ai_messages = [m for m in messages if m.get("role") == "ai"]
-
-    metrics = []
-    sentiment_arc = []
-    sentiment_scores = []
-
-    for idx, msg in enumerate(user_messages, start=1):
-        label = _normalize_sentiment_label(msg.get("sentiment"))
-        score = _sentiment_to_score(label)
-        sentiment_scores.append(score)
-        context = f"Analyzed user text: {msg.get('content', '')}"
-
-        sentiment_arc.append(
-            {"turn": idx, "sentiment": label, "score": score, "context": context}
-        )
-        metrics.append(
-            {"metric_name": "sentiment", "metric_value": score, "context": context}
-        )
-        metrics.append(
-            {"metric_name": "topic_adherence", "metric_value": 0.7, "context": context}
-        )
-        metrics.append(
-            {"metric_name": "clarity", "metric_value": 0.7, "context": context}
-        )
-
-    avg_sentiment = (
-        sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0.0
-    )
-
-    tips = []
-    if avg_sentiment > 0.5:
-        tips.append("Maintain the positive tone and keep responses concise.")
-    elif avg_sentiment < -0.2:
-        tips.append("Use de-escalation language and acknowledge the user's frustration.")
-    else:
-        tips.append("Keep responses clear and supportive.")
+    try:
+        return await session_reports.get_or_generate(session_id)
+    except Exception as e:
+        logger.error(f"❌ Report Generation Error (session {session_id}): {e}")
+        raise HTTPException(status_code=503, detail="Report storage unavailable")
 
-    return {
-        "session_id": session_id,
-        "summary": {
-            "total_messages": len(messages),
-            "user_messages": len(user_messages),
-            "ai_messages": len(ai_messages),
-            "avg_sentiment": round(avg_sentiment, 2),
-        },
-        "tips": tips,
-        "metrics": metrics,
-        "sentiment_arc": sentiment_arc,
-    }
+@router.post("/report/generate_all")
+async def generate_all_reports():
+    """
+    Batch mode: generates reports for all finished sessions that don't have a current one.
+    This is also the history backfill; the background sweep only covers new sessions and retries.
+    """
+    try:
+        generated = await session_reports.generate_pending()
+    except Exception as e:
+        logger.error(f"❌ Batch Report Generation Error: {e}")
+        raise HTTPException(status_code=503, detail="Report storage unavailable")
+    return {"generated": generated}
 
 @router.get("/health")
 async def health_check():
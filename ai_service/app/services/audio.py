@@ -0,0 +1,79 @@
+import io
+import logging
+from math import gcd
+from typing import Tuple
+
+import av
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+logger = logging.getLogger(__name__)
+
+# Whisper models are trained on 16kHz mono audio
+SAMPLE_RATE = 16000
+
+# Container magic bytes that libsndfile can read without going through libav
+_SOUNDFILE_MAGIC = (b"RIFF", b"fLaC", b"OggS")
+
+
+def decode_audio(audio_bytes: bytes, sampling_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decodes WAV/WebM/Opus bytes in-process to a mono float32 array at `sampling_rate`.
+    The result can be passed directly to `WhisperModel.transcribe`.
+    """
+    if not audio_bytes:
+        return np.zeros(0, dtype=np.float32)
+
+    samples, source_rate = None, 0
+    if audio_bytes[:4] in _SOUNDFILE_MAGIC:
+        try:
+            samples, source_rate = _read_soundfile(audio_bytes)
+        except Exception as e:
+            # e.g. Ogg/Opus on an older libsndfile - let libav handle it
+            logger.debug(f"soundfile decode failed ({e}), falling back to libav")
+
+    if samples is None:
+        samples, source_rate = _read_libav(audio_bytes)
+
+    return resample(samples, source_rate, sampling_rate)
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Polyphase resampling of a mono float32 signal.
+    """
+    if source_rate == target_rate or samples.size == 0:
+        return samples.astype(np.float32, copy=False)
+
+    divisor = gcd(source_rate, target_rate)
+    resampled = resample_poly(samples, target_rate // divisor, source_rate // divisor)
+    return resampled.astype(np.float32, copy=False)
+
+
+def _read_soundfile(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    data, rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    # (frames, channels) -> mono
+    return data.mean(axis=1), rate
+
+
+def _read_libav(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    with av.open(io.BytesIO(audio_bytes), mode="r") as container:
+        stream = container.streams.audio[0]
+        # Planar float keeps one row per channel, so downmixing is a single mean()
+        resampler = av.AudioResampler(format="fltp")
+        chunks = []
+        rate = stream.rate or SAMPLE_RATE
+
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray())
+                rate = out.sample_rate
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray())
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32), rate
+
+    planar = np.concatenate(chunks, axis=1)
+    return planar.mean(axis=0, dtype=np.float32), rate
@@ -0,0 +1,177 @@
+import re
+import base64
+import struct
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Iterator, List, Optional, Tuple
+
+import msgpack
+import orjson
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("stream_events_total", "Events written to interaction streams (after coalescing).")
+metrics.describe("stream_bytes_total", "Bytes written to interaction streams.")
+metrics.describe("stream_token_chunks_total", "LLM token chunks fed into the coalescer.")
+
+# Flush as soon as the buffered reply ends a sentence (Latin + Hebrew punctuation, newline)
+_SENTENCE_END_RE = re.compile(r"[.!?…:;\n][\"'”’)\]]*\s*$")
+
+Event = Tuple[str, Any]
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Length-prefixed MessagePack frames: 4-byte big-endian length, then {"event": ..., "data": ...}
+BINARY_MEDIA_TYPE = "application/vnd.softskill.frames+msgpack"
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """Binary frames only when the client explicitly accepts them; SSE otherwise."""
+    for part in (accept or "").split(","):
+        media, _, params = part.strip().partition(";")
+        if media.strip().lower() == BINARY_MEDIA_TYPE and "q=0" not in params.replace(" ", "").split(";"):
+            return BINARY_MEDIA_TYPE
+    return SSE_MEDIA_TYPE
+
+
+def encode_sse(event: str, data: Any) -> bytes:
+    """One SSE frame. Strings are sent as-is, bytes as base64, everything else as compact JSON."""
+    if isinstance(data, dict) and any(isinstance(v, bytes) for v in data.values()):
+        data = {k: base64.b64encode(v).decode("ascii") if isinstance(v, bytes) else v for k, v in data.items()}
+    payload = data.encode("utf-8") if isinstance(data, str) else orjson.dumps(data)
+    frame = b"event: " + event.encode("ascii") + b"\ndata: " + payload + b"\n\n"
+    metrics.inc("stream_events_total", transport="sse")
+    metrics.inc("stream_bytes_total", len(frame), transport="sse")
+    return frame
+
+
+def encode_binary(event: str, data: Any) -> bytes:
+    """One length-prefixed MessagePack frame; audio and other bytes travel raw."""
+    body = msgpack.packb({"event": event, "data": data}, default=_pack_default)
+    frame = struct.pack(">I", len(body)) + body
+    metrics.inc("stream_events_total", transport="binary")
+    metrics.inc("stream_bytes_total", len(frame), transport="binary")
+    return frame
+
+
+def _pack_default(obj: Any) -> Any:
+    if hasattr(obj, "item"):
+        return obj.item()  # NumPy scalars
+    raise TypeError(f"Cannot pack {type(obj).__name__}")
+
+
+def decode_binary(stream: bytes) -> Iterator[Event]:
+    """Splits a buffer of complete frames back into (event, data) pairs."""
+    pos = 0
+    while pos < len(stream):
+        (length,) = struct.unpack_from(">I", stream, pos)
+        pos += 4
+        message = msgpack.unpackb(stream[pos:pos + length])
+        pos += length
+        yield message["event"], message["data"]
+
+
+def _is_token(event: str, data: Any) -> bool:
+    return event == "transcript" and isinstance(data, dict) and data.get("partial") and data.get("role") == "assistant"
+
+
+_END = object()
+
+
+class _Failure:
+    """An upstream exception, re-raised by the consumer in stream order."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def _pump(iterator: AsyncIterator[Event], queue: "asyncio.Queue[Any]"):
+    try:
+        async for event in iterator:
+            queue.put_nowait(event)
+    except Exception as e:
+        queue.put_nowait(_Failure(e))
+        return
+    queue.put_nowait(_END)
+
+
+async def coalesce_tokens(
+    events: AsyncIterator[Event],
+    window_ms: int,
+    max_bytes: int
+) -> AsyncGenerator[Event, None]:
+    """
+    Merges consecutive assistant token events into one transcript delta.
+    A delta is flushed when the first buffered token is `window_ms` old, when it reaches
+    `max_bytes` of UTF-8 text, at a sentence boundary, or before any other event.
+    `window_ms <= 0` passes events through unchanged.
+    """
+    if window_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    iterator = events.__aiter__()
+    # One pump task reads upstream for the whole stream; the loop below only waits on the queue
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    pump = asyncio.create_task(_pump(iterator, queue))
+    buffer: List[str] = []
+    buffered_bytes = 0
+    deadline = 0.0
+
+    def flush() -> Event:
+        nonlocal buffer, buffered_bytes
+        text = "".join(buffer)
+        buffer, buffered_bytes = [], 0
+        return "transcript", {"role": "assistant", "text": text, "partial": True}
+
+    try:
+        while True:
+            if not buffer or not queue.empty():
+                item = await queue.get()
+            else:
+                try:
+                    async with asyncio.timeout(max(0.0, deadline - loop.time())):
+                        item = await queue.get()
+                except TimeoutError:
+                    # Producer is slower than the window: don't hold tokens back
+                    yield flush()
+                    continue
+
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            event, data = item
+
+            if not _is_token(event, data):
+                if buffer:
+                    yield flush()
+                yield event, data
+                continue
+
+            metrics.inc("stream_token_chunks_total")
+            if not buffer:
+                deadline = loop.time() + window
+            buffer.append(data["text"])
+            buffered_bytes += len(data["text"].encode("utf-8"))
+            if buffered_bytes >= max_bytes or _SENTENCE_END_RE.search(data["text"]):
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        # The upstream generator may be mid-step in the pump; stop it before closing
+        if not pump.done():
+            pump.cancel()
+            try:
+                await pump
+            except (asyncio.CancelledError, Exception):
+                pass
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
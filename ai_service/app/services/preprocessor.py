@@ -0,0 +1,290 @@
+import re
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.services.audio import decode_audio
+
+logger = logging.getLogger(__name__)
+
+# --- Tokenization ---
+# Words (Hebrew/English, with inner apostrophes like "don't"); everything between tokens is separator text
+_TOKEN_RE = re.compile(r"\w+(?:['’]\w+)*")
+# Elongated hesitations ("ummmm", "אהההה") collapse onto their dictionary form
+_ELONGATION_RE = re.compile(r"(\w)\1{2,}")
+# A clause boundary between two tokens (comma, dash, sentence punctuation)
+_BOUNDARY_RE = re.compile(r"[,;:.!?…\-–—]")
+_TRAILING_COMMA_RE = re.compile(r"\s*,")
+
+# --- Artifact cleanup (Fix Punctuation) ---
+_CLEANUP_RULES = [
+    (re.compile(r"\s*,(?:\s*,)+"), ","),        # ", ," left behind by removed fillers
+    (re.compile(r"\s+([,.!?;:])"), r"\1"),      # No space before punctuation
+    (re.compile(r",\s*([.!?])"), r"\1"),        # "word, ." -> "word."
+    (re.compile(r"^[\s,.;:!?\-–—]+"), ""),      # Leading punctuation
+    (re.compile(r"\s{2,}"), " "),
+]
+
+
+class MatchContext:
+    """Token-level view around one automaton match, handed to context rules."""
+    __slots__ = ("tokens", "start", "end", "boundary_before", "boundary_after")
+
+    def __init__(self, tokens: Sequence[str], start: int, end: int, boundary_before: bool, boundary_after: bool):
+        self.tokens = tokens
+        self.start = start          # Index of the first matched token
+        self.end = end              # Index one past the last matched token
+        self.boundary_before = boundary_before
+        self.boundary_after = boundary_after
+
+    @property
+    def prev(self) -> Optional[str]:
+        # Hesitations are transparent: in "I um, like it" the word before "like" is "I"
+        i = self.start - 1
+        while i >= 0 and self.tokens[i] in _HESITATIONS:
+            i -= 1
+        return self.tokens[i] if i >= 0 else None
+
+    @property
+    def next(self) -> Optional[str]:
+        return self.tokens[self.end] if self.end < len(self.tokens) else None
+
+
+ContextRule = Callable[[MatchContext], bool]
+
+
+# --- Context Rules ---
+
+# Subjects / auxiliaries / perception verbs that make "like" a verb or a comparison ("I like", "looks like")
+_LIKE_VERB_CONTEXT = frozenset({
+    "i", "you", "we", "they", "he", "she", "people", "would", "i'd", "you'd", "we'd", "they'd",
+    "do", "does", "did", "don't", "doesn't", "didn't", "really", "also", "to", "will", "should",
+    "might", "could", "not", "look", "looks", "looked", "feel", "feels", "felt", "seem", "seems",
+    "sound", "sounds", "something", "anything", "nothing", "just", "more", "much", "would've",
+})
+# Quotative "like" ("he was like ...")
+_LIKE_QUOTATIVE_CONTEXT = frozenset({"was", "is", "were", "am", "i'm", "he's", "she's", "it's", "they're", "we're"})
+_QUESTION_CONTEXT = frozenset({"do", "did", "don't", "didn't", "if", "would", "will", "to", "what", "how"})
+_DETERMINERS = frozenset({"a", "the", "this", "that", "what", "any", "some", "every", "one", "which", "same"})
+
+
+def _always(ctx: MatchContext) -> bool:
+    return True
+
+
+def _like_is_filler(ctx: MatchContext) -> bool:
+    # Preserve Verb 'Like': "I like pizza", "would like to", "looks like rain"
+    if ctx.prev in _LIKE_VERB_CONTEXT:
+        return False
+    if ctx.prev in _LIKE_QUOTATIVE_CONTEXT:
+        return True
+    # Parenthetical use ("it was, like, huge"); "Like I said" stays
+    return ctx.boundary_before or ctx.boundary_after
+
+
+def _parenthetical(ctx: MatchContext) -> bool:
+    # "you know," / ", I mean" / "... you know" but not "do you know the way"
+    if ctx.prev in _QUESTION_CONTEXT:
+        return False
+    return ctx.boundary_before or ctx.boundary_after or ctx.end == len(ctx.tokens)
+
+
+def _boundary_after(ctx: MatchContext) -> bool:
+    return ctx.boundary_after or ctx.end == len(ctx.tokens)
+
+
+def _hedge(ctx: MatchContext) -> bool:
+    # "it's kind of hard" is a hedge, "what kind of job" is not
+    return ctx.prev not in _DETERMINERS
+
+
+def _kailu_is_filler(ctx: MatchContext) -> bool:
+    # "כאילו שהוא..." ("as if he...") is a conjunction, not a filler
+    return not (ctx.next or "").startswith("ש")
+
+
+# Single-token sounds that are fillers in any context
+_HESITATIONS = frozenset({
+    "um", "umm", "uh", "uhh", "uhm", "er", "erm", "hmm", "mm", "ah", "eh",
+    "אה", "אהה", "אמ", "אממ", "הממ", "ממ", "יעני",
+})
+
+# (phrase, rule) - phrases are matched on normalized tokens
+FILLER_PATTERNS: List[Tuple[str, ContextRule]] = [
+    *[(w, _always) for w in sorted(_HESITATIONS)],
+    ("like", _like_is_filler),
+    ("you know", _parenthetical),
+    ("i mean", _parenthetical),
+    ("sort of", _hedge),
+    ("kind of", _hedge),
+    ("כאילו", _kailu_is_filler),
+    ("זאת אומרת", _boundary_after),
+    ("איך אומרים", _boundary_after),
+    ("נו", _parenthetical),
+]
+
+
+class FillerAutomaton:
+    """
+    Aho-Corasick automaton over word tokens.
+    All filler phrases are found in one left-to-right pass over the transcript,
+    regardless of how many patterns are registered.
+    """
+
+    def __init__(self, patterns: Sequence[Tuple[str, ContextRule]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per node: (phrase length in tokens, pattern index) of every phrase ending here
+        self._out: List[List[Tuple[int, int]]] = [[]]
+        self.phrases: List[str] = []
+        self.rules: List[ContextRule] = []
+
+        for idx, (phrase, rule) in enumerate(patterns):
+            tokens = [normalize_token(t) for t in phrase.split()]
+            self.phrases.append(phrase)
+            self.rules.append(rule)
+            node = 0
+            for token in tokens:
+                nxt = self._goto[node].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(tokens), idx))
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        # Depth-1 nodes fail to the root; deeper nodes follow their parent's fail chain (BFS order)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, tokens: Sequence[str], boundaries: Sequence[bool]) -> List[Tuple[int, int, int]]:
+        """
+        Returns non-overlapping (start, end, pattern) token spans whose context rule accepts.
+        `boundaries[i]` tells whether separator text before token i contains a clause boundary
+        (len(tokens) + 1 entries; the last one is the text after the final token). Utterance
+        edges are not boundaries by themselves - rules check `start`/`end` when they care.
+        """
+        candidates: List[Tuple[int, int, int]] = []
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, token in enumerate(tokens):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for length, idx in out[node]:
+                start, end = i - length + 1, i + 1
+                ctx = MatchContext(tokens, start, end, boundaries[start], boundaries[end])
+                if self.rules[idx](ctx):
+                    candidates.append((start, end, idx))
+
+        # Candidates arrive ordered by end; keep the longest leftmost non-overlapping spans
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        matches, last_end = [], 0
+        for start, end, idx in candidates:
+            if start >= last_end:
+                matches.append((start, end, idx))
+                last_end = end
+        return matches
+
+
+def normalize_token(token: str) -> str:
+    return _ELONGATION_RE.sub(r"\1\1", token.lower().replace("’", "'"))
+
+
+_AUTOMATON = FillerAutomaton(FILLER_PATTERNS)
+
+
+class Preprocessor:
+    """
+    Layer 1 of the STT pipeline: audio normalization and context-aware filler filtering.
+    """
+
+    @staticmethod
+    async def normalize_audio(audio_bytes: bytes) -> np.ndarray:
+        """
+        Decodes uploaded audio (WAV/WebM/Opus) to 16kHz mono float32, off the event loop.
+        """
+        return await asyncio.to_thread(decode_audio, audio_bytes)
+
+    @staticmethod
+    def process_text(raw_text: str) -> Tuple[List[str], str, int]:
+        """
+        Detects fillers in one pass and removes them.
+        Returns (detected fillers, clean text, filler count).
+        """
+        spans = [(m.start(), m.end()) for m in _TOKEN_RE.finditer(raw_text)]
+        if not spans:
+            return [], raw_text.strip(), 0
+
+        tokens = [normalize_token(raw_text[s:e]) for s, e in spans]
+        matches = _AUTOMATON.find(tokens, _separator_boundaries(raw_text, spans))
+        if not matches:
+            return [], _cleanup(raw_text), 0
+
+        pieces, cursor, fillers = [], 0, []
+        for start, end, _ in matches:
+            char_start, char_end = spans[start][0], spans[end - 1][1]
+            fillers.append(raw_text[char_start:char_end])
+            pieces.append(raw_text[cursor:char_start])
+            # Swallow the comma that closed a parenthetical filler ("like, um, pizza")
+            trailing = _TRAILING_COMMA_RE.match(raw_text, char_end)
+            cursor = trailing.end() if trailing else char_end
+            pieces.append(" ")
+        pieces.append(raw_text[cursor:])
+
+        return fillers, _cleanup("".join(pieces)), len(fillers)
+
+    @staticmethod
+    def filler_mask(words: Sequence[str]) -> np.ndarray:
+        """
+        Marks which of the given words (e.g. Whisper word timestamps) belong to a filler.
+        Word-level punctuation ("um,") feeds the same boundary rules as process_text.
+        """
+        mask = np.zeros(len(words), dtype=bool)
+        if not words:
+            return mask
+
+        tokens, boundaries, owners = [], [False], []
+        for i, word in enumerate(words):
+            matches = list(_TOKEN_RE.finditer(word))
+            if not matches:
+                # Stand-alone punctuation word ("-", "...")
+                boundaries[-1] = boundaries[-1] or bool(_BOUNDARY_RE.search(word))
+                continue
+            boundaries[-1] = boundaries[-1] or bool(_BOUNDARY_RE.search(word, 0, matches[0].start()))
+            for m in matches:
+                tokens.append(normalize_token(m.group()))
+                owners.append(i)
+                boundaries.append(False)
+            boundaries[-1] = bool(_BOUNDARY_RE.search(word, matches[-1].end()))
+
+        for start, end, _ in _AUTOMATON.find(tokens, boundaries):
+            mask[owners[start]:owners[end - 1] + 1] = True
+        return mask
+
+
+def _separator_boundaries(text: str, spans: List[Tuple[int, int]]) -> List[bool]:
+    edges = [0] + [e for _, e in spans]
+    starts = [s for s, _ in spans] + [len(text)]
+    return [bool(_BOUNDARY_RE.search(text, prev_end, next_start)) for prev_end, next_start in zip(edges, starts)]
+
+
+def _cleanup(text: str) -> str:
+    for pattern, replacement in _CLEANUP_RULES:
+        text = pattern.sub(replacement, text)
+    return text.strip()
@@ -0,0 +1,118 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger("ResponseCache")
+
+metrics.describe("analytics_cache_requests_total", "Analytics cache lookups by endpoint and result (hit/stale/miss/coalesced).")
+metrics.describe("analytics_cache_compute_errors_total", "Analytics computations (request or background refresh) that failed.")
+
+
+class _Entry:
+    __slots__ = ("value", "created", "generation")
+
+    def __init__(self, value: Any, created: float, generation: int):
+        self.value = value
+        self.created = created
+        self.generation = generation
+
+
+class ResponseCache:
+    """
+    TTL cache for computed responses with stale-while-revalidate.
+
+    - fresh (younger than `ttl_sec`, not invalidated): served as is
+    - stale (older, or invalidated since it was computed) but younger than `ttl_sec + stale_sec`:
+      served immediately while one background task recomputes it
+    - otherwise: computed in the request; concurrent requests for the key share that computation
+
+    `invalidate()` only marks entries stale, so readers never wait on a write burst.
+    Failed computations are not cached.
+    """
+
+    def __init__(self, ttl_sec: float, stale_sec: float, max_entries: int):
+        self.ttl_sec = ttl_sec
+        self.stale_sec = stale_sec
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}  # Also keeps background refreshes referenced
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0
+
+    def invalidate(self):
+        self._generation += 1
+
+    async def get_or_compute(self, key: Tuple[Hashable, ...], compute: Callable[[], Awaitable[Any]]) -> Any:
+        """`key` starts with the endpoint name (used as the metrics label)."""
+        if not self.enabled:
+            return await compute()
+        endpoint = str(key[0])
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.created
+            if age < self.ttl_sec and entry.generation == self._generation:
+                self._entries.move_to_end(key)
+                metrics.inc("analytics_cache_requests_total", endpoint=endpoint, result="hit")
+                return entry.value
+            if age < self.ttl_sec + self.stale_sec:
+                self._entries.move_to_end(key)
+                metrics.inc("analytics_cache_requests_total", endpoint=endpoint, result="stale")
+                if key not in self._inflight:
+                    self._start(key, compute)
+                return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.inc("analytics_cache_requests_total", endpoint=endpoint, result="coalesced")
+        else:
+            metrics.inc("analytics_cache_requests_total", endpoint=endpoint, result="miss")
+            task = self._start(key, compute)
+        # Shielded: a client going away must not cancel a computation others wait on
+        return await asyncio.shield(task)
+
+    def _start(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.create_task(self._compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        # Tagged with the generation seen at start: a write during the query leaves it stale
+        generation = self._generation
+        created = time.monotonic()
+        try:
+            value = await compute()
+            self._store(key, _Entry(value, created, generation))
+            return value
+        finally:
+            del self._inflight[key]
+
+    def _on_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            metrics.inc("analytics_cache_compute_errors_total")
+            logger.warning(f"⚠️ Analytics computation failed (not cached): {task.exception()}")
+
+    def _store(self, key: Hashable, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+analytics_cache = ResponseCache(
+    ttl_sec=settings.ANALYTICS_CACHE_TTL_SEC,
+    stale_sec=settings.ANALYTICS_CACHE_STALE_SEC,
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,124 @@
+import time
+import asyncio
+import logging
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.db import db
+from app.core.metrics import metrics
+
+logger = logging.getLogger("SchemaRegistry")
+
+metrics.describe("schema_introspections_total", "Catalog introspections run by the analytics schema registry.")
+
+# Sent by the backend after running migrations (backend/src/db/migrate.ts)
+SCHEMA_CHANGED_CHANNEL = "schema_changed"
+
+Column = Tuple[str, str]
+
+_COLUMNS_SQL = """
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE table_schema = ANY(current_schemas(false))
+"""
+
+
+class SchemaRegistry:
+    """
+    Caches which (table, column) pairs exist and picks query variants from that snapshot,
+    so request handlers never hit information_schema.
+
+    Queries are registered as ordered variants, each with the columns it needs; the first
+    variant whose columns all exist is selected on every refresh. The snapshot is refreshed
+    after `ttl_sec`, on `invalidate()`, or when the backend sends NOTIFY schema_changed.
+    """
+
+    def __init__(self, ttl_sec: float):
+        self.ttl_sec = ttl_sec
+        self._columns: FrozenSet[Column] = frozenset()
+        self._variants: Dict[str, List[Tuple[Tuple[Column, ...], str]]] = {}
+        self._selected: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncpg.Connection] = None
+
+    def register(self, name: str, variants: Sequence[Tuple[Sequence[Column], str]]):
+        """Variants in order of preference; the last one should need no optional columns."""
+        self._variants[name] = [(tuple(required), sql) for required, sql in variants]
+        if self._loaded_at is not None:
+            self._select()
+
+    def has_column(self, table: str, column: str) -> bool:
+        return (table, column) in self._columns
+
+    def query(self, name: str) -> str:
+        sql = self._selected.get(name)
+        if sql is None:
+            # Not loaded yet: the most conservative variant is always safe
+            sql = self._variants[name][-1][1]
+        return sql
+
+    @property
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl_sec
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def refresh(self, pool: asyncpg.Pool):
+        """Re-reads the catalog. Concurrent callers share one introspection."""
+        async with self._lock:
+            if not self.is_stale:
+                return
+            rows = await pool.fetch(_COLUMNS_SQL)
+            self._columns = frozenset((r["table_name"], r["column_name"]) for r in rows)
+            self._select()
+            self._loaded_at = time.monotonic()
+            metrics.inc("schema_introspections_total")
+            logger.info(f"🗂️ Schema snapshot loaded ({len(self._columns)} columns)")
+
+    async def ensure_fresh(self, pool: asyncpg.Pool):
+        if self.is_stale:
+            try:
+                await self.refresh(pool)
+            except Exception as e:
+                # Keep serving from the previous snapshot (or the safe variants)
+                logger.warning(f"⚠️ Schema refresh failed: {e}")
+
+    def _select(self):
+        self._selected = {
+            name: next((sql for required, sql in variants if all(c in self._columns for c in required)),
+                       variants[-1][1])
+            for name, variants in self._variants.items()
+        }
+
+    async def attach(self, pool: asyncpg.Pool, **connect_kwargs):
+        """First snapshot for a new pool, and the NOTIFY listener unless it is already running."""
+        await self.ensure_fresh(pool)
+        if self._listener is None:
+            await self.listen(**connect_kwargs)
+
+    async def listen(self, **connect_kwargs):
+        """Dedicated connection for NOTIFY schema_changed (pooled connections drop listeners on release)."""
+        try:
+            self._listener = await asyncpg.connect(**connect_kwargs)
+            await self._listener.add_listener(SCHEMA_CHANGED_CHANNEL, self._on_schema_changed)
+        except Exception as e:
+            self._listener = None
+            logger.warning(f"⚠️ Schema change listener unavailable, relying on TTL: {e}")
+
+    def _on_schema_changed(self, connection, pid, channel, payload):
+        logger.info("🗂️ Schema change signalled, snapshot invalidated")
+        self.invalidate()
+
+    async def close(self):
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+
+schema_registry = SchemaRegistry(ttl_sec=settings.ANALYTICS_SCHEMA_TTL_SEC)
+# Also when the DB was down at startup and the pool is first opened by a request
+db.on_pool_created(lambda pool: schema_registry.attach(pool, **db.connect_kwargs))
@@ -0,0 +1,413 @@
+import json
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.db import db
+from app.core.metrics import metrics
+from app.services.response_cache import analytics_cache
+from app.services.turn_scoring import CLEAR_METRICS_SQL, INSERT_METRICS_SQL, SCORED_METRICS, turn_context, turn_scoring
+
+logger = logging.getLogger("SessionReports")
+
+metrics.describe("session_reports_total", "Session reports served, by source (stored/generated).")
+
+# Per-turn metrics owned by the report; replaced whenever a report is regenerated.
+# topic_adherence/clarity belong to the scoring stage (turn_scoring) and are only read here.
+REPORT_METRICS = ("sentiment",)
+
+# Version of a session's messages: count, newest id and a checksum of the sentiments in order,
+# so a sentiment written after the report (backend updateLatestUserSentiment) makes it stale too.
+# Aggregate over `messages m`; NULL for a session without messages.
+_MESSAGES_VERSION = """
+    COUNT(*) || ':' || MAX(m.id) || ':' || md5(string_agg(COALESCE(m.sentiment, ''), ',' ORDER BY m.id))
+"""
+
+# A stored report is current while the session's messages are still the version it was built from
+# and its turns were scored (otherwise scoring is retried on the next request/sweep)
+_CURRENT_REPORT = f"""
+    r.report IS NOT NULL
+    AND (r.report ->> 'scored')::boolean
+    AND r.report ->> 'messages_version' =
+        (SELECT {_MESSAGES_VERSION} FROM messages m WHERE m.session_id = r.session_id)
+"""
+
+_CURRENT_REPORTS_SQL = f"""
+    SELECT DISTINCT ON (r.session_id) r.session_id, r.report
+    FROM social_reports r
+    WHERE r.session_id = ANY($1::int[])
+      AND {_CURRENT_REPORT}
+    ORDER BY r.session_id, r.created_at DESC
+"""
+
+# Ended, or idle for {idle} seconds: nothing sets end_time for sessions that just stop
+_FINISHED_SESSION = """(
+    s.end_time IS NOT NULL
+    OR NOT EXISTS (
+        SELECT 1 FROM messages m
+        WHERE m.session_id = s.id AND m.created_at >= LOCALTIMESTAMP - make_interval(secs => {idle})
+    )
+)"""
+
+# Finished sessions (idle for $3 seconds) with messages but no current report, in id order
+_PENDING_SESSIONS_SQL = f"""
+    SELECT s.id
+    FROM sessions s
+    WHERE s.id > $1
+      AND EXISTS (SELECT 1 FROM messages m WHERE m.session_id = s.id)
+      AND {_FINISHED_SESSION.format(idle="$3")}
+      AND NOT EXISTS (SELECT 1 FROM social_reports r WHERE r.session_id = s.id AND {_CURRENT_REPORT})
+    ORDER BY s.id
+    LIMIT $2
+"""
+
+# Sweep watermark: sessions up to it were handled. Starts at the newest session, so the
+# sweep never walks the history (that is /report/generate_all).
+_WATERMARK_INIT_SQL = """
+    INSERT INTO report_sweep_watermark (id, last_session_id)
+    SELECT 1, COALESCE(MAX(id), 0) FROM sessions
+    ON CONFLICT (id) DO NOTHING
+"""
+
+_WATERMARK_SQL = "SELECT last_session_id FROM report_sweep_watermark WHERE id = 1"
+
+_ADVANCE_WATERMARK_SQL = """
+    UPDATE report_sweep_watermark SET last_session_id = GREATEST(last_session_id, $1) WHERE id = 1
+"""
+
+# Newest session past the watermark, and the first one still in progress ($2: idle seconds)
+_SWEEP_BOUNDS_SQL = f"""
+    SELECT MAX(s.id) AS last_id, MIN(s.id) FILTER (WHERE NOT {_FINISHED_SESSION.format(idle="$2")}) AS first_active
+    FROM sessions s
+    WHERE s.id > $1
+"""
+
+# Finished sessions in ($1, $2] never tried before and without a current report; failures go the retry path
+_SWEEP_NEW_SESSIONS_SQL = f"""
+    SELECT s.id
+    FROM sessions s
+    WHERE s.id > $1 AND s.id <= $2
+      AND EXISTS (SELECT 1 FROM messages m WHERE m.session_id = s.id)
+      AND {_FINISHED_SESSION.format(idle="$3")}
+      AND NOT EXISTS (SELECT 1 FROM session_scoring_attempts a WHERE a.session_id = s.id)
+      AND NOT EXISTS (SELECT 1 FROM social_reports r WHERE r.session_id = s.id AND {_CURRENT_REPORT})
+    ORDER BY s.id
+    LIMIT $4
+"""
+
+# Failed scoring due again: exponential backoff from $2 seconds, fewer than $1 attempts so far
+_DUE_RETRIES_SQL = """
+    SELECT session_id
+    FROM session_scoring_attempts
+    WHERE attempts < $1
+      AND last_attempt_at <= LOCALTIMESTAMP - make_interval(secs => $2 * power(2, attempts - 1))
+    ORDER BY last_attempt_at
+    LIMIT $3
+"""
+
+# Serializes generation per session across requests, batch runs and service replicas
+_LOCK_SESSIONS_SQL = "SELECT pg_advisory_xact_lock(hashtext('session_report'), id) FROM unnest($1::int[]) AS t(id)"
+
+# Messages and their version in one statement (one snapshot), so the stored version matches what was read
+_SESSION_MESSAGES_SQL = f"""
+    SELECT m.session_id, m.role, m.content, m.sentiment, v.messages_version
+    FROM messages m
+    JOIN (
+        SELECT m.session_id, {_MESSAGES_VERSION} AS messages_version
+        FROM messages m
+        WHERE m.session_id = ANY($1::int[])
+        GROUP BY m.session_id
+    ) v ON v.session_id = m.session_id
+    ORDER BY m.session_id, m.id
+"""
+
+# Scores written by the scoring stage, in turn order
+_TURN_SCORES_SQL = """
+    SELECT session_id, metric_name, metric_value
+    FROM session_metrics
+    WHERE session_id = ANY($1::int[])
+      AND metric_name = ANY($2::text[])
+    ORDER BY session_id, id
+"""
+
+_CLEAR_REPORTS_SQL = "DELETE FROM social_reports WHERE session_id = ANY($1::int[]) AND report IS NOT NULL"
+
+# overall_score is the same session_score() the dashboard uses, including the metrics just written
+_INSERT_REPORTS_SQL = """
+    INSERT INTO social_reports (session_id, overall_score, feedback, report)
+    SELECT t.session_id, COALESCE(sr.score, session_score(NULL, NULL, NULL)), t.feedback, t.report::jsonb
+    FROM unnest($1::int[], $2::text[], $3::text[]) AS t(session_id, feedback, report)
+    LEFT JOIN session_score_rollup sr ON sr.session_id = t.session_id
+"""
+
+
+def normalize_sentiment_label(label: Optional[str]) -> str:
+    if not label:
+        return "neutral"
+    normalized = str(label).strip().lower()
+    if normalized.startswith("label_"):
+        mapping = {"label_0": "neutral", "label_1": "positive", "label_2": "negative"}
+        return mapping.get(normalized, "neutral")
+    return normalized
+
+
+def sentiment_to_score(label: str) -> float:
+    if label in ["positive", "joy"]:
+        return 1.0
+    if label in ["negative", "anger", "stress", "fear", "sadness"]:
+        return -1.0
+    return 0.0
+
+
+def empty_report(session_id: int) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "summary": {
+            "total_messages": 0,
+            "user_messages": 0,
+            "ai_messages": 0,
+            "avg_sentiment": 0.0,
+        },
+        "tips": ["No messages found for this session."],
+        "metrics": [],
+        "sentiment_arc": [],
+        "scored": False,
+    }
+
+
+def build_report(
+    session_id: int,
+    messages: Sequence[Mapping[str, Any]],
+    turn_scores: Optional[Mapping[str, Sequence[float]]] = None
+) -> Dict[str, Any]:
+    """
+    Report for one session from its messages (oldest first) and the scoring stage's
+    per-turn values ({metric_name: [value per user turn]}). Without a complete set of
+    scores, topic_adherence/clarity are left out and the report is marked unscored.
+    """
+    if not messages:
+        return empty_report(session_id)
+
+    user_messages = [m for m in messages if m.get("role") == "user"]
+    ai_messages = [m for m in messages if m.get("role") == "ai"]
+
+    turn_scores = turn_scores or {}
+    scored = all(len(turn_scores.get(name, ())) == len(user_messages) for name in SCORED_METRICS)
+
+    report_metrics = []
+    sentiment_arc = []
+    sentiment_scores = []
+
+    for idx, msg in enumerate(user_messages, start=1):
+        label = normalize_sentiment_label(msg.get("sentiment"))
+        score = sentiment_to_score(label)
+        sentiment_scores.append(score)
+        context = turn_context(msg.get("content", ""))
+
+        sentiment_arc.append(
+            {"turn": idx, "sentiment": label, "score": score, "context": context}
+        )
+        report_metrics.append(
+            {"metric_name": "sentiment", "metric_value": score, "context": context}
+        )
+        if scored:
+            for name in SCORED_METRICS:
+                report_metrics.append(
+                    {"metric_name": name, "metric_value": turn_scores[name][idx - 1], "context": context}
+                )
+
+    avg_sentiment = (
+        sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0.0
+    )
+
+    tips = []
+    if avg_sentiment > 0.5:
+        tips.append("Maintain the positive tone and keep responses concise.")
+    elif avg_sentiment < -0.2:
+        tips.append("Use de-escalation language and acknowledge the user's frustration.")
+    else:
+        tips.append("Keep responses clear and supportive.")
+
+    return {
+        "session_id": session_id,
+        "summary": {
+            "total_messages": len(messages),
+            "user_messages": len(user_messages),
+            "ai_messages": len(ai_messages),
+            "avg_sentiment": round(avg_sentiment, 2),
+        },
+        "tips": tips,
+        "metrics": report_metrics,
+        "sentiment_arc": sentiment_arc,
+        "scored": scored,
+    }
+
+
+class SessionReportService:
+    """
+    Builds session reports straight from the database and persists them: the report
+    document in social_reports, its per-turn metrics in session_metrics. A stored report
+    is served again until the session's messages or their sentiments change, so generation is idempotent.
+    Turns are scored (one LLM call per session) before the report is built.
+    """
+
+    async def get_or_generate(self, session_id: int) -> Dict[str, Any]:
+        async with db.acquire() as conn:
+            stored = await conn.fetch(_CURRENT_REPORTS_SQL, [session_id])
+        if stored:
+            metrics.inc("session_reports_total", source="stored")
+            return json.loads(stored[0]["report"])
+
+        await turn_scoring.ensure_scored([session_id])
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                reports, _ = await self._generate(conn, [session_id])
+        return reports.get(session_id) or empty_report(session_id)
+
+    async def generate_pending(self, batch_size: Optional[int] = None) -> int:
+        """
+        Batch mode (/report/generate_all): reports for every finished session without a current one,
+        including the history. Each chunk of sessions is scored, then gets one message read and
+        one set of bulk writes. Sessions out of scoring attempts get an unscored report.
+        """
+        batch_size = batch_size or settings.REPORT_BATCH_SIZE
+        generated = 0
+        last_id = 0
+        while True:
+            async with db.acquire() as conn:
+                ids = [
+                    r["id"]
+                    for r in await conn.fetch(_PENDING_SESSIONS_SQL, last_id, batch_size, settings.SESSION_IDLE_FINISH_SEC)
+                ]
+            if not ids:
+                break
+            await turn_scoring.ensure_scored(ids, max_attempts=settings.SCORING_MAX_ATTEMPTS)
+            async with db.acquire() as conn:
+                async with conn.transaction():
+                    _, count = await self._generate(conn, ids)
+            generated += count
+            last_id = ids[-1]
+            logger.info(f"📝 Reports generated: {generated} (up to session {last_id})")
+        return generated
+
+    async def sweep(self, max_sessions: Optional[int] = None) -> int:
+        """
+        One pass of the background sweep: sessions finished since the stored watermark, plus
+        failed scorings whose backoff has expired, at most `max_sessions` of each.
+        Returns the number of reports generated.
+        """
+        max_sessions = max_sessions or settings.REPORT_SWEEP_MAX_SESSIONS
+        idle = settings.SESSION_IDLE_FINISH_SEC
+        async with db.acquire() as conn:
+            await conn.execute(_WATERMARK_INIT_SQL)
+            watermark = await conn.fetchval(_WATERMARK_SQL)
+            bounds = await conn.fetchrow(_SWEEP_BOUNDS_SQL, watermark, idle)
+            last_id, first_active = bounds["last_id"], bounds["first_active"]
+            new_ids = []
+            if last_id is not None:
+                new_ids = [
+                    r["id"] for r in await conn.fetch(_SWEEP_NEW_SESSIONS_SQL, watermark, last_id, idle, max_sessions)
+                ]
+            retry_ids = [
+                r["session_id"]
+                for r in await conn.fetch(
+                    _DUE_RETRIES_SQL, settings.SCORING_MAX_ATTEMPTS, settings.SCORING_RETRY_BACKOFF_SEC, max_sessions
+                )
+            ]
+
+        generated = 0
+        ids = sorted(set(new_ids) | set(retry_ids))
+        if ids:
+            await turn_scoring.ensure_scored(ids, max_attempts=settings.SCORING_MAX_ATTEMPTS)
+            async with db.acquire() as conn:
+                async with conn.transaction():
+                    _, generated = await self._generate(conn, ids)
+            logger.info(f"📝 Report sweep: {generated} generated ({len(new_ids)} new, {len(retry_ids)} retried)")
+
+        # Handled: everything before the first session still in progress, up to this pass's cap
+        if last_id is not None:
+            advance_to = last_id
+            if first_active is not None:
+                advance_to = min(advance_to, first_active - 1)
+            if len(new_ids) == max_sessions:
+                advance_to = min(advance_to, new_ids[-1])
+            if advance_to > watermark:
+                async with db.acquire() as conn:
+                    await conn.execute(_ADVANCE_WATERMARK_SQL, advance_to)
+        return generated
+
+    async def run(self, interval_sec: float):
+        """Background sweep (started by the app lifespan): reports and scores for sessions as they finish."""
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Report sweep failed: {e}")
+            await asyncio.sleep(interval_sec)
+
+    async def _generate(
+        self, conn: asyncpg.Connection, session_ids: List[int]
+    ) -> Tuple[Dict[int, Dict[str, Any]], int]:
+        """
+        Runs inside a transaction. Returns a report per session that has messages,
+        and how many of them were newly generated.
+        """
+        session_ids = sorted(set(session_ids))  # Fixed lock order: concurrent batches can't deadlock
+        await conn.execute(_LOCK_SESSIONS_SQL, session_ids)
+
+        # Someone may have generated them while we waited for the locks
+        reports = {
+            row["session_id"]: json.loads(row["report"])
+            for row in await conn.fetch(_CURRENT_REPORTS_SQL, session_ids)
+        }
+        metrics.inc("session_reports_total", len(reports), source="stored")
+        todo = [sid for sid in session_ids if sid not in reports]
+        if not todo:
+            return reports, 0
+
+        messages: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        versions: Dict[int, str] = {}
+        for row in await conn.fetch(_SESSION_MESSAGES_SQL, todo):
+            messages[row["session_id"]].append(dict(row))
+            versions[row["session_id"]] = row["messages_version"]
+        turn_scores: Dict[int, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        for row in await conn.fetch(_TURN_SCORES_SQL, todo, list(SCORED_METRICS)):
+            turn_scores[row["session_id"]][row["metric_name"]].append(row["metric_value"])
+
+        built = {sid: build_report(sid, messages[sid], turn_scores[sid]) for sid in todo if messages[sid]}
+        for sid, report in built.items():
+            report["messages_version"] = versions[sid]
+        if built:
+            await self._persist(conn, built)
+            analytics_cache.invalidate()
+        metrics.inc("session_reports_total", len(built), source="generated")
+        reports.update(built)
+        return reports, len(built)
+
+    async def _persist(self, conn: asyncpg.Connection, reports: Dict[int, Dict[str, Any]]):
+        ids = list(reports)
+        metric_rows = [
+            (sid, m["metric_name"], float(m["metric_value"]), m["context"])
+            for sid, report in reports.items()
+            for m in report["metrics"]
+            if m["metric_name"] in REPORT_METRICS
+        ]
+        await conn.execute(CLEAR_METRICS_SQL, ids, list(REPORT_METRICS))
+        await conn.execute(_CLEAR_REPORTS_SQL, ids)
+        if metric_rows:
+            await conn.execute(INSERT_METRICS_SQL, *(list(col) for col in zip(*metric_rows)))
+        await conn.execute(
+            _INSERT_REPORTS_SQL,
+            ids,
+            ["\n".join(reports[sid]["tips"]) for sid in ids],
+            [json.dumps(reports[sid], ensure_ascii=False) for sid in ids],
+        )
+
+
+session_reports = SessionReportService()
@@ -0,0 +1,87 @@
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from app.services.preprocessor import Preprocessor
+
+# Silence between two timed units (words or segments) that counts as a pause
+PAUSE_THRESHOLD_SEC = 0.5
+
+# Per-word record kept for analytics: 13 bytes/word, storable as raw bytes
+WORD_TIMING_DTYPE = np.dtype([
+    ("start", "<f4"),
+    ("end", "<f4"),
+    ("probability", "<f4"),
+    ("is_filler", "?"),
+])
+
+
+def collect_word_timings(segments: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Flattens Whisper word timestamps into a WORD_TIMING_DTYPE array plus the word texts.
+    Returns empty arrays when the segments carry no word-level timing.
+    """
+    words = [w for s in segments for w in (getattr(s, "words", None) or [])]
+    timings = np.zeros(len(words), dtype=WORD_TIMING_DTYPE)
+    if not words:
+        return timings, np.array([], dtype=str)
+
+    timings["start"] = [w.start for w in words]
+    timings["end"] = [w.end for w in words]
+    timings["probability"] = [w.probability for w in words]
+    texts = [w.word for w in words]
+    # Same automaton and context rules as the transcript-level filler count
+    timings["is_filler"] = Preprocessor.filler_mask(texts)
+    return timings, np.array(texts, dtype=str)
+
+
+def compute_speech_metrics(starts: np.ndarray, ends: np.ndarray, word_count: int) -> Dict[str, Any]:
+    """
+    Vectorized timing metrics over timed units (words when available, else segments).
+    """
+    if starts.size == 0:
+        return {
+            "total_speech_duration_sec": 0.0,
+            "pauses": [],
+            "pause_count": 0,
+            "pause_total_time_sec": 0.0,
+            "longest_pause_sec": 0.0,
+            "speech_rate_wpm": 0.0,
+            "articulation_rate_wpm": 0.0,
+        }
+
+    total_turn_duration = float(ends[-1] - starts[0])
+
+    gaps = starts[1:] - ends[:-1]
+    is_pause = gaps > PAUSE_THRESHOLD_SEC
+    pause_starts = ends[:-1][is_pause]
+    pause_ends = starts[1:][is_pause]
+    pause_durations = gaps[is_pause]
+    pause_total = float(pause_durations.sum())
+
+    # Speech rate includes pauses; articulation rate only counts time spent talking
+    speech_rate_wpm = 0.0
+    if total_turn_duration > 0.1: # Avoid div by zero or tiny durations
+        speech_rate_wpm = (word_count / total_turn_duration) * 60.0
+    phonation_time = total_turn_duration - pause_total
+    articulation_rate_wpm = (word_count / phonation_time) * 60.0 if phonation_time > 0.1 else 0.0
+
+    return {
+        "total_speech_duration_sec": round(total_turn_duration, 2),
+        "pauses": [
+            {"start": float(s), "end": float(e), "duration": float(d)}
+            for s, e, d in zip(pause_starts, pause_ends, pause_durations)
+        ],
+        "pause_count": int(is_pause.sum()),
+        "pause_total_time_sec": round(pause_total, 2),
+        "longest_pause_sec": round(float(pause_durations.max()), 2) if pause_durations.size else 0.0,
+        "speech_rate_wpm": round(speech_rate_wpm, 2),
+        "articulation_rate_wpm": round(articulation_rate_wpm, 2),
+    }
+
+
+def pack_word_timings(timings: np.ndarray) -> bytes:
+    """Serializes a WORD_TIMING_DTYPE array for storage (e.g. BYTEA)."""
+    return timings.astype(WORD_TIMING_DTYPE, copy=False).tobytes()
+
+
+def unpack_word_timings(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=WORD_TIMING_DTYPE)
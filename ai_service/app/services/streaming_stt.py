@@ -0,0 +1,144 @@
+import logging
+import asyncio
+from collections import deque
+from typing import Dict, Any, List, Optional, Union, Deque
+import numpy as np
+from app.core.config import settings
+from app.services.audio import SAMPLE_RATE, resample
+from app.services.stt import STTService, DecodingProfile, DECODING_PROFILES, shift_segment
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingTranscriber:
+    """
+    Incremental STT for live microphone input.
+    Frames are segmented with an energy-based VAD; every closed speech segment is
+    transcribed in the background while the user keeps talking.
+    """
+
+    def __init__(
+        self,
+        stt: STTService,
+        sample_rate: int = SAMPLE_RATE,
+        language: Optional[str] = None,
+        profile: Optional[str] = None
+    ):
+        self.stt = stt
+        self.sample_rate = sample_rate
+        self.language = language
+        self.profile = profile
+        # Profile of the most recent segment, reported on the final event
+        self._last_profile: DecodingProfile = DECODING_PROFILES["accurate"]
+
+        self._frame_len = max(1, int(sample_rate * settings.STT_STREAM_FRAME_MS / 1000))
+        self._min_silence_frames = max(1, settings.STT_STREAM_MIN_SILENCE_MS // settings.STT_STREAM_FRAME_MS)
+        self._max_segment_frames = int(settings.STT_STREAM_MAX_SEGMENT_SEC * 1000 / settings.STT_STREAM_FRAME_MS)
+        self._threshold = 10 ** (settings.STT_STREAM_VAD_THRESHOLD_DB / 20)
+
+        self._pending = np.zeros(0, dtype=np.float32)   # Samples not yet framed
+        self._frames_seen = 0                            # Frames consumed on the stream timeline
+        self._pre_roll: Deque[np.ndarray] = deque(
+            maxlen=max(0, settings.STT_STREAM_PRE_ROLL_MS // settings.STT_STREAM_FRAME_MS)
+        )
+        self._segment: List[np.ndarray] = []
+        self._segment_start_frame = 0
+        self._silence_run = 0
+
+        self._jobs: Deque[asyncio.Task] = deque()
+        self._segments: List[Any] = []   # Whisper segments re-based onto the stream timeline
+
+    async def feed(self, frame: Union[bytes, np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Consumes a chunk of mono PCM (float32 array or raw float32 bytes) and returns
+        the partial transcript events that became ready since the last call.
+        """
+        samples = np.frombuffer(frame, dtype=np.float32) if isinstance(frame, (bytes, bytearray)) else frame
+        self._pending = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+
+        n_frames = self._pending.size // self._frame_len
+        if n_frames:
+            framed = self._pending[: n_frames * self._frame_len].reshape(n_frames, self._frame_len)
+            self._pending = self._pending[n_frames * self._frame_len:]
+            # Vectorized RMS per frame
+            voiced = np.sqrt(np.mean(framed ** 2, axis=1)) >= self._threshold
+            for chunk, is_speech in zip(framed, voiced):
+                self._push_frame(chunk, bool(is_speech))
+
+        return self._drain_ready()
+
+    async def finish(self) -> List[Dict[str, Any]]:
+        """
+        Flushes the open segment and waits for outstanding transcriptions.
+        Returns the remaining partial events followed by a final event carrying the
+        same metrics as `STTService._run_inference`.
+        """
+        if self._segment and self._pending.size:
+            self._segment.append(self._pending)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._close_segment()
+
+        events: List[Dict[str, Any]] = []
+        while self._jobs:
+            await asyncio.wait({self._jobs[0]})
+            events.extend(self._drain_ready())
+
+        result = await asyncio.to_thread(self.stt._analyze_segments, self._segments, self._last_profile)
+        events.append({"type": "final", **result})
+        return events
+
+    # --- Internals ---
+
+    def _push_frame(self, chunk: np.ndarray, is_speech: bool):
+        if self._segment:
+            self._segment.append(chunk)
+            self._silence_run = 0 if is_speech else self._silence_run + 1
+            if self._silence_run >= self._min_silence_frames or len(self._segment) >= self._max_segment_frames:
+                self._close_segment()
+        elif is_speech:
+            self._segment_start_frame = self._frames_seen - len(self._pre_roll)
+            self._segment = list(self._pre_roll) + [chunk]
+            self._pre_roll.clear()
+            self._silence_run = 0
+        else:
+            self._pre_roll.append(chunk)
+        self._frames_seen += 1
+
+    def _close_segment(self):
+        if not self._segment:
+            return
+        # Trailing silence carries no speech, drop it before inference
+        keep = len(self._segment) - self._silence_run
+        audio = np.concatenate(self._segment[:keep])
+        offset = self._segment_start_frame * self._frame_len / self.sample_rate
+
+        self._segment = []
+        self._silence_run = 0
+        self._jobs.append(asyncio.create_task(self._transcribe(audio, offset)))
+
+    async def _transcribe(self, audio: np.ndarray, offset: float) -> List[Any]:
+        audio = resample(audio, self.sample_rate, SAMPLE_RATE)
+        try:
+            profile = self.stt.select_profile(audio.shape[0] / SAMPLE_RATE, self.profile)
+            self._last_profile = profile
+            segments = await self.stt.infer_segments(audio, self.language, profile)
+        except Exception as e:
+            logger.error(f"❌ Streaming STT Error: {e}")
+            return []
+        return [shift_segment(s, offset) for s in segments]
+
+    def _drain_ready(self) -> List[Dict[str, Any]]:
+        # Emit strictly in segment order, so a slow early segment holds back later ones
+        events = []
+        while self._jobs and self._jobs[0].done():
+            timed = self._jobs.popleft().result()
+            if not timed:
+                continue
+            self._segments.extend(timed)
+            events.append({
+                "type": "partial",
+                "text": " ".join(s.text.strip() for s in timed).strip(),
+                "start": round(timed[0].start, 2),
+                "end": round(timed[-1].end, 2),
+            })
+        return events
@@ -1,14 +1,61 @@
 import logging
-import io
 import asyncio
-from typing import Dict, Any, List, Optional
-from faster_whisper import WhisperModel
+import threading
+from bisect import bisect_right
+from dataclasses import replace
+from typing import Dict, Any, List, Optional, Tuple
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 import numpy as np
+from pydantic import BaseModel
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.audio import SAMPLE_RATE
+from app.services.stt_cache import TranscriptionCache, transcription_key
+from app.services.speech_metrics import collect_word_timings, compute_speech_metrics
 from app.services.preprocessor import Preprocessor
 
 logger = logging.getLogger(__name__)
 
+metrics.describe("stt_utterances_total", "Utterances sent to Whisper, by decoding profile.")
+
+def shift_segment(segment: Any, offset: float) -> Any:
+    """
+    Moves a Whisper segment (and its words) along the timeline by `offset` seconds.
+    """
+    words = getattr(segment, "words", None)
+    if words:
+        words = [replace(w, start=w.start + offset, end=w.end + offset) for w in words]
+    return replace(segment, start=segment.start + offset, end=segment.end + offset, words=words)
+
+# Whisper's context window; longer utterances cannot share a batch row
+MAX_BATCH_AUDIO_SEC = 30.0
+
+class DecodingProfile(BaseModel):
+    """A named latency/accuracy trade-off for Whisper decoding."""
+    name: str
+    model_size: str
+    beam_size: int
+    without_timestamps: bool = False
+    # Per-word timings (extra cross-attention alignment pass) for fine-grained pause metrics
+    word_timestamps: bool = False
+
+DECODING_PROFILES: Dict[str, DecodingProfile] = {
+    # Current behaviour: full model, beam search, word timestamps for pause metrics
+    "accurate": DecodingProfile(
+        name="accurate",
+        model_size=settings.WHISPER_MODEL_SIZE,
+        beam_size=5,
+        word_timestamps=settings.STT_WORD_TIMESTAMPS,
+    ),
+    # Greedy decoding on a smaller model, no timestamp tokens (pause metrics are coarse)
+    "realtime": DecodingProfile(
+        name="realtime",
+        model_size=settings.WHISPER_REALTIME_MODEL_SIZE,
+        beam_size=1,
+        without_timestamps=True,
+    ),
+}
+
 class STTService:
     """
     Speech-to-Text (STT) Service using Faster-Whisper.
@@ -16,15 +63,37 @@ class STTService:
     """
 
     def __init__(self):
+        self.model = self._load_model(settings.WHISPER_MODEL_SIZE)
+        # Other profile models are loaded on first use, from inference worker threads
+        self._models: Dict[str, WhisperModel] = {settings.WHISPER_MODEL_SIZE: self.model}
+        self._models_lock = threading.Lock()
+
+        # Micro-batching: utterances arriving within STT_BATCH_MAX_WAIT_MS share one forward pass
+        self._batched_models: Dict[str, BatchedInferencePipeline] = {}
+        self._pending_batches: Dict[Tuple[Optional[str], str], List[Tuple[np.ndarray, asyncio.Future]]] = {}
+        self._batch_timers: Dict[Tuple[Optional[str], str], asyncio.TimerHandle] = {}
+
+        # Load shedding: utterances currently queued or decoding
+        self._inflight = 0
+
+        self.cache: Optional[TranscriptionCache] = None
+        if settings.STT_CACHE_MAX_BYTES > 0:
+            self.cache = TranscriptionCache(
+                settings.STT_CACHE_MAX_BYTES,
+                cache_dir=settings.STT_CACHE_DIR,
+                max_disk_bytes=settings.STT_CACHE_DISK_MAX_BYTES,
+            )
+
+    def _load_model(self, model_size: str) -> WhisperModel:
         device = settings.WHISPER_DEVICE
         compute_type = settings.WHISPER_COMPUTE_TYPE
         
-        logger.info(f"🎧 Initializing Whisper ({settings.WHISPER_MODEL_SIZE}) on preferred device: {device}...")
+        logger.info(f"🎧 Initializing Whisper ({model_size}) on preferred device: {device}...")
 
         try:
             # Attempt to initialize with preferred settings
-            self.model = WhisperModel(
-                settings.WHISPER_MODEL_SIZE, 
+            model = WhisperModel(
+                model_size, 
                 device=device, 
                 compute_type=compute_type
             )
@@ -32,8 +101,8 @@ class STTService:
             if device == "cuda":
                 logger.warning(f"⚠️ Failed to initialize Whisper on CUDA: {e}. Falling back to CPU.")
                 try:
-                    self.model = WhisperModel(
-                        settings.WHISPER_MODEL_SIZE, 
+                    model = WhisperModel(
+                        model_size, 
                         device="cpu", 
                         compute_type="int8" # CPU usually needs int8 or float32
                     )
@@ -46,17 +115,76 @@ class STTService:
                 raise e
         
         logger.info(f"✅ Whisper Ready on {device}.")
+        return model
 
-    async def transcribe(self, audio_bytes: bytes, language: Optional[str] = None) -> Dict[str, Any]:
+    def _model_for(self, profile: DecodingProfile) -> WhisperModel:
+        model = self._models.get(profile.model_size)
+        if model is None:
+            # Concurrent first requests for a profile must not load the model twice
+            with self._models_lock:
+                model = self._models.get(profile.model_size)
+                if model is None:
+                    model = self._models[profile.model_size] = self._load_model(profile.model_size)
+        return model
+
+    def _batched_model_for(self, profile: DecodingProfile) -> BatchedInferencePipeline:
+        pipeline = self._batched_models.get(profile.model_size)
+        if pipeline is None:
+            model = self._model_for(profile)
+            with self._models_lock:
+                pipeline = self._batched_models.get(profile.model_size)
+                if pipeline is None:
+                    pipeline = self._batched_models[profile.model_size] = BatchedInferencePipeline(model)
+        return pipeline
+
+    def select_profile(self, duration: float, requested: Optional[str] = None) -> DecodingProfile:
+        """
+        Resolves the decoding profile for one utterance.
+        An explicit profile name wins; otherwise ("auto"/None) fall back to "realtime"
+        when the queue is deep or the utterance is long, and "accurate" otherwise.
+        """
+        if requested and requested != "auto":
+            if requested not in DECODING_PROFILES:
+                raise ValueError(f"Unknown decoding profile '{requested}'")
+            return DECODING_PROFILES[requested]
+
+        if self._inflight >= settings.STT_REALTIME_QUEUE_DEPTH:
+            return DECODING_PROFILES["realtime"]
+        if duration > settings.STT_REALTIME_MIN_DURATION_SEC:
+            return DECODING_PROFILES["realtime"]
+        return DECODING_PROFILES["accurate"]
+
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        language: Optional[str] = None,
+        profile: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Transcribes audio file bytes (WAV/WebM) to structured behavioral data asynchronously.
+        `profile` is a DECODING_PROFILES name, or None/"auto" to pick by load and duration.
         """
         try:
-            # 0. Normalize Audio (Ensure 16kHz WAV) - ASYNC
-            audio_bytes = await Preprocessor.normalize_audio(audio_bytes)
+            # 0. Normalize Audio: in-process decode to 16kHz mono float32 (no ffmpeg, no second decode in Whisper)
+            audio = await Preprocessor.normalize_audio(audio_bytes)
+
+            selected = self.select_profile(audio.shape[0] / SAMPLE_RATE, profile)
 
-            # 1. Run Whisper Inference - Moved to thread as it is CPU-bound and synchronous
-            return await asyncio.to_thread(self._run_inference, audio_bytes, language)
+            # 1. Content-hash cache: client retries / replayed recordings skip inference
+            cached = await self._cache_lookup(audio, language, selected, auto=profile in (None, "auto"))
+            if cached is not None:
+                cached["cached"] = True
+                return cached
+
+            # 2. Run Whisper Inference - batched with concurrent requests, off the event loop
+            segments = await self.infer_segments(audio, language, selected)
+            result = self._analyze_segments(segments, selected)
+
+            if self.cache is not None:
+                key = transcription_key(audio, language, selected.name)
+                await asyncio.to_thread(self.cache.put, key, result)
+            result["cached"] = False
+            return result
 
         except Exception as e:
             logger.error(f"❌ STT Error: {e}")
@@ -67,82 +195,206 @@ class STTService:
                 "error": str(e)
             }
 
-    def _run_inference(self, audio_bytes: bytes, language: Optional[str] = None) -> Dict[str, Any]:
+    async def _cache_lookup(
+        self,
+        audio: np.ndarray,
+        language: Optional[str],
+        profile: DecodingProfile,
+        auto: bool
+    ) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        # Auto-selected requests accept any stored profile, preferring the accurate one
+        names = ["accurate", profile.name] if auto else [profile.name]
+        for name in dict.fromkeys(names):
+            result = await asyncio.to_thread(self.cache.get, transcription_key(audio, language, name))
+            if result is not None:
+                return result
+        return None
+
+    async def infer_segments(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        profile: Optional[DecodingProfile] = None
+    ) -> List[Any]:
+        """
+        Schedules Whisper inference for one utterance.
+        Short utterances are queued for the micro-batcher; long ones run on their own.
+        """
+        duration = audio.shape[0] / SAMPLE_RATE
+        profile = profile or self.select_profile(duration)
+        metrics.inc("stt_utterances_total", profile=profile.name)
+
+        self._inflight += 1
+        try:
+            if settings.STT_BATCH_MAX_SIZE <= 1 or duration > MAX_BATCH_AUDIO_SEC:
+                return await asyncio.to_thread(self._transcribe_segments, audio, language, profile)
+
+            key = (language, profile.name)
+            future = asyncio.get_running_loop().create_future()
+            pending = self._pending_batches.setdefault(key, [])
+            pending.append((audio, future))
+
+            if len(pending) >= settings.STT_BATCH_MAX_SIZE:
+                self._flush_batch(key)
+            elif key not in self._batch_timers:
+                self._batch_timers[key] = asyncio.get_running_loop().call_later(
+                    settings.STT_BATCH_MAX_WAIT_MS / 1000, self._flush_batch, key
+                )
+            return await future
+        finally:
+            self._inflight -= 1
+
+    def _flush_batch(self, key: Tuple[Optional[str], str]):
+        timer = self._batch_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        items = self._pending_batches.pop(key, [])
+        if items:
+            language, profile_name = key
+            asyncio.create_task(self._run_batch(items, language, DECODING_PROFILES[profile_name]))
+
+    async def _run_batch(
+        self,
+        items: List[Tuple[np.ndarray, asyncio.Future]],
+        language: Optional[str],
+        profile: DecodingProfile
+    ):
+        audios = [audio for audio, _ in items]
+        try:
+            if len(audios) == 1:
+                # Nothing to share - keep the sequential decoder (beam search + temperature fallback)
+                results = [await asyncio.to_thread(self._transcribe_segments, audios[0], language, profile)]
+            else:
+                logger.info(f"📦 Whisper micro-batch: {len(audios)} utterances ({profile.name})")
+                results = await asyncio.to_thread(self._transcribe_batch, audios, language, profile)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), segments in zip(items, results):
+            if not future.done():
+                future.set_result(segments)
+
+    def _transcribe_batch(
+        self,
+        audios: List[np.ndarray],
+        language: Optional[str] = None,
+        profile: DecodingProfile = DECODING_PROFILES["accurate"]
+    ) -> List[List[Any]]:
+        """
+        Runs several utterances through one batched forward pass.
+        Utterances are laid end-to-end and passed as explicit clips (one batch row each),
+        then the returned segments are split back per utterance and re-based to 0.
+        """
+        offsets = (np.cumsum([0] + [a.shape[0] for a in audios[:-1]]) / SAMPLE_RATE).tolist()
+        clips = [
+            {"start": start, "end": start + a.shape[0] / SAMPLE_RATE}
+            for start, a in zip(offsets, audios)
+        ]
+
+        transcribe_kwargs = {
+            "beam_size": profile.beam_size,
+            "task": "transcribe",
+            "clip_timestamps": clips,
+            "batch_size": len(audios),
+            "without_timestamps": profile.without_timestamps,
+            "word_timestamps": profile.word_timestamps,
+        }
+        if language:
+            transcribe_kwargs["language"] = language
+        else:
+            # Detect language per utterance, not once for the whole batch
+            transcribe_kwargs["multilingual"] = True
+        segments, _ = self._batched_model_for(profile).transcribe(np.concatenate(audios), **transcribe_kwargs)
+
+        results: List[List[Any]] = [[] for _ in audios]
+        for segment in segments:
+            idx = max(0, bisect_right(offsets, segment.start) - 1)
+            results[idx].append(shift_segment(segment, -offsets[idx]))
+        return results
+
+    def _run_inference(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        profile: DecodingProfile = DECODING_PROFILES["accurate"]
+    ) -> Dict[str, Any]:
         """
         Synchronous wrapper for Whisper inference to be run in a thread.
+        Expects 16kHz mono float32 samples (see `decode_audio`).
         """
-        # Wrap bytes in BytesIO to let faster-whisper handle decoding (via ffmpeg)
-        audio_file = io.BytesIO(audio_bytes)
-        
-        # Transcription (beam_size=5 for accuracy)
-        transcribe_kwargs = {"beam_size": 5, "task": "transcribe"}
+        return self._analyze_segments(self._transcribe_segments(audio, language, profile), profile)
+
+    def _transcribe_segments(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        profile: DecodingProfile = DECODING_PROFILES["accurate"]
+    ) -> List[Any]:
+        """
+        Runs the Whisper model and returns the materialized segment list.
+        """
+        transcribe_kwargs = {
+            "beam_size": profile.beam_size,
+            "task": "transcribe",
+            "without_timestamps": profile.without_timestamps,
+            "word_timestamps": profile.word_timestamps,
+        }
         if language:
             transcribe_kwargs["language"] = language
-        segments, info = self.model.transcribe(audio_file, **transcribe_kwargs)
+        segments, info = self._model_for(profile).transcribe(audio, **transcribe_kwargs)
         
         # Collect segments to list to iterate
-        segments_list = list(segments)
-
-        if not segments_list:
-            return {
-                "raw_text": "",
-                "clean_text": "",
-                "word_count": 0,
-                "total_speech_duration_sec": 0.0,
-                "pauses": [],
-                "pause_count": 0,
-                "pause_total_time_sec": 0.0,
-                "speech_rate_wpm": 0.0,
-                "filler_word_count": 0
-            }
+        return list(segments)
 
+    def _analyze_segments(
+        self,
+        segments_list: List[Any],
+        profile: DecodingProfile = DECODING_PROFILES["accurate"]
+    ) -> Dict[str, Any]:
+        """
+        Builds the behavioral result (text, pauses, WPM, fillers) from timed segments.
+        Any objects exposing `start`, `end` and `text` are accepted; when segments carry
+        Whisper `words`, pauses and rates are measured between words instead of segments.
+        """
         # 1. Raw Text
         raw_text = " ".join([s.text.strip() for s in segments_list]).strip()
         
         # 2. Process Text (Cleaning & Filler Detection via Preprocessor)
-        _, clean_text, filler_word_count = Preprocessor.process_text(raw_text)
+        _, clean_text, filler_word_count = Preprocessor.process_text(raw_text) if raw_text else ("", "", 0)
 
-        # 3. Timing & Pauses
-        total_speech_duration_sec = 0.0
-        pauses = []
-        
-        first_start = segments_list[0].start
-        last_end = segments_list[-1].end
-        total_turn_duration = last_end - first_start
-        
         # Count words (naive split of clean text)
         word_count = len(clean_text.split())
 
-        # Detect Pauses
-        for i in range(1, len(segments_list)):
-            prev_end = segments_list[i-1].end
-            curr_start = segments_list[i].start
-            gap = curr_start - prev_end
-            if gap > 0.5:
-                pauses.append({
-                    "start": prev_end,
-                    "end": curr_start,
-                    "duration": gap
-                })
-        
-        # Speech Rate (WPM)
-        speech_rate_wpm = 0.0
-        if total_turn_duration > 0.1: # Avoid div by zero or tiny durations
-            speech_rate_wpm = (word_count / total_turn_duration) * 60.0
+        # 3. Timing & Pauses (vectorized over words, or segments as a fallback)
+        word_timings, _ = collect_word_timings(segments_list)
+        if word_timings.size:
+            starts = word_timings["start"].astype(np.float64)
+            ends = word_timings["end"].astype(np.float64)
+        else:
+            starts = np.array([s.start for s in segments_list], dtype=np.float64)
+            ends = np.array([s.end for s in segments_list], dtype=np.float64)
 
         result = {
+            "decoding_profile": profile.name,
             "raw_text": raw_text,
             "clean_text": clean_text,
             "word_count": word_count,
-            "total_speech_duration_sec": round(total_turn_duration, 2),
-            "pauses": pauses,
-            "pause_count": len(pauses),
-            "pause_total_time_sec": round(sum(p["duration"] for p in pauses), 2),
-            "speech_rate_wpm": round(speech_rate_wpm, 2),
-            "filler_word_count": filler_word_count
+            **compute_speech_metrics(starts, ends, word_count),
+            "filler_word_count": filler_word_count,
+            "filler_positions": np.flatnonzero(word_timings["is_filler"]).tolist(),
+            # Structured WORD_TIMING_DTYPE array; see speech_metrics.pack_word_timings for storage
+            "word_timings": word_timings,
         }
         
         if raw_text:
-            logger.info(f"🗣️  Analyzed Speech: {word_count} words, {result['speech_rate_wpm']} WPM, {filler_word_count} fillers.")
+            logger.info(
+                f"🗣️  Analyzed Speech ({profile.name}): {word_count} words, "
+                f"{result['speech_rate_wpm']} WPM, {filler_word_count} fillers."
+            )
         
         return result
@@ -0,0 +1,149 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import numpy as np
+from app.services.speech_metrics import pack_word_timings, unpack_word_timings
+
+logger = logging.getLogger(__name__)
+
+
+def transcription_key(audio: np.ndarray, language: Optional[str], profile: str) -> str:
+    """
+    Content hash of the normalized (decoded 16kHz float32) audio plus decoding inputs.
+    Retries of the same recording hit even if the client re-encodes the container.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+    digest.update(f"|{language or 'auto'}|{profile}".encode())
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Byte-bounded LRU of STT results, optionally mirrored to a directory so entries
+    survive restarts. Disk usage is bounded separately and pruned oldest-first.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, tuple[bytes, int]]" = OrderedDict()
+        self._bytes = 0
+        # Lookups run in worker threads when disk persistence is on
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _deserialize(entry[0])
+
+        payload = self._read_disk(key)
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, payload)
+        return _deserialize(payload)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        payload = _serialize(result)
+        with self._lock:
+            self._insert(key, payload)
+        self._write_disk(key, payload)
+
+    def _insert(self, key: str, payload: bytes):
+        if len(payload) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (payload, len(payload))
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    # --- Disk mirror ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                payload = f.read()
+            os.utime(self._path(key))  # LRU order on disk follows mtime
+            return payload
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ STT cache read failed: {e}")
+            return None
+
+    def _write_disk(self, key: str, payload: bytes):
+        if not self.cache_dir:
+            return
+        try:
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, self._path(key))
+            self._prune_disk()
+        except Exception as e:
+            logger.warning(f"⚠️ STT cache write failed: {e}")
+
+    def _prune_disk(self):
+        if self.max_disk_bytes <= 0:
+            return
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+def _serialize(result: Dict[str, Any]) -> bytes:
+    data = dict(result)
+    timings = data.pop("word_timings", None)
+    if timings is not None:
+        data["word_timings_b64"] = base64.b64encode(pack_word_timings(timings)).decode("ascii")
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _deserialize(payload: bytes) -> Dict[str, Any]:
+    data = json.loads(payload)
+    packed = data.pop("word_timings_b64", None)
+    if packed is not None:
+        data["word_timings"] = unpack_word_timings(base64.b64decode(packed))
+    return data
@@ -0,0 +1,166 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.core.db import db
+from app.core.metrics import metrics
+from app.engine.agents import ScoringAgent
+from app.engine.scenarios import SCENARIO_REGISTRY
+
+logger = logging.getLogger("TurnScoring")
+
+metrics.describe("turn_scoring_sessions_total", "Sessions sent to post-session turn scoring, by result (scored/failed).")
+metrics.describe("turn_scoring_llm_seconds", "Duration of one batched turn-scoring LLM call.")
+
+# Per-turn metrics written by the scoring stage (one row each per user turn, in turn order)
+SCORED_METRICS = ("topic_adherence", "clarity")
+
+# Scored while there is one topic_adherence row per user message.
+# With $2, sessions that already failed that many times are left alone.
+_UNSCORED_SESSIONS_SQL = """
+    SELECT s.id, s.scenario_id
+    FROM sessions s
+    WHERE s.id = ANY($1::int[])
+      AND (SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id AND m.role = 'user')
+          <> (SELECT COUNT(*) FROM session_metrics sm
+              WHERE sm.session_id = s.id AND sm.metric_name = 'topic_adherence')
+      AND ($2::int IS NULL OR NOT EXISTS (
+          SELECT 1 FROM session_scoring_attempts a WHERE a.session_id = s.id AND a.attempts >= $2
+      ))
+"""
+
+_TRANSCRIPTS_SQL = """
+    SELECT session_id, role, content
+    FROM messages
+    WHERE session_id = ANY($1::int[])
+      AND role IN ('user', 'ai')
+    ORDER BY session_id, id
+"""
+
+_LOCK_SESSIONS_SQL = "SELECT pg_advisory_xact_lock(hashtext('turn_scoring'), id) FROM unnest($1::int[]) AS t(id)"
+
+CLEAR_METRICS_SQL = "DELETE FROM session_metrics WHERE session_id = ANY($1::int[]) AND metric_name = ANY($2::text[])"
+
+INSERT_METRICS_SQL = """
+    INSERT INTO session_metrics (session_id, metric_name, metric_value, context)
+    SELECT * FROM unnest($1::int[], $2::text[], $3::float8[], $4::text[])
+"""
+
+# Failed attempts drive the sweep's retry backoff; a successful scoring clears them
+_RECORD_FAILURES_SQL = """
+    INSERT INTO session_scoring_attempts AS a (session_id, attempts, last_attempt_at)
+    SELECT id, 1, LOCALTIMESTAMP FROM unnest($1::int[]) AS t(id)
+    ON CONFLICT (session_id) DO UPDATE SET attempts = a.attempts + 1, last_attempt_at = EXCLUDED.last_attempt_at
+"""
+
+_CLEAR_FAILURES_SQL = "DELETE FROM session_scoring_attempts WHERE session_id = ANY($1::int[])"
+
+MetricRow = Tuple[int, str, float, str]
+
+
+def turn_context(content: str) -> str:
+    """Context of every per-turn metric; the report chart groups a turn's metrics by it."""
+    return f"Analyzed user text: {content}"
+
+
+def _segments(transcript: List[Dict[str, str]], max_turns: int) -> List[List[Dict[str, str]]]:
+    """Splits long sessions so each call scores at most `max_turns` user turns."""
+    segments: List[List[Dict[str, str]]] = [[]]
+    turns = 0
+    for msg in transcript:
+        if msg["role"] == "user":
+            if turns == max_turns:
+                # Keep the AI message the next turn answers
+                carry = [segments[-1].pop()] if segments[-1] and segments[-1][-1]["role"] == "ai" else []
+                segments.append(carry)
+                turns = 0
+            turns += 1
+        segments[-1].append(msg)
+    return segments
+
+
+class TurnScoringService:
+    """
+    Post-session scoring of topic adherence and clarity for every user turn:
+    one LLM call per session (ScoringAgent), results written to session_metrics in bulk.
+    Sessions already scored for their current messages are skipped.
+    """
+
+    def __init__(self, max_turns_per_call: int, concurrency: int):
+        self.max_turns_per_call = max_turns_per_call
+        self._semaphore = asyncio.Semaphore(concurrency)  # Shares Ollama with live turns
+
+    async def ensure_scored(self, session_ids: Sequence[int], max_attempts: Optional[int] = None) -> Set[int]:
+        """
+        Scores the sessions that need it; returns those scored now. LLM failures are logged and
+        counted per session, not raised. Batch callers pass `max_attempts` to skip sessions
+        that keep failing; on-demand requests always try again.
+        """
+        async with db.acquire() as conn:
+            pending = {
+                r["id"]: r["scenario_id"]
+                for r in await conn.fetch(_UNSCORED_SESSIONS_SQL, list(session_ids), max_attempts)
+            }
+            if not pending:
+                return set()
+            transcripts: Dict[int, List[Dict[str, str]]] = defaultdict(list)
+            for row in await conn.fetch(_TRANSCRIPTS_SQL, list(pending)):
+                transcripts[row["session_id"]].append({"role": row["role"], "content": row["content"]})
+
+        # No connection held while the LLM works
+        results = await asyncio.gather(
+            *(self._score_session(sid, pending[sid], transcripts[sid]) for sid in pending)
+        )
+        rows = [row for session_rows in results if session_rows is not None for row in session_rows]
+        scored = {sid for sid, session_rows in zip(pending, results) if session_rows is not None}
+        metrics.inc("turn_scoring_sessions_total", len(scored), result="scored")
+        metrics.inc("turn_scoring_sessions_total", len(pending) - len(scored), result="failed")
+
+        failed = sorted(set(pending) - scored)
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                if failed:
+                    await conn.execute(_RECORD_FAILURES_SQL, failed)
+                if scored:
+                    ids = sorted(scored)
+                    await conn.execute(_LOCK_SESSIONS_SQL, ids)
+                    # Replace, so a concurrent scorer of the same session can't leave duplicates
+                    await conn.execute(CLEAR_METRICS_SQL, ids, list(SCORED_METRICS))
+                    if rows:
+                        await conn.execute(INSERT_METRICS_SQL, *(list(col) for col in zip(*rows)))
+                    await conn.execute(_CLEAR_FAILURES_SQL, ids)
+        if scored:
+            logger.info(f"🎯 Scored turns for {len(scored)} session(s)")
+        return scored
+
+    async def _score_session(
+        self, session_id: int, scenario_id: str, transcript: List[Dict[str, str]]
+    ) -> Optional[List[MetricRow]]:
+        scenario = SCENARIO_REGISTRY.get(scenario_id)
+        goal = scenario.goal if scenario else scenario_id
+        scores: List[Dict[str, float]] = []
+        async with self._semaphore:
+            for segment in _segments(transcript, self.max_turns_per_call):
+                started = time.perf_counter()
+                segment_scores = await ScoringAgent.score_turns(goal, segment)
+                metrics.observe("turn_scoring_llm_seconds", time.perf_counter() - started)
+                if segment_scores is None:
+                    logger.warning(f"⚠️ Turn scoring incomplete for session {session_id}, will retry")
+                    return None
+                scores += segment_scores
+
+        user_turns = [m["content"] for m in transcript if m["role"] == "user"]
+        return [
+            (session_id, name, turn_scores[name], turn_context(content))
+            for content, turn_scores in zip(user_turns, scores)
+            for name in SCORED_METRICS
+        ]
+
+
+turn_scoring = TurnScoringService(
+    max_turns_per_call=settings.SCORING_MAX_TURNS_PER_CALL,
+    concurrency=settings.SCORING_CONCURRENCY,
+)
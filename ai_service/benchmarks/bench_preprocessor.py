@@ -0,0 +1,39 @@
+"""
+Microbenchmark for the filler-detection engine.
+
+    python benchmarks/bench_preprocessor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.preprocessor import Preprocessor
+
+SENTENCES = [
+    "So, um, I was like, you know, thinking about the role. ",
+    "I like working with people and I would like to grow here. ",
+    "אה, אני חושב ש... אממ כן, כאילו, זה היה מאתגר. ",
+    "What kind of team is it, I mean, how big is it? ",
+]
+
+
+def bench(words_target: int, repeat: int = 5):
+    text = ""
+    while len(text.split()) < words_target:
+        text += "".join(SENTENCES)
+    n_words = len(text.split())
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, _, fillers = Preprocessor.process_text(text)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{n_words:>9,} words  {best * 1000:8.2f} ms  {n_words / best:>12,.0f} words/s  ({fillers} fillers)")
+
+
+if __name__ == "__main__":
+    for size in (100, 1_000, 10_000, 100_000):
+        bench(size)
@@ -0,0 +1,171 @@
+"""
+Minimal pytest-benchmark style fixture with stored baselines.
+
+    python -m pytest benchmarks -q                      # measure, report next to the baselines
+    BENCH_COMPARE=1 python -m pytest benchmarks -q      # also fail on regressions vs baselines.json
+    python -m pytest benchmarks -q --bench-save         # record new baselines (after intended changes)
+
+Baselines are stored as ratios to a fixed pure-Python calibration loop timed in the same
+session, so they carry over between machines of different speed. With BENCH_COMPARE=1 a
+benchmark fails when its best time per call, as a ratio to the calibration loop, exceeds
+baseline * (1 + tolerance); it is re-measured RETRIES times first so one noisy run does not
+fail the suite. Leave the comparison off on shared/noisy runners.
+"""
+import gc
+import os
+import json
+import time
+import statistics
+from typing import Any, Callable, Dict, Optional
+
+import pytest
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+MIN_ROUND_SEC = 0.02    # Inner loop is grown until one round takes at least this long
+ROUNDS = 20
+MAX_TIME_SEC = 2.0      # Per measurement, across all rounds
+RETRIES = 2
+
+_results: Dict[str, Dict[str, float]] = {}
+_calibration_sec: Optional[float] = None
+
+
+def _calibration_loop() -> int:
+    """Reference workload (dict, str and int operations, like the hot paths)."""
+    counts: Dict[str, int] = {}
+    total = 0
+    for i in range(100):
+        key = f"w{i % 97}"
+        counts[key] = counts.get(key, 0) + i
+        total += len(key)
+    return total + len(counts)
+
+
+def calibration_time(refresh: bool = False) -> float:
+    """
+    Best time per call of the calibration loop. Each benchmark re-measures it right before
+    its own rounds, so the ratio reflects the machine's speed at that moment.
+    """
+    global _calibration_sec
+    if _calibration_sec is None or refresh:
+        _calibration_loop()
+        loops = Benchmark._calibrate(_calibration_loop, (), {})
+        _calibration_sec = Benchmark._measure(_calibration_loop, (), {}, loops)["min"]
+    return _calibration_sec
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench")
+    group.addoption("--bench-save", action="store_true", help="Store results as the new baselines.")
+    group.addoption(
+        "--bench-tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", "0.5")),
+        help="Allowed slowdown vs. baseline before failing (0.5 = 50%%).",
+    )
+
+
+def _load_baselines() -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Benchmark:
+    def __init__(self, name: str, baseline: Dict[str, float], tolerance: float, compare: bool):
+        self.name = name
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.compare = compare
+
+    def __call__(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        result = func(*args, **kwargs)  # Warm-up (imports, caches)
+        loops = self._calibrate(func, args, kwargs)
+
+        unit = calibration_time(refresh=True)
+        stats = self._measure(func, args, kwargs, loops)
+        reference = self.baseline.get("ratio")
+        if self.compare and reference:
+            limit = reference * (1 + self.tolerance)
+            for _ in range(RETRIES):
+                if stats["min"] / unit <= limit:
+                    break
+                retry = self._measure(func, args, kwargs, loops)
+                stats = retry if retry["min"] < stats["min"] else stats
+        stats["ratio"] = stats["min"] / unit
+        stats["median_ratio"] = stats["median"] / unit
+        _results[self.name] = stats
+
+        if self.compare and reference and stats["ratio"] > limit:
+            pytest.fail(
+                f"{self.name}: {stats['ratio']:.2f}x calibration vs baseline {reference:.2f}x "
+                f"(+{(stats['ratio'] / reference - 1) * 100:.0f}%, tolerance {self.tolerance * 100:.0f}%)"
+            )
+        return result
+
+    @staticmethod
+    def _calibrate(func, args, kwargs) -> int:
+        loops = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(loops):
+                func(*args, **kwargs)
+            if time.perf_counter() - started >= MIN_ROUND_SEC or loops >= 1 << 20:
+                return loops
+            loops *= 2
+
+    @staticmethod
+    def _measure(func, args, kwargs, loops: int) -> Dict[str, float]:
+        timings = []
+        budget_end = time.perf_counter() + MAX_TIME_SEC
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(ROUNDS):
+                started = time.perf_counter()
+                for _ in range(loops):
+                    func(*args, **kwargs)
+                timings.append((time.perf_counter() - started) / loops)
+                if time.perf_counter() > budget_end and len(timings) >= 3:
+                    break
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return {"min": min(timings), "median": statistics.median(timings), "rounds": len(timings), "loops": loops}
+
+
+@pytest.fixture
+def benchmark(request) -> Benchmark:
+    config = request.config
+    if not hasattr(config, "_bench_baselines"):
+        config._bench_baselines = _load_baselines()
+    name = request.node.name
+    return Benchmark(
+        name,
+        config._bench_baselines.get(name, {}),
+        config.getoption("--bench-tolerance"),
+        compare=os.getenv("BENCH_COMPARE", "0") == "1" and not config.getoption("--bench-save"),
+    )
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not session.config.getoption("--bench-save", default=False) or not _results:
+        return
+    baselines = _load_baselines()
+    baselines.update({name: {"ratio": s["ratio"], "median_ratio": s["median_ratio"]} for name, s in _results.items()})
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(baselines.items())), f, indent=2)
+        f.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    baselines = _load_baselines()
+    terminalreporter.section(f"benchmarks (per call; last calibration loop {calibration_time() * 1e6:.1f}us)")
+    terminalreporter.write_line(f"{'name':58}{'min':>12}{'ratio':>10}{'baseline':>10}")
+    for name, stats in sorted(_results.items()):
+        reference = baselines.get(name, {}).get("ratio")
+        ref_text = f"{reference:9.3f}x" if reference else f"{'-':>10}"
+        terminalreporter.write_line(
+            f"{name:58}{stats['min'] * 1e6:10.1f}us{stats['ratio']:9.3f}x{ref_text}"
+        )
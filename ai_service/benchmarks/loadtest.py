@@ -0,0 +1,205 @@
+"""
+Offline load test for the conversation endpoint.
+
+Runs the ai_service app against a stub OpenAI-compatible LLM and a stub backend (see
+stubs.py), drives N concurrent sessions through the scenario graphs over /ai/interact
+and reports TTFT / turn latency percentiles and throughput.
+
+    python benchmarks/loadtest.py --sessions 50 --turns 4 --ttft-ms 300 --tps 40
+    python benchmarks/loadtest.py --target http://localhost:8000   # an already running service
+
+In-process mode serves the app, the stubs and the load generator from one event loop, so
+absolute numbers are pessimistic; use it to compare changes, not to size hardware.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import uvicorn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.stubs import LLMProfile, create_backend_app, create_llm_app
+
+# Generic answers; the stub evaluator decides pass/fail, so content only affects prompt size
+USER_LINES = [
+    "שלום, כן אני מוכן.",
+    "אני מפתח תוכנה עם חמש שנות ניסיון בצד שרת.",
+    "החוזקה שלי היא פתרון בעיות, למשל שיפרתי זמן תגובה של מערכת פי שלוש.",
+    "היה פרויקט עם לוח זמנים קשוח, חילקתי אותו לשלבים ועמדנו ביעד.",
+    "אני רוצה לעבוד בצוות שבונה מוצר משמעותי.",
+    "מה הצעדים הבאים בתהליך?",
+]
+
+SESSION_ID_BASE = 900_000
+
+
+async def start_server(app, host: str = "127.0.0.1") -> Tuple[uvicorn.Server, asyncio.Task, str]:
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=0, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://{host}:{port}"
+
+
+@contextmanager
+def stubbed_app(llm_url: str, backend_url: str, state_dir: str):
+    """Points the ai_service singletons at the stubs, restoring them afterwards."""
+    from openai import AsyncOpenAI
+    from app.engine.llm import llm_client
+    from app.engine.state_manager import state_manager
+    from app.routers import conversation
+
+    saved = (llm_client.client, conversation.BACKEND_URL, state_manager.persistence_file, dict(state_manager.sessions))
+    llm_client.client = AsyncOpenAI(base_url=f"{llm_url}/v1", api_key="stub")
+    conversation.BACKEND_URL = f"{backend_url}/api"
+    state_manager.persistence_file = os.path.join(state_dir, "session_store.json")
+    state_manager.sessions.clear()
+    try:
+        yield
+    finally:
+        llm_client.client, conversation.BACKEND_URL, state_manager.persistence_file, sessions = saved
+        state_manager.sessions.clear()
+        state_manager.sessions.update(sessions)
+
+
+async def run_turn(client: httpx.AsyncClient, base_url: str, session_id: int, scenario_id: str, text: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    event, error = None, None
+    async with client.stream(
+        "POST",
+        f"{base_url}/ai/interact",
+        data={"session_id": session_id, "text": text, "scenario_id": scenario_id, "interrupt": "false"},
+    ) as resp:
+        if resp.status_code != 200:
+            error = f"HTTP {resp.status_code}"
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "transcript" and ttft is None and '"assistant"' in line:
+                    ttft = time.perf_counter() - started
+                elif event == "error":
+                    error = line[6:]
+    return {"ttft": ttft, "latency": time.perf_counter() - started, "error": error}
+
+
+async def run_session(client, base_url: str, session_id: int, scenario_id: str, turns: int) -> List[Dict[str, Any]]:
+    results = []
+    for i, text in enumerate(["[START]"] + USER_LINES[:turns]):
+        result = await run_turn(client, base_url, session_id, scenario_id, text)
+        result["cold_start"] = i == 0
+        results.append(result)
+    return results
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+async def run_load(
+    sessions: int,
+    turns: int,
+    profile: LLMProfile,
+    scenarios: Optional[List[str]] = None,
+    target: Optional[str] = None
+) -> Dict[str, Any]:
+    """Runs the load test and returns the report (latencies in ms)."""
+    servers = []
+    with tempfile.TemporaryDirectory() as state_dir, ExitStack() as stack:
+        try:
+            if target is None:
+                llm_server, llm_task, llm_url = await start_server(create_llm_app(profile))
+                backend_server, backend_task, backend_url = await start_server(create_backend_app())
+                servers += [(llm_server, llm_task), (backend_server, backend_task)]
+
+                from main import app
+                stack.enter_context(stubbed_app(llm_url, backend_url, state_dir))
+                app_server, app_task, target = await start_server(app)
+                servers.append((app_server, app_task))
+
+            if not scenarios:
+                from app.engine.scenarios import SCENARIO_REGISTRY
+                scenarios = list(SCENARIO_REGISTRY)
+
+            limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=sessions)
+            async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+                started = time.perf_counter()
+                per_session = await asyncio.gather(*[
+                    run_session(client, target, SESSION_ID_BASE + i, scenarios[i % len(scenarios)], turns)
+                    for i in range(sessions)
+                ])
+                wall = time.perf_counter() - started
+        finally:
+            for server, task in reversed(servers):
+                server.should_exit = True
+                await task
+
+    results = [r for session in per_session for r in session]
+    ok = [r for r in results if r["error"] is None]
+    user_turns = [r for r in ok if not r["cold_start"]]
+    return {
+        "sessions": sessions,
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "wall_sec": round(wall, 2),
+        "turns_per_sec": round(len(ok) / wall, 2) if wall else 0.0,
+        "ttft_ms": percentiles([r["ttft"] for r in user_turns if r["ttft"] is not None]),
+        "turn_latency_ms": percentiles([r["latency"] for r in user_turns]),
+        "cold_start_ttft_ms": percentiles([r["ttft"] for r in ok if r["cold_start"] and r["ttft"] is not None]),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{report['sessions']} sessions, {report['turns']} turns, {report['errors']} errors "
+          f"in {report['wall_sec']}s  ->  {report['turns_per_sec']} turns/s")
+    print(f"{'':22}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for key, label in (("ttft_ms", "TTFT (ms)"), ("turn_latency_ms", "Turn latency (ms)"),
+                       ("cold_start_ttft_ms", "Cold start TTFT (ms)")):
+        row = report[key]
+        print(f"{label:22}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=4, help="User turns per session (after the cold start)")
+    parser.add_argument("--scenario", action="append", help="Scenario id (repeatable, default: all)")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tps", type=float, default=40.0, help="Stub LLM tokens/sec per stream")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--pass-rate", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--target", help="Base URL of a running ai_service (skips in-process servers)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    profile = LLMProfile(
+        ttft_ms=args.ttft_ms, tokens_per_sec=args.tps, jitter=args.jitter,
+        reply_tokens=args.reply_tokens, pass_rate=args.pass_rate, seed=args.seed,
+    )
+    report = asyncio.run(run_load(args.sessions, args.turns, profile, args.scenario, args.target))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Stand-in services for offline load tests: an OpenAI-compatible LLM with configurable
+latency and a minimal backend message store. Both are plain FastAPI apps.
+"""
+import json
+import time
+import random
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+REPLY_WORDS = "שלום , תודה רבה על התשובה . אשמח לשמוע עוד על הניסיון שלך בתחום .".split()
+
+
+class LLMProfile(BaseModel):
+    """Latency model of the stub LLM."""
+    ttft_ms: float = 300.0          # Time to first token (and latency of JSON evaluations)
+    tokens_per_sec: float = 40.0
+    jitter: float = 0.2             # +/- fraction applied to every delay
+    reply_tokens: int = 40
+    pass_rate: float = 0.8          # Share of evaluations that pass (advance the graph)
+    seed: Optional[int] = None
+
+
+def create_llm_app(profile: LLMProfile) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    rng = random.Random(profile.seed)
+    app.state.requests = 0
+
+    def delay(seconds: float) -> float:
+        return max(0.0, seconds * (1 + rng.uniform(-profile.jitter, profile.jitter)))
+
+    def chunk(content: Optional[str], finish: Optional[str] = None) -> bytes:
+        body = {
+            "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish}],
+        }
+        return f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+
+        if not body.get("stream"):
+            # Evaluator call (generate_json)
+            await asyncio.sleep(delay(profile.ttft_ms / 1000))
+            verdict = {
+                "passed": rng.random() < profile.pass_rate,
+                "reasoning": "stub evaluation",
+                "sentiment": rng.choice(["positive", "neutral", "negative"]),
+            }
+            return JSONResponse({
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(verdict)}}],
+            })
+
+        async def stream():
+            await asyncio.sleep(delay(profile.ttft_ms / 1000))
+            for i in range(profile.reply_tokens):
+                if i:
+                    await asyncio.sleep(delay(1 / profile.tokens_per_sec))
+                yield chunk(" " + REPLY_WORDS[i % len(REPLY_WORDS)] if i else REPLY_WORDS[0])
+            yield chunk(None, "stop")
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def create_backend_app() -> FastAPI:
+    """The two /api/chat endpoints the ai_service calls, backed by a dict."""
+    app = FastAPI(title="Stub Backend")
+    messages: Dict[int, List[dict]] = defaultdict(list)
+    app.state.messages = messages
+
+    @app.get("/api/chat/sessions/{session_id}/messages")
+    async def list_messages(session_id: int, limit: Optional[int] = None):
+        stored = messages[session_id]
+        return stored[-limit:] if limit else stored
+
+    @app.post("/api/chat/sessions/{session_id}/messages", status_code=201)
+    async def add_message(session_id: int, request: Request):
+        payload = await request.json()
+        message = {"id": len(messages[session_id]) + 1, "session_id": session_id, **payload}
+        messages[session_id].append(message)
+        return message
+
+    return app
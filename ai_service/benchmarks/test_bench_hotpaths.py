@@ -0,0 +1,139 @@
+"""
+Per-turn pure-Python hot paths at realistic and stress sizes.
+Run with `python -m pytest benchmarks -q` (see conftest.py for baselines).
+"""
+import asyncio
+import random
+
+import pytest
+from faster_whisper.transcribe import Segment, Word
+
+from app.engine.agents import RolePlayAgent
+from app.engine.scenarios import get_scenario_graph
+from app.engine.schema import AgentOutput
+from app.engine.state_manager import SessionStateManager, SessionStateData
+from app.services.framing import coalesce_tokens, encode_binary, encode_sse
+from app.services.stt import STTService
+
+SIZES = {"realistic": 10, "stress": 5000}
+
+_LINES = [
+    "אני חושב שהניסיון שלי בצוותי פיתוח מתאים לתפקיד, במיוחד בעבודה מול לקוחות.",
+    "So, um, I was like, you know, leading the migration of the billing service.",
+    "תוכל לספר לי על אתגר מקצועי שהתמודדת איתו בשנה האחרונה?",
+    "אה, כן, כאילו, היה לנו פרויקט עם לוח זמנים מאוד לחוץ ואני מנהל אותו.",
+]
+
+
+def _history(n: int):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": _LINES[i % len(_LINES)]}
+        for i in range(n)
+    ]
+
+
+def _segments(n_words: int, words_per_segment: int = 25):
+    rng = random.Random(0)
+    vocab = " ".join(_LINES).split()
+    segments, t = [], 0.0
+    for seg_id in range(0, n_words, words_per_segment):
+        words = []
+        for _ in range(min(words_per_segment, n_words - seg_id)):
+            duration = rng.uniform(0.15, 0.45)
+            gap = rng.choice([0.05, 0.1, 0.2, 0.8])
+            words.append(Word(start=t, end=t + duration, word=" " + rng.choice(vocab), probability=0.9))
+            t += duration + gap
+        segments.append(Segment(
+            id=seg_id, seek=0, start=words[0].start, end=words[-1].end,
+            text="".join(w.word for w in words), tokens=[], avg_logprob=-0.2,
+            compression_ratio=1.2, no_speech_prob=0.01, words=words, temperature=0.0,
+        ))
+    return segments
+
+
+@pytest.fixture(scope="module")
+def interview_state():
+    graph = get_scenario_graph("interview")
+    return graph, graph.states["ask_strength"]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_history_trimming(benchmark, interview_state, size):
+    graph, state = interview_state
+    history = _history(SIZES[size])
+    system_prompt = RolePlayAgent.build_system_prompt(graph.base_persona, state)
+    trimmed = benchmark(RolePlayAgent.trim_history, history, system_prompt, _LINES[0])
+    assert 0 < len(trimmed) <= len(history)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_prompt_assembly(benchmark, interview_state, size):
+    graph, state = interview_state
+    history = _history(SIZES[size])
+    failed = AgentOutput(passed=False, reasoning="Did not give an example.")
+    messages = benchmark(RolePlayAgent.build_messages, _LINES[1], graph.base_persona, state, history, failed)
+    assert messages[0]["role"] == "system" and messages[-1]["content"] == _LINES[1]
+
+
+def test_agent_output_construction(benchmark):
+    raw = {"passed": True, "reasoning": "User named a strength and gave an example.",
+           "feedback": "", "sentiment": "positive"}
+
+    def build():
+        return AgentOutput(
+            passed=raw.get("passed", False),
+            reasoning=raw.get("reasoning", ""),
+            feedback=raw.get("feedback", ""),
+            next_state_id="ask_challenge",
+            sentiment=raw.get("sentiment", "neutral"),
+        )
+
+    assert benchmark(build).passed
+
+
+def test_sse_frame(benchmark):
+    data = {"role": "assistant", "text": " מצוין, ספר לי עוד", "partial": True}
+    assert benchmark(encode_sse, "transcript", data).startswith(b"event: transcript")
+
+
+def test_binary_frame(benchmark):
+    data = {"role": "assistant", "text": " מצוין, ספר לי עוד", "partial": True}
+    assert len(benchmark(encode_binary, "transcript", data)) > 4
+
+
+@pytest.mark.parametrize("tokens", [200, 2000])
+def test_coalesced_stream_framing(benchmark, tokens):
+    loop = asyncio.new_event_loop()
+
+    async def source():
+        yield "status", "thinking"
+        for i in range(tokens):
+            yield "transcript", {"role": "assistant", "text": f" מילה{i}" + ("." if i % 15 == 14 else ""), "partial": True}
+        yield "done", "[DONE]"
+
+    async def run():
+        return [encode_sse(e, d) async for e, d in coalesce_tokens(source(), window_ms=30, max_bytes=512)]
+
+    try:
+        frames = benchmark(lambda: loop.run_until_complete(run()))
+    finally:
+        loop.close()
+    assert len(frames) < tokens
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_state_manager_update(benchmark, tmp_path, size):
+    manager = SessionStateManager(persistence_file=str(tmp_path / "session_store.json"))
+    for i in range(SIZES[size]):
+        manager.sessions[str(i)] = SessionStateData(scenario_id="interview", current_node_id="ask_intro")
+    benchmark(manager.update_state, "0", "interview", "ask_strength")
+    assert manager.get_state("0").current_node_id == "ask_strength"
+
+
+@pytest.mark.parametrize("words", [30, 5000])
+def test_stt_post_processing(benchmark, words):
+    # 30 words ~ one short answer; 5000 words ~ a long monologue
+    segments = _segments(words)
+    stt = STTService.__new__(STTService)  # Post-processing needs no model
+    result = benchmark(stt._analyze_segments, segments)
+    assert result["word_count"] > 0
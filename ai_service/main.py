@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.routers import conversation, analytics
 from app.core.lifespan import lifespan
 
@@ -16,6 +18,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[analytics.NEXT_CURSOR_HEADER],
 )
 
 app.include_router(conversation.router, prefix="/ai")
@@ -31,3 +34,7 @@ def health_check():
             "llm": settings.OLLAMA_MODEL
         }
     }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.render()
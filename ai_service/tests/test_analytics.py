@@ -0,0 +1,278 @@
+import json
+import asyncio
+import pytest
+from datetime import datetime
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.db import Database, db as shared_db
+from app.core.metrics import metrics
+from app.engine.llm import llm_client
+from app.routers import analytics
+from app.services.session_reports import session_reports
+from app.services.turn_scoring import turn_scoring
+from app.services.response_cache import ResponseCache
+from app.services.schema_registry import SchemaRegistry
+
+
+class FakePool:
+    """Answers queries by substring match; records every statement sent."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+        self.copy_chunks = []
+        self.copy_args = None
+        self.executed = []
+
+    def _answer(self, sql):
+        self.queries.append(sql)
+        for needle, rows in self.responses.items():
+            if needle in sql:
+                return rows() if callable(rows) else rows
+        return []
+
+    async def fetch(self, sql, *args):
+        return self._answer(sql)
+
+    async def fetchrow(self, sql, *args):
+        rows = self._answer(sql)
+        return rows[0] if rows else None
+
+    async def fetchval(self, sql, *args):
+        row = await self.fetchrow(sql, *args)
+        return next(iter(row.values())) if row else None
+
+    async def execute(self, sql, *args):
+        self.queries.append(sql)
+        self.executed.append((sql, args))
+
+    async def copy_from_query(self, sql, *args, output, **options):
+        self.queries.append(sql)
+        self.copy_args = args
+        for chunk in self.copy_chunks:
+            await output(chunk)
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    def get_size(self):
+        return 1
+
+    def get_idle_size(self):
+        return 0
+
+
+COLUMNS = [{"table_name": "messages", "column_name": c} for c in ("id", "role", "sentiment")]
+
+
+@pytest.mark.asyncio
+async def test_schema_registry_selects_variant_and_refreshes_once():
+    registry = SchemaRegistry(ttl_sec=60.0)
+    registry.register("q", [([("messages", "sentiment")], "WITH_SENTIMENT"), ([], "PLAIN")])
+    assert registry.query("q") == "PLAIN"  # Not loaded yet: safe variant
+
+    pool = FakePool({"information_schema": COLUMNS})
+    await asyncio.gather(*[registry.ensure_fresh(pool) for _ in range(5)])
+    assert registry.query("q") == "WITH_SENTIMENT"
+    assert len(pool.queries) == 1
+
+    # Column dropped by a migration: the NOTIFY handler invalidates, next refresh falls back
+    pool.responses["information_schema"] = COLUMNS[:2]
+    registry._on_schema_changed(None, 0, "schema_changed", "")
+    await registry.ensure_fresh(pool)
+    assert registry.query("q") == "PLAIN"
+
+
+@pytest.mark.asyncio
+async def test_database_creates_one_pool_and_closes_it():
+    created = []
+
+    async def create_pool(**kwargs):
+        await asyncio.sleep(0.01)  # Concurrent first requests all arrive while connecting
+        created.append(kwargs)
+        return FakePool({})
+
+    hooked = []
+
+    async def hook(pool):
+        hooked.append(pool)
+
+    database = Database()
+    database.warm("SELECT 1")
+    database.on_pool_created(hook)
+    with patch("app.core.db.asyncpg.create_pool", create_pool):
+        pools = await asyncio.gather(*[database.get_pool() for _ in range(5)])
+
+    assert len(created) == 1 and all(p is pools[0] for p in pools)
+    # Pool hooks (schema registry listener) run once, also when the pool is opened lazily
+    assert hooked == [pools[0]]
+    assert created[0]["statement_cache_size"] > 0 and created[0]["min_size"] <= created[0]["max_size"]
+
+    # Warming runs the registered statements on each new connection
+    conn = FakePool({})
+    await created[0]["init"](conn)
+    assert conn.queries == ["SELECT 1"]
+
+    async with database.acquire() as acquired:
+        assert acquired is pools[0]
+    assert "db_pool_wait_seconds" in metrics.render()
+
+    closed = []
+    async def close():
+        closed.append(True)
+    pools[0].close = close
+    await database.close()
+    await database.close()
+    assert closed == [True] and not database.is_connected
+
+
+@pytest.fixture
+def db():
+    """Analytics router over a FakePool with a fresh schema registry."""
+    pool = FakePool({"information_schema": COLUMNS})
+    registry = SchemaRegistry(ttl_sec=60.0)
+    registry._variants = dict(analytics.schema_registry._variants)
+    app = FastAPI()
+    app.include_router(analytics.router, prefix="/analytics")
+    with patch.object(analytics, "schema_registry", registry), \
+         patch.object(analytics, "analytics_cache", ResponseCache(ttl_sec=0, stale_sec=0, max_entries=1)), \
+         patch.object(shared_db, "_pool", pool):
+        yield TestClient(app), pool
+
+
+def test_sessions_list_skips_catalog_lookups(db):
+    client, pool = db
+    pool.responses["FROM sessions s"] = [{"id": 1, "scenario_id": "bank", "created_at": None,
+                                          "message_count": 2, "last_sentiment": "positive"}]
+    for _ in range(3):
+        sessions = client.get("/analytics/sessions_list").json()
+
+    assert sessions[0]["overall_sentiment"] == "Positive"
+    assert sum("information_schema" in q for q in pool.queries) == 1
+
+
+def test_dashboard_reads_rollup_row(db):
+    client, pool = db
+    pool.responses["FROM analytics_totals"] = [{
+        "total_sessions": 3, "total_messages": 40, "sentiment_positive": 5, "sentiment_neutral": 10,
+        "sentiment_negative": 5, "avg_score": 76,
+    }]
+    result = client.get("/analytics/dashboard").json()
+
+    assert result["overview"] == {"total_sessions": 3, "total_messages": 40, "avg_score": 76}
+    assert result["sentiment"] == {"positive": 5, "neutral": 10, "negative": 5}
+    # Scoring and averaging happen in SQL; only the totals row and recent sessions are read
+    assert len([q for q in pool.queries if "information_schema" not in q]) == 2
+
+
+def test_summary_scores_come_from_sql(db):
+    client, pool = db
+    pool.responses["session_score_rollup"] = [
+        {"session_id": 4, "date": datetime(2026, 1, 4), "score": 81, "fluency": 7.5, "fillers": 2},
+    ]
+    summaries = client.get("/analytics/summary", params={"user_id": 1}).json()
+
+    assert summaries == [{"session_id": 4, "score": 81, "fluency": 7.5, "fillers": 2, "date": "2026-01-04T00:00:00"}]
+    assert "session_score" in pool.queries[-1]
+
+
+def test_sessions_list_keyset_pages(db):
+    client, pool = db
+    pool.responses["FROM sessions s"] = [
+        {"id": 9 - i, "scenario_id": "bank", "created_at": datetime(2026, 1, 9 - i),
+         "message_count": 4, "last_sentiment": None}
+        for i in range(3)
+    ]
+    resp = client.get("/analytics/sessions_list", params={"limit": 2, "user_id": 7})
+    assert [s["session_id"] for s in resp.json()] == [9, 8]
+
+    cursor = resp.headers[analytics.NEXT_CURSOR_HEADER]
+    sql, params = analytics._sessions_page_query(3, analytics._decode_cursor(cursor), user_id=7)
+    assert "(s.start_time, s.id) < ($1, $2)" in sql and "s.user_id = $3" in sql
+    assert params == [datetime(2026, 1, 8), 8, 7, 3]
+
+    assert client.get("/analytics/sessions_list", params={"cursor": "bad"}).status_code == 400
+    assert client.get("/analytics/sessions_list", params={"limit": 10_000}).status_code == 422
+
+
+def test_export_streams_ndjson_with_filters(db):
+    client, pool = db
+    docs = [{"id": i, "scenario_id": "bank", "messages": [{"id": 1, "content": "שלום\n"}], "metrics": []}
+            for i in range(3)]
+    payload = "".join(json.dumps(d, ensure_ascii=False) + "\n" for d in docs).encode()
+    pool.copy_chunks = [payload[i:i + 7] for i in range(0, len(payload), 7)]  # Chunks split mid-line
+
+    resp = client.get("/analytics/export", params={"scenario_id": "bank", "date_from": "2026-01-01T00:00:00"})
+
+    assert resp.headers["content-type"] == analytics.NDJSON_MEDIA_TYPE
+    assert [json.loads(line) for line in resp.text.splitlines()] == docs
+    assert "s.scenario_id = $1" in pool.queries[-1] and "s.start_time >= $2" in pool.queries[-1]
+    assert pool.copy_args == ("bank", datetime(2026, 1, 1))
+
+
+@pytest.mark.asyncio
+async def test_session_report_scores_turns_then_is_served_from_storage():
+    messages = [
+        {"session_id": 3, "role": "ai", "content": "Hi", "sentiment": None, "messages_version": "2:8:ab"},
+        {"session_id": 3, "role": "user", "content": "Thanks", "sentiment": "positive", "messages_version": "2:8:ab"},
+    ]
+    pool = FakePool({
+        "<> (SELECT COUNT(*) FROM session_metrics": [{"id": 3, "scenario_id": "bank"}],
+        "role IN ('user', 'ai')": messages,
+        "v.messages_version": messages,
+        "SELECT session_id, metric_name, metric_value": [
+            {"session_id": 3, "metric_name": "topic_adherence", "metric_value": 0.9},
+            {"session_id": 3, "metric_name": "clarity", "metric_value": 0.6},
+        ],
+    })
+    llm = AsyncMock(return_value={"turns": [{"turn": 1, "topic_adherence": 0.9, "clarity": 1.4}]})
+    with patch.object(shared_db, "_pool", pool), patch.object(llm_client, "generate_json", llm):
+        report = await session_reports.get_or_generate(3)
+
+        # One scoring call for the whole session; values clamped to 0-1
+        llm.assert_awaited_once()
+        inserts = [args for sql, args in pool.executed if "INSERT" in sql]
+        assert inserts[0][1:3] == (["topic_adherence", "clarity"], [0.9, 1.0])
+        # Report: real scores read back, only its own sentiment rows written, document stored
+        assert report["scored"] is True
+        assert report["messages_version"] == "2:8:ab"
+        assert {m["metric_name"]: m["metric_value"] for m in report["metrics"]} == {
+            "sentiment": 1.0, "topic_adherence": 0.9, "clarity": 0.6,
+        }
+        assert inserts[1][1] == ["sentiment"]
+        assert json.loads(inserts[2][2][0]) == report
+
+        # Repeat call: the stored report, without touching messages or the LLM again
+        pool.responses = {"DISTINCT ON (r.session_id)": [{"session_id": 3, "report": inserts[2][2][0]}]}
+        pool.queries.clear()
+        assert await session_reports.get_or_generate(3) == report
+        assert len(pool.queries) == 1 and llm.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_report_sweep_is_capped_and_advances_watermark_to_first_active_session():
+    pool = FakePool({
+        "SELECT last_session_id": [{"last_session_id": 10}],
+        "AS first_active": [{"last_id": 20, "first_active": 15}],
+        "s.id > $1 AND s.id <= $2": [{"id": 11}, {"id": 12}],
+        "FROM session_scoring_attempts\n    WHERE attempts": [{"session_id": 5}],
+    })
+    scored = AsyncMock(return_value=set())
+    generate = AsyncMock(return_value=({}, 3))
+    with patch.object(shared_db, "_pool", pool), patch.object(turn_scoring, "ensure_scored", scored), \
+         patch.object(session_reports, "_generate", generate):
+        assert await session_reports.sweep(max_sessions=2) == 3
+
+    # New sessions past the watermark plus the due retry, scored with the attempt cap
+    assert scored.await_args.args[0] == [5, 11, 12] and scored.await_args.kwargs["max_attempts"] > 0
+    # Cap reached at 12 (before the active session 15): the rest waits for the next pass
+    advance = [args for sql, args in pool.executed if "GREATEST(last_session_id" in sql]
+    assert advance == [(12,)]
@@ -0,0 +1,262 @@
+import json
+import asyncio
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from faster_whisper.transcribe import Segment
+from app.routers import conversation
+from app.services.audio import SAMPLE_RATE
+from app.services.stt import STTService
+
+async def _fake_turn(session_id, scenario_id, text, history, cancel=None):
+    if text != "[START]":
+        yield {"type": "analysis", "sentiment": "positive", "passed": True}
+    for token in ("שלום", " לך"):
+        yield token
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(conversation.router, prefix="/ai")
+    with patch.object(conversation, "_fetch_history", AsyncMock(return_value=[])) as fetch, \
+         patch.object(conversation, "_save_message", AsyncMock()), \
+         patch.object(conversation.orchestrator, "process_turn", side_effect=_fake_turn) as process_turn:
+        yield TestClient(app), fetch, process_turn
+
+def _receive_until(ws, event):
+    events = []
+    while True:
+        message = json.loads(ws.receive_text())
+        events.append(message)
+        if message["event"] == event:
+            return events
+
+def test_voice_socket_text_turns_reuse_history(client):
+    test_client, fetch, process_turn = client
+    with patch.object(conversation, "_get_stt_service", AsyncMock(return_value=MagicMock())):
+        with test_client.websocket_connect("/ai/ws/7?scenario_id=interview&tts=false") as ws:
+            ws.send_text(json.dumps({"type": "start"}))
+            _receive_until(ws, "done")
+            ws.send_text(json.dumps({"type": "text", "text": "hello"}))
+            events = _receive_until(ws, "done")
+
+    assert [e["event"] for e in events][:3] == ["transcript", "status", "metrics"]
+    assert "".join(e["data"]["text"] for e in events if e["event"] == "transcript" and e["data"]["role"] == "assistant") == "שלום לך"
+    # History fetched once per connection, then carried in memory
+    fetch.assert_awaited_once()
+    assert process_turn.call_args.args[3] == [{"role": "assistant", "content": "שלום לך"}]
+
+def test_voice_socket_audio_utterance(client):
+    test_client, _, process_turn = client
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.stt.settings.STT_BATCH_MAX_SIZE", 1):
+        MockModel.return_value.transcribe.return_value = (
+            [Segment(id=0, seek=0, start=0.0, end=0.8, text="hello there", tokens=[], avg_logprob=0.0,
+                     compression_ratio=1.0, no_speech_prob=0.0, words=None, temperature=0.0)],
+            MagicMock(),
+        )
+        stt = STTService()
+        with patch.object(conversation, "_get_stt_service", AsyncMock(return_value=stt)):
+            with test_client.websocket_connect("/ai/ws/7?scenario_id=interview&tts=false") as ws:
+                ws.send_bytes((0.3 * np.ones(SAMPLE_RATE, dtype=np.float32)).tobytes())
+                ws.send_text(json.dumps({"type": "end_of_utterance"}))
+                events = _receive_until(ws, "done")
+
+    final = next(e for e in events if e["event"] == "stt_final")["data"]
+    assert final["clean_text"] == "hello there"
+    assert "word_timings" not in final
+    assert process_turn.call_args.args[2] == "hello there"
+
+def test_voice_socket_survives_malformed_frames(client):
+    test_client, _, _ = client
+    with patch.object(conversation, "_get_stt_service", AsyncMock(return_value=MagicMock())):
+        with test_client.websocket_connect("/ai/ws/7?scenario_id=interview&tts=false") as ws:
+            for bad in (b"\x00\x01\x02", "[]", '"x"', "1", "{not json"):
+                if isinstance(bad, bytes):
+                    ws.send_bytes(bad)
+                else:
+                    ws.send_text(bad)
+                assert json.loads(ws.receive_text())["event"] == "error"
+            # Session still alive after the bad frames
+            ws.send_text(json.dumps({"type": "start"}))
+            assert _receive_until(ws, "done")[-1]["event"] == "done"
+
+def test_voice_socket_rejects_unknown_scenario(client):
+    test_client, _, _ = client
+    with pytest.raises(Exception):
+        with test_client.websocket_connect("/ai/ws/7?scenario_id=nope") as ws:
+            ws.receive_text()
+
+class _FakeStream:
+    def __init__(self, tokens):
+        self._tokens = list(tokens)
+        self.close = AsyncMock()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._tokens:
+            raise StopAsyncIteration
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = self._tokens.pop(0)
+        return chunk
+
+@pytest.mark.asyncio
+async def test_llm_stream_cancel_closes_upstream():
+    from app.core.metrics import metrics
+    from app.engine.llm import llm_client
+
+    stream = _FakeStream(["a", "b", "c"])
+    cancel = asyncio.Event()
+    before = metrics.value("llm_generations_cancelled_total")
+    with patch.object(llm_client.client.chat.completions, "create", AsyncMock(return_value=stream)):
+        received = []
+        async for token in llm_client.generate_stream([], cancel):
+            received.append(token)
+            cancel.set()
+
+    assert received == ["a"]
+    stream.close.assert_awaited_once()
+    assert metrics.value("llm_generations_cancelled_total") == before + 1
+
+@pytest.mark.asyncio
+async def test_llm_stream_cancel_during_slow_first_token():
+    from app.core.metrics import metrics
+    from app.engine.llm import llm_client
+
+    request_aborted = asyncio.Event()
+
+    async def slow_create(**kwargs):
+        try:
+            await asyncio.sleep(3600)  # Ollama still loading / prefilling
+        except asyncio.CancelledError:
+            request_aborted.set()
+            raise
+
+    cancel = asyncio.Event()
+    before = metrics.value("llm_generations_cancelled_total")
+    asyncio.get_running_loop().call_later(0.01, cancel.set)
+    with patch.object(llm_client.client.chat.completions, "create", side_effect=slow_create):
+        received = [token async for token in llm_client.generate_stream([], cancel)]
+
+    assert received == []
+    await asyncio.sleep(0)
+    assert request_aborted.is_set()
+    assert metrics.value("llm_generations_cancelled_total") == before + 1
+
+@pytest.mark.asyncio
+async def test_turn_events_persists_partial_reply_on_cancel():
+    cancel = asyncio.Event()
+
+    async def turn(session_id, scenario_id, text, history, cancel=None):
+        yield {"type": "analysis", "sentiment": "neutral"}
+        for token in ("one", " two", " three"):
+            if cancel.is_set():
+                return
+            yield token
+
+    save = AsyncMock()
+    with patch.object(conversation, "_save_message", save), \
+         patch.object(conversation.orchestrator, "process_turn", side_effect=turn):
+        async for event, data in conversation._turn_events(7, "interview", "hi", [], cancel):
+            if event == "transcript" and data["role"] == "assistant":
+                cancel.set()
+            assert event != "done"
+        await asyncio.gather(*conversation._background_tasks)
+
+    save.assert_any_await(7, "assistant", "one", interrupted=True)
+
+@pytest.mark.asyncio
+async def test_new_turn_interrupts_running_reply():
+    async def turn(session_id, scenario_id, text, history, cancel=None):
+        yield {"type": "analysis", "sentiment": "neutral"}
+        for token in (f"{text}-1", f" {text}-2", f" {text}-3"):
+            if cancel.is_set():
+                return
+            yield token
+            await asyncio.sleep(0.01)
+
+    save = AsyncMock()
+    with patch.object(conversation, "_save_message", save), \
+         patch.object(conversation.orchestrator, "process_turn", side_effect=turn):
+        first = conversation._turn_events(9, "interview", "a", [])
+        first_events = []
+        async for event, data in first:
+            first_events.append((event, data))
+            if event == "transcript" and data["role"] == "assistant":
+                break
+        # User talks over the character: the second turn takes over the session
+        second = asyncio.ensure_future(_collect(conversation._turn_events(9, "interview", "b", [])))
+        async for event, data in first:
+            first_events.append((event, data))
+        second_events = await second
+        await asyncio.gather(*conversation._background_tasks)
+
+    assert first_events[-1] == ("interrupted", {"delivered_chars": 3})
+    assert second_events[-1] == ("done", "[DONE]")
+    save.assert_any_await(9, "assistant", "a-1", interrupted=True)
+    save.assert_any_await(9, "assistant", "b-1 b-2 b-3")
+    assert conversation.turn_manager.active("9") is None
+
+async def _collect(events):
+    return [e async for e in events]
+
+@pytest.mark.asyncio
+async def test_duplicate_turn_attaches_to_running_generation():
+    calls = []
+
+    async def turn(session_id, scenario_id, text, history, cancel=None):
+        calls.append(text)
+        yield {"type": "analysis", "sentiment": "neutral"}
+        for token in ("x", "y"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    with patch.object(conversation, "_save_message", AsyncMock()), \
+         patch.object(conversation.orchestrator, "process_turn", side_effect=turn):
+        first, second = await asyncio.gather(
+            _collect(conversation._turn_events(11, "interview", "same", [])),
+            _collect(conversation._turn_events(11, "interview", "same", [])),
+        )
+
+    assert calls == ["same"]
+    assert first == second
+    assert first[-1] == ("done", "[DONE]")
+
+def test_interact_streams_coalesced_sse(client):
+    test_client, _, _ = client
+    with patch.object(conversation.settings, "STREAM_COALESCE_WINDOW_MS", 1000):
+        resp = test_client.post("/ai/interact", data={"session_id": 5, "text": "hi", "scenario_id": "interview"})
+
+    frames = [f for f in resp.text.split("\n\n") if f]
+    assistant = [f for f in frames if f.startswith("event: transcript") and '"assistant"' in f]
+    # Both tokens arrive in one frame
+    assert assistant == ['event: transcript\ndata: {"role":"assistant","text":"שלום לך","partial":true}']
+    assert frames[-1] == "event: done\ndata: [DONE]"
+
+def test_interact_binary_frames_carry_raw_audio(client):
+    from app.services.framing import BINARY_MEDIA_TYPE, decode_binary
+
+    test_client, _, _ = client
+    audio = b"\xff\xfb\x90\x00" * 10
+
+    async def fake_audio(text, voice=None, language=None):
+        yield audio
+
+    with patch.object(conversation._tts_service, "stream_audio", side_effect=fake_audio) as stream_audio:
+        resp = test_client.post(
+            "/ai/interact",
+            data={"session_id": 5, "text": "hi", "scenario_id": "interview", "tts": "true", "language": "he"},
+            headers={"Accept": f"{BINARY_MEDIA_TYPE}, text/event-stream;q=0.5"},
+        )
+
+    assert resp.headers["content-type"] == BINARY_MEDIA_TYPE
+    events = list(decode_binary(resp.content))
+    names = [e for e, _ in events]
+    assert names[-4:] == ["audio_start", "audio", "audio_end", "done"]
+    assert events[names.index("audio")][1] == {"chunk": audio}
+    assert stream_audio.call_args.kwargs["language"] == "he"
+    assert "".join(d["text"] for e, d in events if e == "transcript" and d["role"] == "assistant") == "שלום לך"
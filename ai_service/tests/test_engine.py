@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.engine import session_locks as session_locks_module
+from app.engine.orchestrator import orchestrator
+from app.engine.schema import AgentOutput
+from app.engine.scenarios import get_scenario_graph
+from app.engine.session_locks import SessionLockRegistry
+from app.engine.state_manager import state_manager
+
+@pytest.mark.asyncio
+async def test_session_lock_registry_bounded_and_idle_cleanup():
+    registry = SessionLockRegistry(max_entries=2, idle_sec=60.0)
+    for sid in ("a", "b", "c"):
+        async with registry.lock(sid):
+            pass
+    # Over capacity: least recently used idle entry is dropped
+    assert len(registry) == 2
+
+    async with registry.lock("b"):
+        # Held locks survive even an idle sweep
+        with patch.object(session_locks_module.time, "monotonic", return_value=1e12):
+            registry._sweep()
+        assert len(registry) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_serialize_state_transitions():
+    graph = get_scenario_graph("interview")
+    initial = graph.states[graph.initial_state_id]
+    next_id = initial.transitions[0].target_state_id
+    seen_states = []
+
+    async def evaluate(user_text, state, history):
+        seen_states.append(state.id)
+        await asyncio.sleep(0.01)
+        return AgentOutput(passed=True, reasoning="", next_state_id=state.transitions[0].target_state_id)
+
+    async def respond(*args, **kwargs):
+        yield "ok"
+
+    sid = "lock-test"
+    with patch("app.engine.orchestrator.EvaluatorAgent.evaluate", side_effect=evaluate), \
+         patch("app.engine.orchestrator.RolePlayAgent.generate_response", side_effect=respond), \
+         patch.object(state_manager, "_save"):
+        state_manager.update_state(sid, "interview", graph.initial_state_id)
+        async def run(text):
+            return [c async for c in orchestrator.process_turn(sid, "interview", text, [])]
+        await asyncio.gather(run("first"), run("second"))
+        state_manager.clear_session(sid)
+
+    # The second evaluation sees the node the first one moved to
+    assert seen_states == [graph.initial_state_id, next_id]
+
+@pytest.mark.asyncio
+async def test_turn_cancelled_during_evaluation_leaves_state_untouched():
+    graph = get_scenario_graph("interview")
+    cancel = asyncio.Event()
+    evaluation_aborted = asyncio.Event()
+
+    async def evaluate(user_text, state, history):
+        cancel.set()  # User barges in while the coach is still thinking
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            evaluation_aborted.set()
+            raise
+
+    sid = "cancel-test"
+    with patch("app.engine.orchestrator.EvaluatorAgent.evaluate", side_effect=evaluate), \
+         patch.object(state_manager, "_save"):
+        state_manager.update_state(sid, "interview", graph.initial_state_id)
+        events = [c async for c in orchestrator.process_turn(sid, "interview", "hi", [], cancel)]
+        node_id = state_manager.get_state(sid).current_node_id
+        state_manager.clear_session(sid)
+
+    assert events == []
+    await asyncio.sleep(0)
+    assert evaluation_aborted.is_set()
+    assert node_id == graph.initial_state_id
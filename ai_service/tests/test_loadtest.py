@@ -0,0 +1,13 @@
+import pytest
+from benchmarks.loadtest import run_load
+from benchmarks.stubs import LLMProfile
+
+@pytest.mark.asyncio
+async def test_loadtest_harness_smoke():
+    profile = LLMProfile(ttft_ms=5, tokens_per_sec=2000, reply_tokens=5, pass_rate=1.0, seed=0)
+    report = await run_load(sessions=3, turns=2, profile=profile, scenarios=["interview", "bank"])
+
+    assert report["errors"] == 0
+    assert report["turns"] == 9
+    assert report["ttft_ms"]["p50"] > 0
+    assert report["ttft_ms"]["p99"] <= report["turn_latency_ms"]["p99"]
@@ -0,0 +1,58 @@
+import pytest
+from app.services.preprocessor import (
+    FILLER_PATTERNS, FillerAutomaton, Preprocessor, _TOKEN_RE, _separator_boundaries, normalize_token,
+)
+
+@pytest.mark.parametrize("raw, clean, fillers", [
+    # Preserve Verb 'Like'
+    ("I like, um, pizza", "I like, pizza", 1),
+    ("I would like to go", "I would like to go", 0),
+    ("It was, like, huge", "It was, huge", 1),
+    ("He was like no way", "He was no way", 1),
+    ("Um, I think so.", "I think so.", 1),
+    ("I think, uh.", "I think.", 1),
+    ("Do you know the way?", "Do you know the way?", 0),
+    ("It's hard, you know?", "It's hard?", 1),
+    ("What kind of job is it", "What kind of job is it", 0),
+    ("ummmm okay uhhh", "okay", 2),
+    # Hebrew
+    ("אה, אני חושב ש... אממ כן", "אני חושב ש... כן", 2),
+    ("כאילו, זה היה מוזר", "זה היה מוזר", 1),
+    ("כאילו שהוא לא שמע", "כאילו שהוא לא שמע", 0),
+])
+def test_process_text(raw, clean, fillers):
+    detected, clean_text, count = Preprocessor.process_text(raw)
+    assert clean_text == clean
+    assert count == fillers == len(detected)
+
+def test_filler_mask_uses_word_punctuation():
+    # "um" is transparent to the verb rule; the second "like" is parenthetical
+    words = [" I", " um,", " like", " it", " was,", " like,", " huge"]
+    assert Preprocessor.filler_mask(words).tolist() == [False, True, False, False, False, True, False]
+
+class _CountingList(list):
+    """Counts element reads, i.e. automaton transitions taken."""
+    reads = 0
+
+    def __getitem__(self, i):
+        _CountingList.reads += 1
+        return super().__getitem__(i)
+
+def test_filler_automaton_is_linear_on_long_transcripts():
+    sentence = "So, um, I was like, you know, thinking that I like the job, אה, כאילו, זה בסדר. "
+
+    def steps(text):
+        spans = [(m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+        tokens = [normalize_token(text[s:e]) for s, e in spans]
+        automaton = FillerAutomaton(FILLER_PATTERNS)
+        automaton._goto, automaton._fail = _CountingList(automaton._goto), _CountingList(automaton._fail)
+        _CountingList.reads = 0
+        matches = automaton.find(tokens, _separator_boundaries(text, spans))
+        return _CountingList.reads, len(tokens), len(matches)
+
+    short_reads, short_tokens, short_matches = steps(sentence * 200)
+    long_reads, long_tokens, long_matches = steps(sentence * 2000)
+    # Per token: one goto plus amortized at most one fail step (each a goto/fail read pair)
+    assert short_reads <= 4 * short_tokens
+    assert long_reads <= 4 * long_tokens
+    assert long_matches == 10 * short_matches
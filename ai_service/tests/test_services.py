@@ -1,12 +1,48 @@
+import io
+import time
+import asyncio
 import pytest
+import numpy as np
+import soundfile as sf
 from unittest.mock import MagicMock, patch
-from app.services.stt import STTService
+from faster_whisper.transcribe import Segment, Word
+from app.core.metrics import metrics
+from app.services.audio import decode_audio, SAMPLE_RATE
+from app.services.framing import coalesce_tokens, encode_sse
+from app.services.stt import DECODING_PROFILES, STTService
+from app.services.speech_metrics import WORD_TIMING_DTYPE, pack_word_timings, unpack_word_timings
+from app.services.streaming_stt import StreamingTranscriber
+from app.services.response_cache import ResponseCache
+from app.services.stt_cache import TranscriptionCache
 from app.services.tts import TTSService
 
+def _segment(start, end, text, words=None):
+    return Segment(id=0, seek=0, start=start, end=end, text=text, tokens=[], avg_logprob=0.0,
+                   compression_ratio=1.0, no_speech_prob=0.0, words=words, temperature=0.0)
+
+# --- Audio Decoding Tests ---
+def test_decode_audio_wav_resamples_to_mono_16k():
+    # 1 second of 44.1kHz stereo
+    t = np.linspace(0, 1, 44100, endpoint=False)
+    tone = np.sin(2 * np.pi * 440 * t).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, np.stack([tone, tone], axis=1), 44100, format="WAV")
+
+    audio = decode_audio(buf.getvalue())
+
+    assert audio.dtype == np.float32
+    assert audio.ndim == 1
+    assert audio.shape[0] == SAMPLE_RATE
+
+def test_decode_audio_empty():
+    assert decode_audio(b"").size == 0
+
 # --- STT Service Tests ---
-def test_stt_service_transcribe():
+@pytest.mark.asyncio
+async def test_stt_service_transcribe():
     # Mock the WhisperModel at the class level within the module
-    with patch("app.services.stt.WhisperModel") as MockModel:
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.preprocessor.decode_audio", return_value=np.zeros(SAMPLE_RATE, dtype=np.float32)):
         # Setup the mock instance
         mock_instance = MockModel.return_value
         
@@ -25,11 +61,147 @@ def test_stt_service_transcribe():
         service = STTService()
         
         # Test with dummy bytes
-        result = service.transcribe(b"dummy_audio_data")
+        result = await service.transcribe(b"dummy_audio_data")
         
         # The service cleans text, so "Hello world" stays "Hello world"
         assert result["clean_text"] == "Hello world"
         mock_instance.transcribe.assert_called_once()
+        # Whisper receives the decoded array, not the raw bytes
+        assert isinstance(mock_instance.transcribe.call_args.args[0], np.ndarray)
+
+@pytest.mark.asyncio
+async def test_streaming_transcriber_segments_on_silence():
+    # Frames arrive faster than real time here, so keep segments out of the micro-batcher
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.stt.settings.STT_BATCH_MAX_SIZE", 1):
+        MockModel.return_value.transcribe.return_value = ([_segment(0.0, 0.9, "hello")], MagicMock())
+
+        stream = StreamingTranscriber(STTService())
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        speech = 0.3 * np.ones(SAMPLE_RATE, dtype=np.float32)
+
+        events = []
+        # Two utterances separated by a second of silence, fed in 20ms frames
+        for chunk in np.split(np.concatenate([silence, speech, silence, speech]), 200):
+            events += await stream.feed(chunk.tobytes())
+        events += await stream.finish()
+
+        partials = [e for e in events if e["type"] == "partial"]
+        final = events[-1]
+        assert len(partials) == 2
+        assert MockModel.return_value.transcribe.call_count == 2
+        # Second segment is re-based onto the stream timeline (starts ~3s in, minus pre-roll)
+        assert 2.7 <= partials[1]["start"] <= 3.0
+        assert final["type"] == "final"
+        assert final["clean_text"] == "hello hello"
+        assert final["pause_count"] == 1
+
+@pytest.mark.asyncio
+async def test_stt_micro_batches_concurrent_utterances():
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.stt.BatchedInferencePipeline") as MockBatched:
+        # Three 1s utterances laid end-to-end -> segments come back on the concatenated timeline
+        MockBatched.return_value.transcribe.return_value = (
+            [_segment(0.1, 0.9, "one"), _segment(1.2, 1.8, "two"), _segment(2.0, 2.5, "three")],
+            MagicMock(),
+        )
+        service = STTService()
+        audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+        results = await asyncio.gather(*(service.infer_segments(audio, "he") for _ in range(3)))
+
+        MockBatched.return_value.transcribe.assert_called_once()
+        MockModel.return_value.transcribe.assert_not_called()
+        kwargs = MockBatched.return_value.transcribe.call_args.kwargs
+        assert len(kwargs["clip_timestamps"]) == 3
+        assert [[seg.text for seg in r] for r in results] == [["one"], ["two"], ["three"]]
+        assert results[1][0].start == pytest.approx(0.2)
+
+@pytest.mark.asyncio
+async def test_stt_decoding_profile_selection():
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.preprocessor.decode_audio", return_value=np.zeros(SAMPLE_RATE, dtype=np.float32)):
+        MockModel.return_value.transcribe.return_value = ([], MagicMock())
+        service = STTService()
+        before = metrics.value("stt_utterances_total", profile="realtime")
+
+        assert service.select_profile(1.0).name == "accurate"
+        assert service.select_profile(60.0).name == "realtime"
+        assert service.select_profile(60.0, "accurate").name == "accurate"
+        service._inflight = 100
+        assert service.select_profile(1.0).name == "realtime"
+        service._inflight = 0
+
+        result = await service.transcribe(b"dummy_audio_data", profile="realtime")
+        assert result["decoding_profile"] == "realtime"
+        assert MockModel.return_value.transcribe.call_args.kwargs["beam_size"] == 1
+        assert metrics.value("stt_utterances_total", profile="realtime") == before + 1
+
+@pytest.mark.asyncio
+async def test_stt_profile_model_loaded_once_under_concurrency():
+    def slow_model(*args, **kwargs):
+        time.sleep(0.05)
+        return MagicMock()
+
+    with patch("app.services.stt.WhisperModel", side_effect=slow_model) as MockModel:
+        service = STTService()
+        realtime = DECODING_PROFILES["realtime"]
+        models = await asyncio.gather(*(asyncio.to_thread(service._model_for, realtime) for _ in range(4)))
+
+        assert len({id(m) for m in models}) == 1
+        assert MockModel.call_count == 2  # accurate at startup + realtime once
+
+def test_stt_word_level_metrics():
+    with patch("app.services.stt.WhisperModel"):
+        service = STTService()
+    words = [
+        Word(start=0.0, end=0.4, word=" I", probability=0.9),
+        Word(start=0.5, end=0.9, word=" um,", probability=0.8),
+        Word(start=2.0, end=2.4, word=" agree", probability=0.95),
+        Word(start=2.5, end=3.0, word=" completely", probability=0.9),
+    ]
+    result = service._analyze_segments([_segment(0.0, 3.0, "I um, agree completely", words)])
+
+    # One 1.1s pause between "um," and "agree" - invisible at segment granularity
+    assert result["pause_count"] == 1
+    assert result["longest_pause_sec"] == pytest.approx(1.1, abs=0.01)
+    assert result["filler_positions"] == [1]
+    assert result["articulation_rate_wpm"] > result["speech_rate_wpm"]
+    assert result["word_timings"].dtype == WORD_TIMING_DTYPE
+    assert unpack_word_timings(pack_word_timings(result["word_timings"]))["is_filler"].tolist() == [False, True, False, False]
+
+@pytest.mark.asyncio
+async def test_stt_cache_returns_duplicate_upload_without_inference():
+    with patch("app.services.stt.WhisperModel") as MockModel, \
+         patch("app.services.preprocessor.decode_audio", return_value=np.ones(SAMPLE_RATE, dtype=np.float32)):
+        MockModel.return_value.transcribe.return_value = ([_segment(0.0, 1.0, "hello")], MagicMock())
+        service = STTService()
+
+        first = await service.transcribe(b"upload", language="en")
+        retry = await service.transcribe(b"upload", language="en")
+
+        assert MockModel.return_value.transcribe.call_count == 1
+        assert (first["cached"], retry["cached"]) == (False, True)
+        assert retry["clean_text"] == "hello"
+        # Different language is a different key
+        await service.transcribe(b"upload", language="he")
+        assert MockModel.return_value.transcribe.call_count == 2
+
+def test_transcription_cache_lru_and_disk(tmp_path):
+    result = {"clean_text": "x" * 100, "word_timings": np.zeros(3, dtype=WORD_TIMING_DTYPE)}
+    cache = TranscriptionCache(max_bytes=400, cache_dir=str(tmp_path))
+    for key in ("a", "b", "c"):
+        cache.put(key, result)
+
+    # Only two ~180 byte entries fit in memory; "a" was evicted but is still on disk
+    assert cache.size_bytes <= 400
+    assert "a" not in cache._entries
+    restarted = TranscriptionCache(max_bytes=400, cache_dir=str(tmp_path))
+    restored = restarted.get("a")
+    assert restored["clean_text"] == result["clean_text"]
+    assert restored["word_timings"].dtype == WORD_TIMING_DTYPE
+    assert restarted.get("missing") is None
+    assert (restarted.hits, restarted.misses) == (1, 1)
 
 # --- TTS Service Tests ---
 @pytest.mark.asyncio
@@ -51,3 +223,62 @@ async def test_tts_service_stream():
             
         assert chunks == [b"gtts_audio_data"]
         MockGTTS.assert_called_with("Hello", lang="en")
+
+@pytest.mark.asyncio
+async def test_coalesce_tokens_window_bytes_and_sentences():
+    def token(text):
+        return "transcript", {"role": "assistant", "text": text, "partial": True}
+
+    async def source():
+        yield "status", "thinking"
+        for t in ("Hel", "lo", " there.", " How", " are"):
+            yield token(t)
+        await asyncio.sleep(0.08)   # Stall longer than the window
+        yield token(" you")
+        yield "done", "[DONE]"
+
+    out = [e async for e in coalesce_tokens(source(), window_ms=20, max_bytes=512)]
+    texts = [d["text"] if e == "transcript" else e for e, d in out]
+    # Sentence end flushes, the stall flushes on the window, other events flush first
+    assert texts == ["status", "Hello there.", " How are", " you", "done"]
+
+    small = [e async for e in coalesce_tokens(source(), window_ms=1000, max_bytes=4)]
+    assert [d["text"] for e, d in small if e == "transcript"][:2] == ["Hello", " there."]
+
+    assert encode_sse("transcript", {"text": "שלום"}) == 'event: transcript\ndata: {"text":"שלום"}\n\n'.encode()
+
+@pytest.mark.asyncio
+async def test_response_cache_single_flight_and_stale_while_revalidate():
+    cache = ResponseCache(ttl_sec=60.0, stale_sec=60.0, max_entries=8)
+    calls = 0
+    release = asyncio.Event()
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    # Concurrent misses share one computation
+    waiters = [asyncio.create_task(cache.get_or_compute(("dashboard",), compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters) == [1] * 5
+    assert await cache.get_or_compute(("dashboard",), compute) == 1 and calls == 1
+
+    # Invalidated: stale value served at once, exactly one background refresh
+    cache.invalidate()
+    release.clear()
+    assert await cache.get_or_compute(("dashboard",), compute) == 1
+    assert await cache.get_or_compute(("dashboard",), compute) == 1
+    release.set()
+    await asyncio.sleep(0.01)
+    assert calls == 2
+    assert await cache.get_or_compute(("dashboard",), compute) == 2
+
+    # Failures are not cached
+    async def broken():
+        raise RuntimeError("db down")
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute(("summary", 1), broken)
+    assert len(cache) == 1
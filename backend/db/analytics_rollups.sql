@@ -0,0 +1,303 @@
+-- Analytics rollups: counters kept up to date by triggers so the dashboard reads one small table.
+-- Idempotent; applied by src/db/migrate.ts on every backend start.
+-- Rebuild from the base tables with: SELECT rebuild_analytics_rollups();  (npm run db:rebuild-rollups)
+
+-- Session score (one definition for every consumer), clamped to 0-100
+CREATE OR REPLACE FUNCTION session_score(
+    avg_fluency DOUBLE PRECISION,
+    avg_sentiment DOUBLE PRECISION,
+    total_fillers DOUBLE PRECISION
+) RETURNS INTEGER AS $$
+    SELECT GREATEST(0, LEAST(100, ROUND(
+        60
+        + LEAST(20, (COALESCE(avg_fluency, 0) / 10) * 20)
+        - COALESCE(total_fillers, 0) * 2
+        + (COALESCE(avg_sentiment, 0) + 1) * 10
+    )))::INTEGER;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Same buckets as the dashboard sentiment breakdown
+CREATE OR REPLACE FUNCTION sentiment_bucket(label TEXT) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN l LIKE 'positive%' THEN 'positive'
+        WHEN l IN ('negative', 'stress', 'anger', 'fear') OR l LIKE 'negative%' THEN 'negative'
+        ELSE 'neutral'
+    END
+    FROM (SELECT LOWER(COALESCE(label, 'neutral')) AS l) t;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Global counters, spread over slots so concurrent writers don't queue on one row.
+-- Each backend adds its deltas to slot (pid % rollup_slot_count()); readers sum the slots
+-- through the analytics_totals view.
+CREATE OR REPLACE FUNCTION rollup_slot_count() RETURNS SMALLINT AS $$
+    SELECT 16::SMALLINT;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION rollup_slot() RETURNS SMALLINT AS $$
+    SELECT (pg_backend_pid() % rollup_slot_count())::SMALLINT;
+$$ LANGUAGE sql STABLE;
+
+CREATE TABLE IF NOT EXISTS analytics_total_slots (
+    slot SMALLINT PRIMARY KEY,
+    total_sessions BIGINT NOT NULL DEFAULT 0,
+    total_messages BIGINT NOT NULL DEFAULT 0,
+    total_user_messages BIGINT NOT NULL DEFAULT 0,
+    sentiment_positive BIGINT NOT NULL DEFAULT 0,
+    sentiment_neutral BIGINT NOT NULL DEFAULT 0,
+    sentiment_negative BIGINT NOT NULL DEFAULT 0,
+    scored_sessions BIGINT NOT NULL DEFAULT 0, -- sessions with at least one metric
+    score_sum BIGINT NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP
+);
+
+-- One row (id = 1) once the slots exist, none before the first rebuild
+CREATE OR REPLACE VIEW analytics_totals AS
+SELECT
+    1::SMALLINT AS id,
+    SUM(total_sessions)::BIGINT AS total_sessions,
+    SUM(total_messages)::BIGINT AS total_messages,
+    SUM(total_user_messages)::BIGINT AS total_user_messages,
+    SUM(sentiment_positive)::BIGINT AS sentiment_positive,
+    SUM(sentiment_neutral)::BIGINT AS sentiment_neutral,
+    SUM(sentiment_negative)::BIGINT AS sentiment_negative,
+    SUM(scored_sessions)::BIGINT AS scored_sessions,
+    SUM(score_sum)::BIGINT AS score_sum,
+    MAX(rebuilt_at) AS rebuilt_at
+FROM analytics_total_slots
+HAVING COUNT(*) > 0;
+
+-- Per-session metric aggregates; score is recomputed by Postgres on every change
+CREATE TABLE IF NOT EXISTS session_score_rollup (
+    session_id INTEGER PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+    metrics_count INTEGER NOT NULL DEFAULT 0,
+    fluency_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fluency_count INTEGER NOT NULL DEFAULT 0,
+    sentiment_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sentiment_count INTEGER NOT NULL DEFAULT 0,
+    total_fillers DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score INTEGER GENERATED ALWAYS AS (
+        CASE WHEN metrics_count > 0 THEN session_score(
+            fluency_sum / NULLIF(fluency_count, 0),
+            sentiment_sum / NULLIF(sentiment_count, 0),
+            total_fillers
+        ) END
+    ) STORED
+);
+
+-- Triggers are skipped while rebuild_analytics_rollups() recomputes everything in bulk
+CREATE OR REPLACE FUNCTION rollups_paused() RETURNS BOOLEAN AS $$
+    SELECT COALESCE(current_setting('analytics.rebuilding', true), '') = 'on';
+$$ LANGUAGE sql STABLE;
+
+-- sessions -> total_sessions
+CREATE OR REPLACE FUNCTION rollup_sessions() RETURNS TRIGGER AS $$
+BEGIN
+    IF rollups_paused() THEN
+        RETURN NULL;
+    END IF;
+    UPDATE analytics_total_slots
+    SET total_sessions = total_sessions + CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END
+    WHERE slot = rollup_slot();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_sessions_count ON sessions;
+CREATE TRIGGER rollup_sessions_count
+AFTER INSERT OR DELETE ON sessions
+FOR EACH ROW EXECUTE FUNCTION rollup_sessions();
+
+-- messages -> message counts and user sentiment buckets (sentiment is updated after insert)
+CREATE OR REPLACE FUNCTION rollup_message_delta(p_role TEXT, p_sentiment TEXT, p_sign INTEGER) RETURNS VOID AS $$
+    UPDATE analytics_total_slots SET
+        total_messages = total_messages + p_sign,
+        total_user_messages = total_user_messages + CASE WHEN p_role = 'user' THEN p_sign ELSE 0 END,
+        sentiment_positive = sentiment_positive
+            + CASE WHEN p_role = 'user' AND sentiment_bucket(p_sentiment) = 'positive' THEN p_sign ELSE 0 END,
+        sentiment_neutral = sentiment_neutral
+            + CASE WHEN p_role = 'user' AND sentiment_bucket(p_sentiment) = 'neutral' THEN p_sign ELSE 0 END,
+        sentiment_negative = sentiment_negative
+            + CASE WHEN p_role = 'user' AND sentiment_bucket(p_sentiment) = 'negative' THEN p_sign ELSE 0 END
+    WHERE slot = rollup_slot();
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION rollup_messages() RETURNS TRIGGER AS $$
+BEGIN
+    IF rollups_paused() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_message_delta(OLD.role, OLD.sentiment, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_message_delta(NEW.role, NEW.sentiment, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_messages_count ON messages;
+CREATE TRIGGER rollup_messages_count
+AFTER INSERT OR DELETE ON messages
+FOR EACH ROW EXECUTE FUNCTION rollup_messages();
+
+DROP TRIGGER IF EXISTS rollup_messages_sentiment ON messages;
+CREATE TRIGGER rollup_messages_sentiment
+AFTER UPDATE OF role, sentiment ON messages
+FOR EACH ROW
+WHEN (OLD.role IS DISTINCT FROM NEW.role OR OLD.sentiment IS DISTINCT FROM NEW.sentiment)
+EXECUTE FUNCTION rollup_messages();
+
+-- session_metrics -> session_score_rollup
+CREATE OR REPLACE FUNCTION rollup_metric_delta(
+    p_session INTEGER, p_name TEXT, p_value DOUBLE PRECISION, p_sign INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    is_fluency INTEGER := CASE WHEN p_name = 'fluency_score' THEN 1 ELSE 0 END;
+    is_sentiment INTEGER := CASE WHEN p_name = 'sentiment' THEN 1 ELSE 0 END;
+    is_filler INTEGER := CASE WHEN p_name IN ('filler_count', 'filler_word_count') THEN 1 ELSE 0 END;
+BEGIN
+    IF p_session IS NULL THEN
+        RETURN;
+    END IF;
+    IF p_sign > 0 THEN
+        INSERT INTO session_score_rollup AS r (
+            session_id, metrics_count, fluency_sum, fluency_count, sentiment_sum, sentiment_count, total_fillers
+        ) VALUES (
+            p_session, 1, is_fluency * p_value, is_fluency, is_sentiment * p_value, is_sentiment, is_filler * p_value
+        )
+        ON CONFLICT (session_id) DO UPDATE SET
+            metrics_count = r.metrics_count + 1,
+            fluency_sum = r.fluency_sum + EXCLUDED.fluency_sum,
+            fluency_count = r.fluency_count + EXCLUDED.fluency_count,
+            sentiment_sum = r.sentiment_sum + EXCLUDED.sentiment_sum,
+            sentiment_count = r.sentiment_count + EXCLUDED.sentiment_count,
+            total_fillers = r.total_fillers + EXCLUDED.total_fillers;
+    ELSE
+        -- No upsert: on a cascading session delete the rollup row may already be gone
+        UPDATE session_score_rollup SET
+            metrics_count = metrics_count - 1,
+            fluency_sum = fluency_sum - is_fluency * p_value,
+            fluency_count = fluency_count - is_fluency,
+            sentiment_sum = sentiment_sum - is_sentiment * p_value,
+            sentiment_count = sentiment_count - is_sentiment,
+            total_fillers = total_fillers - is_filler * p_value
+        WHERE session_id = p_session;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_session_metrics() RETURNS TRIGGER AS $$
+BEGIN
+    IF rollups_paused() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_metric_delta(OLD.session_id, OLD.metric_name, OLD.metric_value, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_metric_delta(NEW.session_id, NEW.metric_name, NEW.metric_value, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_session_metrics_scores ON session_metrics;
+CREATE TRIGGER rollup_session_metrics_scores
+AFTER INSERT OR UPDATE OR DELETE ON session_metrics
+FOR EACH ROW EXECUTE FUNCTION rollup_session_metrics();
+
+-- session_score_rollup -> scored_sessions / score_sum (average score = score_sum / scored_sessions)
+CREATE OR REPLACE FUNCTION rollup_session_scores() RETURNS TRIGGER AS $$
+DECLARE
+    d_count INTEGER := 0;
+    d_sum BIGINT := 0;
+BEGIN
+    IF rollups_paused() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.score IS NOT NULL THEN
+        d_count := d_count - 1;
+        d_sum := d_sum - OLD.score;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.score IS NOT NULL THEN
+        d_count := d_count + 1;
+        d_sum := d_sum + NEW.score;
+    END IF;
+    IF d_count <> 0 OR d_sum <> 0 THEN
+        UPDATE analytics_total_slots
+        SET scored_sessions = scored_sessions + d_count, score_sum = score_sum + d_sum
+        WHERE slot = rollup_slot();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_session_scores_totals ON session_score_rollup;
+CREATE TRIGGER rollup_session_scores_totals
+AFTER INSERT OR UPDATE OR DELETE ON session_score_rollup
+FOR EACH ROW EXECUTE FUNCTION rollup_session_scores();
+
+-- Full recompute from the base tables in one set-based pass.
+-- Writers to sessions/messages/session_metrics wait until it commits, so no delta is lost.
+CREATE OR REPLACE FUNCTION rebuild_analytics_rollups() RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE sessions, messages, session_metrics IN SHARE MODE;
+    PERFORM set_config('analytics.rebuilding', 'on', true);
+
+    TRUNCATE session_score_rollup;
+    INSERT INTO session_score_rollup (
+        session_id, metrics_count, fluency_sum, fluency_count, sentiment_sum, sentiment_count, total_fillers
+    )
+    SELECT
+        sm.session_id,
+        COUNT(*),
+        COALESCE(SUM(sm.metric_value) FILTER (WHERE sm.metric_name = 'fluency_score'), 0),
+        COUNT(*) FILTER (WHERE sm.metric_name = 'fluency_score'),
+        COALESCE(SUM(sm.metric_value) FILTER (WHERE sm.metric_name = 'sentiment'), 0),
+        COUNT(*) FILTER (WHERE sm.metric_name = 'sentiment'),
+        COALESCE(SUM(sm.metric_value) FILTER (WHERE sm.metric_name IN ('filler_count', 'filler_word_count')), 0)
+    FROM session_metrics sm
+    WHERE sm.session_id IS NOT NULL
+    GROUP BY sm.session_id;
+
+    -- Totals go to slot 0, the other slots start from zero.
+    -- DELETE rather than TRUNCATE: dashboard reads of the view don't wait for the rebuild.
+    DELETE FROM analytics_total_slots;
+    INSERT INTO analytics_total_slots (
+        slot, total_sessions, total_messages, total_user_messages,
+        sentiment_positive, sentiment_neutral, sentiment_negative,
+        scored_sessions, score_sum, rebuilt_at
+    )
+    SELECT
+        0,
+        (SELECT COUNT(*) FROM sessions),
+        m.total_messages, m.total_user_messages,
+        m.positive, m.neutral, m.negative,
+        s.scored_sessions, s.score_sum, NOW()
+    FROM (
+        SELECT
+            COUNT(*) AS total_messages,
+            COUNT(*) FILTER (WHERE role = 'user') AS total_user_messages,
+            COUNT(*) FILTER (WHERE role = 'user' AND sentiment_bucket(sentiment) = 'positive') AS positive,
+            COUNT(*) FILTER (WHERE role = 'user' AND sentiment_bucket(sentiment) = 'neutral') AS neutral,
+            COUNT(*) FILTER (WHERE role = 'user' AND sentiment_bucket(sentiment) = 'negative') AS negative
+        FROM messages
+    ) m, (
+        SELECT COUNT(score) AS scored_sessions, COALESCE(SUM(score), 0) AS score_sum
+        FROM session_score_rollup
+    ) s;
+    INSERT INTO analytics_total_slots (slot)
+    SELECT generate_series(1, rollup_slot_count() - 1);
+
+    PERFORM set_config('analytics.rebuilding', 'off', true);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill when the rollups are first installed or the slot count changed
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM analytics_total_slots) <> rollup_slot_count() THEN
+        PERFORM rebuild_analytics_rollups();
+    END IF;
+END $$;
@@ -32,6 +32,7 @@ CREATE TABLE IF NOT EXISTS messages (
     role VARCHAR(10) NOT NULL CHECK (role IN ('user', 'ai', 'system')),
     content TEXT NOT NULL,
     sentiment TEXT,
+    interrupted BOOLEAN NOT NULL DEFAULT FALSE, -- AI reply cut off (client left / barge-in)
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -65,9 +66,35 @@ CREATE TABLE IF NOT EXISTS social_reports (
     session_id INTEGER REFERENCES sessions(id) ON DELETE CASCADE,
     overall_score DOUBLE PRECISION,
     feedback TEXT,
+    report JSONB, -- full generated report, served again until new messages arrive
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Post-session turn scoring: failed attempts per session (retried with backoff, up to a cap)
+CREATE TABLE IF NOT EXISTS session_scoring_attempts (
+    session_id INTEGER PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Report sweep progress: sessions up to this id have been handled (history: /report/generate_all)
+CREATE TABLE IF NOT EXISTS report_sweep_watermark (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_session_id INTEGER NOT NULL
+);
+
+-- Secondary indexes for the analytics and history access patterns
+-- sessions_list pages and dashboard recent activity (newest first)
+CREATE INDEX IF NOT EXISTS idx_sessions_start_time_id ON sessions (start_time DESC, id DESC);
+-- per-user session lists and summaries
+CREATE INDEX IF NOT EXISTS idx_sessions_user_start_time ON sessions (user_id, start_time DESC, id DESC);
+-- per-session message counts, latest user sentiment, history
+CREATE INDEX IF NOT EXISTS idx_messages_session_role_id ON messages (session_id, role, id);
+-- per-session score aggregates
+CREATE INDEX IF NOT EXISTS idx_session_metrics_session_name ON session_metrics (session_id, metric_name);
+-- latest stored report per session
+CREATE INDEX IF NOT EXISTS idx_social_reports_session_created ON social_reports (session_id, created_at DESC);
+
 -- טריגר לעדכון updated_at אוטומטי
 CREATE OR REPLACE FUNCTION update_timestamp()
 RETURNS TRIGGER AS $$
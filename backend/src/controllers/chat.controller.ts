@@ -24,7 +24,7 @@ export const startSession = async (req: Request, res: Response) => {
 export const saveMessage = async (req: Request, res: Response) => {
     try {
         const { sessionId } = req.params;
-        const { role, content, sentiment, analysis } = req.body;
+        const { role, content, sentiment, analysis, interrupted } = req.body;
         
         const sId = parseInt(sessionId);
         if (isNaN(sId)) {
@@ -33,7 +33,7 @@ export const saveMessage = async (req: Request, res: Response) => {
         }
 
         // Ensure sessionId is parsed to a number if your DB expects it, or keep as string if UUID
-        const message = await chatService.saveMessage(sId, role, content, sentiment, analysis);
+        const message = await chatService.saveMessage(sId, role, content, sentiment, analysis, interrupted === true);
         res.status(201).json(message);
     } catch (error: any) {
         console.error('Save Message Error:', error);
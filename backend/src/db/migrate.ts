@@ -1,5 +1,34 @@
+import { readFile } from 'fs/promises';
+import path from 'path';
 import { db } from '../config/databaseConfig.js';
 
+// [name, definition] of the secondary indexes (also in db/init.sql for fresh databases)
+const SECONDARY_INDEXES: Array<[string, string]> = [
+    // sessions_list pages and dashboard recent activity (newest first)
+    ['idx_sessions_start_time_id', 'sessions (start_time DESC, id DESC)'],
+    // per-user session lists and summaries
+    ['idx_sessions_user_start_time', 'sessions (user_id, start_time DESC, id DESC)'],
+    // per-session message counts, latest user sentiment, history
+    ['idx_messages_session_role_id', 'messages (session_id, role, id)'],
+    // per-session score aggregates
+    ['idx_session_metrics_session_name', 'session_metrics (session_id, metric_name)'],
+    // latest stored report per session
+    ['idx_social_reports_session_created', 'social_reports (session_id, created_at DESC)'],
+];
+
+const createIndexConcurrently = async (name: string, definition: string): Promise<void> => {
+    // An interrupted concurrent build leaves an invalid index that IF NOT EXISTS would keep skipping
+    const invalid = await db.execute(
+        `SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+         WHERE c.relname = $1 AND NOT i.indisvalid`,
+        [name]
+    );
+    if (invalid.length > 0) {
+        await db.execute(`DROP INDEX CONCURRENTLY IF EXISTS ${name};`);
+    }
+    await db.execute(`CREATE INDEX CONCURRENTLY IF NOT EXISTS ${name} ON ${definition};`);
+};
+
 export const runMigrations = async (): Promise<void> => {
     console.log('Running database migrations...');
     try {
@@ -62,6 +91,19 @@ export const runMigrations = async (): Promise<void> => {
             END $$;
         `);
 
+        // Add interrupted column if it doesn't exist (AI replies cut off mid-stream)
+        await db.execute(`
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='messages' AND column_name='interrupted'
+                ) THEN
+                    ALTER TABLE messages ADD COLUMN interrupted BOOLEAN NOT NULL DEFAULT FALSE;
+                END IF;
+            END $$;
+        `);
+
         // Create turn_analyses table
         await db.execute(`
             CREATE TABLE IF NOT EXISTS turn_analyses (
@@ -97,10 +139,41 @@ export const runMigrations = async (): Promise<void> => {
                 session_id INTEGER REFERENCES sessions(id) ON DELETE CASCADE,
                 overall_score DOUBLE PRECISION,
                 feedback TEXT,
+                report JSONB,
                 created_at TIMESTAMP DEFAULT NOW()
             );
         `);
-        
+        // Generated report document (ai_service /report/generate); added after the table shipped
+        await db.execute(`ALTER TABLE social_reports ADD COLUMN IF NOT EXISTS report JSONB;`);
+
+        // ai_service report sweep: failed scoring attempts and sweep progress
+        await db.execute(`
+            CREATE TABLE IF NOT EXISTS session_scoring_attempts (
+                session_id INTEGER PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_attempt_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        `);
+        await db.execute(`
+            CREATE TABLE IF NOT EXISTS report_sweep_watermark (
+                id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                last_session_id INTEGER NOT NULL
+            );
+        `);
+
+        // Secondary indexes for the analytics and history access patterns.
+        // Built CONCURRENTLY (one statement each, outside a transaction) so writers aren't blocked.
+        for (const [name, definition] of SECONDARY_INDEXES) {
+            await createIndexConcurrently(name, definition);
+        }
+
+        // Analytics rollup tables and triggers (backfilled on first install)
+        const rollupsSql = await readFile(path.join(process.cwd(), 'db', 'analytics_rollups.sql'), 'utf8');
+        await db.execute(rollupsSql);
+
+        // Tell listeners (ai_service analytics schema registry) to re-read the catalog
+        await db.execute(`NOTIFY schema_changed;`);
+
         console.log('Migrations completed successfully.');
     } catch (error) {
         console.error('Migration failed:', error);
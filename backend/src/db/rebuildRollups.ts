@@ -0,0 +1,19 @@
+import { db } from '../config/databaseConfig.js';
+
+// Recomputes analytics_total_slots / session_score_rollup from the base tables.
+// Usage: npm run db:rebuild-rollups
+const rebuildRollups = async (): Promise<void> => {
+    console.log('Rebuilding analytics rollups...');
+    try {
+        await db.execute('SELECT rebuild_analytics_rollups();');
+        const [totals] = await db.execute('SELECT * FROM analytics_totals WHERE id = 1');
+        console.log('Analytics rollups rebuilt:', totals);
+    } catch (error) {
+        console.error('Rollup rebuild failed:', error);
+        process.exitCode = 1;
+    } finally {
+        await db.close();
+    }
+};
+
+rebuildRollups();
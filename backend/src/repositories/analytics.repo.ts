@@ -14,6 +14,7 @@ export interface SocialReport {
     session_id: number;
     overall_score: number;
     feedback: string;
+    report?: Record<string, unknown> | null; // full report document written by ai_service
     created_at: Date;
 }
 
@@ -15,6 +15,7 @@ export interface ChatMessage {
     role: 'user' | 'ai' | 'system';
     content: string;
     sentiment?: string | null;
+    interrupted?: boolean;
     created_at: Date;
 }
 
@@ -56,9 +57,15 @@ export class ChatRepo {
         return result[0];
     }
 
-    async addMessage(sessionId: number, role: string, content: string, sentiment?: string | null): Promise<ChatMessage> {
-        const sql = 'INSERT INTO messages (session_id, role, content, sentiment) VALUES ($1, $2, $3, $4) RETURNING *';
-        const params = [sessionId, role, content, sentiment ?? null];
+    async addMessage(
+        sessionId: number,
+        role: string,
+        content: string,
+        sentiment?: string | null,
+        interrupted: boolean = false
+    ): Promise<ChatMessage> {
+        const sql = 'INSERT INTO messages (session_id, role, content, sentiment, interrupted) VALUES ($1, $2, $3, $4, $5) RETURNING *';
+        const params = [sessionId, role, content, sentiment ?? null, interrupted];
         const result = await this.db.execute<ChatMessage>(sql, params);
         return result[0];
     }
@@ -132,7 +139,7 @@ export class ChatRepo {
     }
 
     async getMessagesBySessionId(sessionId: number): Promise<ChatMessage[]> {
-        const sql = 'SELECT id, session_id, role, content, sentiment, created_at FROM messages WHERE session_id = $1 ORDER BY created_at ASC';
+        const sql = 'SELECT id, session_id, role, content, sentiment, interrupted, created_at FROM messages WHERE session_id = $1 ORDER BY created_at ASC';
         const params = [sessionId];
         return await this.db.execute<ChatMessage>(sql, params);
     }
@@ -145,6 +152,7 @@ export class ChatRepo {
                 m.role,
                 m.content,
                 m.sentiment,
+                m.interrupted,
                 m.created_at,
                 ta.id AS analysis_id,
                 ta.sentiment AS analysis_sentiment,
@@ -166,6 +174,7 @@ export class ChatRepo {
             role: row.role,
             content: row.content,
             sentiment: row.sentiment,
+            interrupted: row.interrupted,
             created_at: row.created_at,
             analysis: row.analysis_id
                 ? {
@@ -83,7 +83,7 @@ describe('Chat Service', () => {
 
             const result = await chatService.saveMessage(sessionId, role, content);
 
-            expect(mockChatRepo.addMessage).toHaveBeenCalledWith(sessionId, role, content, undefined);
+            expect(mockChatRepo.addMessage).toHaveBeenCalledWith(sessionId, role, content, undefined, false);
             expect(result).toEqual(mockMessage);
         });
 
@@ -56,7 +56,8 @@ export const saveMessage = async (
     role: string,
     content: string,
     sentiment?: string,
-    analysis?: TurnAnalysisInput
+    analysis?: TurnAnalysisInput,
+    interrupted?: boolean
 ) => {
     if (!sessionId) throw new Error('Session ID is required');
     const normalizedRole = role === 'assistant' ? 'ai' : role;
@@ -79,7 +80,8 @@ export const saveMessage = async (
     }
 
     const sentimentToStore = normalizedRole === 'ai' ? null : sentiment;
-    return await chatRepo.addMessage(sessionId, normalizedRole, content, sentimentToStore);
+    // interrupted: partial AI reply persisted after the client disconnected mid-stream
+    return await chatRepo.addMessage(sessionId, normalizedRole, content, sentimentToStore, interrupted ?? false);
 };
 
 export const getUserSessions = async (userId: number) => {
@@ -59,6 +59,8 @@ interface ApiMessage {
 }
 
 const AI_SERVICE_URL = "http://localhost:8000"; 
+// sessions_list is paged; the next page's cursor comes back in this header
+const NEXT_CURSOR_HEADER = "X-Next-Cursor";
 
 export default function SessionsPage() {
   const { user, isLoading: isAuthLoading } = useAuth();
@@ -72,6 +74,8 @@ export default function SessionsPage() {
   const [isLoadingSessions, setIsLoadingSessions] = useState(true);
   const [dashboardError, setDashboardError] = useState<string | null>(null);
   const [sessionsError, setSessionsError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   // --- Fetch Initial Data ---
   useEffect(() => {
@@ -94,8 +98,10 @@ export default function SessionsPage() {
         if (listRes.status === "fulfilled" && listRes.value.ok) {
           const data = await listRes.value.json();
           setSessionList(Array.isArray(data) ? data : []);
+          setNextCursor(listRes.value.headers.get(NEXT_CURSOR_HEADER));
         } else {
           setSessionList([]);
+          setNextCursor(null);
           setSessionsError(he.sessions.loadSessionsFailed);
         }
         setIsLoadingSessions(false);
@@ -119,6 +125,7 @@ export default function SessionsPage() {
         setSessionsError(he.sessions.loadSessionsFailed);
         setDashboardError(he.sessions.loadStatsFailed);
         setSessionList([]);
+        setNextCursor(null);
         setDashboardStats(null);
         setIsLoadingSessions(false);
         setIsLoadingDashboard(false);
@@ -130,6 +137,26 @@ export default function SessionsPage() {
     };
   }, [user]);
 
+  // --- Load Next Sessions Page ---
+  const loadMoreSessions = async () => {
+    if (!nextCursor || isLoadingMore) return;
+    setIsLoadingMore(true);
+    try {
+      const res = await fetch(
+        `${AI_SERVICE_URL}/analytics/sessions_list?cursor=${encodeURIComponent(nextCursor)}`
+      );
+      if (!res.ok) throw new Error(`sessions_list failed: ${res.status}`);
+      const data = await res.json();
+      setSessionList((prev) => [...prev, ...(Array.isArray(data) ? data : [])]);
+      setNextCursor(res.headers.get(NEXT_CURSOR_HEADER));
+    } catch (e) {
+      // Keep the loaded pages and the cursor, so the user can retry
+      console.error("Sessions Page Fetch Error:", e);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   // --- Fetch Session Detail ---
   useEffect(() => {
     if (!selectedSessionId) return;
@@ -289,6 +316,15 @@ export default function SessionsPage() {
                   </div>
                 </button>
               ))}
+              {!showSessionsSkeleton && !sessionsError && nextCursor && (
+                <button
+                  onClick={loadMoreSessions}
+                  disabled={isLoadingMore}
+                  className="w-full rounded-xl border border-dashed border-border px-4 py-2 text-sm text-muted-foreground transition-all hover:bg-muted/60 disabled:opacity-60"
+                >
+                  {isLoadingMore ? he.sessions.loadingMoreSessions : he.sessions.loadMoreSessions}
+                </button>
+              )}
             </div>
           </aside>
 
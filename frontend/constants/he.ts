@@ -127,6 +127,8 @@ export const he = {
     loadSessionsFailed: "לא ניתן לטעון מפגשים.",
     loadStatsFailed: "לא ניתן לטעון נתונים.",
     noSessionsYet: "אין עדיין מפגשים.",
+    loadMoreSessions: "טען מפגשים נוספים",
+    loadingMoreSessions: "טוען...",
     yourJourney: "המסע שלך",
     yourJourneySubtitle: "מעקב אחר ההתקדמות וחזרה למפגשים.",
     explorer: "ניווט",